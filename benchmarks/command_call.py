@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Measure the per-call overhead of ``Command.__call__``
+
+The overhead is the time spent in ``Command.__call__`` beyond the time spent
+in ``Command.run``. Run from the top-level of the repository:
+
+    python benchmarks/command_call.py
+"""
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+from timeit import repeat
+from pyqi.core.command import (Command, CommandIn, CommandOut,
+                               ParameterCollection)
+
+NUMBER = 100000
+REPEAT = 5
+
+class BenchCommand(Command):
+    BriefDescription = "A command with a realistic number of CommandIns"
+    CommandIns = ParameterCollection(
+        [CommandIn('a', int, 'required', Required=True)] +
+        [CommandIn('opt%d' % i, int, 'optional', Default=i)
+         for i in range(10)] +
+        [CommandIn('validated', int, 'validated', Default=1,
+                   ValidateValue=lambda x: x > 0)])
+    CommandOuts = ParameterCollection([
+        CommandOut('result', int, 'the result')])
+
+    def run(self, **kwargs):
+        return {'result': kwargs['a']}
+
+def time_per_call(f):
+    """Return the best observed time per call of ``f``, in microseconds"""
+    return min(repeat(f, number=NUMBER, repeat=REPEAT)) / NUMBER * 1e6
+
+def main():
+    cmd = BenchCommand()
+    kwargs = {'a': 1, 'opt3': 42, 'validated': 2}
+    defaults = dict([(p.Name, p.Default) for p in cmd.CommandIns.values()
+                     if not p.Required])
+    defaults.update(kwargs)
+
+    call_time = time_per_call(lambda: cmd(**kwargs))
+    run_time = time_per_call(lambda: cmd.run(**defaults))
+    map_time = min(repeat(lambda: list(cmd.map([kwargs] * NUMBER)), number=1,
+                          repeat=REPEAT)) / NUMBER * 1e6
+
+    print "Command.__call__: %.2f us/call" % call_time
+    print "Command.run:      %.2f us/call" % run_time
+    print "Overhead:         %.2f us/call" % (call_time - run_time)
+    print
+    print "Command.map:      %.2f us/item" % map_time
+    print "Overhead:         %.2f us/item" % (map_time - run_time)
+
+if __name__ == '__main__':
+    main()
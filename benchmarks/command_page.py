@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Measure the time to render an HTML interface command page
+
+Compares ``HTMLInterface.command_page_writer``, which fills in a form
+template compiled once per command, against the previous implementation,
+which wrote the page piece by piece and rebuilt every input on each render.
+Run from the top-level of the repository:
+
+    python benchmarks/command_page.py
+"""
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+from cgi import MiniFieldStorage
+from timeit import repeat
+from pyqi.core.interfaces.html import HTMLInterfaceRegistry, render_page
+
+NUMBER = 10000
+REPEAT = 5
+
+def legacy_get_html(option, prefix, value=""):
+    """``HTMLInputOption.get_html`` before form templates"""
+    if (not value) and (option.Default is not None):
+        value = option.Default
+
+    input_name = prefix + option.Name
+    string_input = lambda: '<input type="text" name="%s" value="%s"/>' % (input_name, value)
+    number_input = lambda: '<input type="number" name="%s" value="%s"/>' % (input_name, value)
+    upload_input = lambda: '<input type="file" name="%s" />' % input_name
+    mchoice_input = lambda: ''.join(
+        [ ('(%s<input type="radio" name="%s" value="%s" %s/>)'
+                % (choice, input_name, choice, 'checked="true"' if value == choice else ''))
+            for choice in option.Choices ]
+    )
+
+    input_switch = {
+        None: string_input,
+        str: string_input,
+        bool: mchoice_input,
+        int: number_input,
+        float: number_input,
+        long: number_input,
+        complex: string_input,
+        "multiple_choice": mchoice_input,
+        "upload_file": upload_input
+    }
+
+    return ''.join(['<tr><td class="right">',
+                    ('<span class="required">*</span>' + option.Name) if option.Required else option.Name,
+                    '</td><td>',
+                    input_switch[option.Type](),
+                    '</td></tr><tr><td></td><td>',
+                    option.Help,
+                    '</td></tr><tr><td>&nbsp;</td></tr>'
+                    ])
+
+def legacy_command_page_writer(interface, write, errors, postvars):
+    """``HTMLInterface.command_page_writer`` before form templates"""
+    write('<!DOCTYPE html><html><head><title>%s</title>' % interface.CommandName)
+    write('<link rel="stylesheet" href="%s"/>' % interface.StylesheetPath)
+    write('</head><body><h1>%s</h1><div id="content">' % interface.CommandName)
+
+    write(interface._build_usage_lines([opt for opt in interface._get_inputs() if opt.Required]))
+
+    write('<p>An (<span class="required">*</span>) denotes a required field.</p>')
+
+    for e in errors:
+        write('<div class="error">%s</div>' % e)
+
+    write('<form method="POST" enctype="multipart/form-data">')
+    write('<table>')
+    for i in interface._get_inputs():
+        full_name = interface._html_input_prefix + i.Name
+        if full_name in postvars and i.Type is not 'upload_file':
+            default = i.cast_value(postvars[full_name])
+            write(legacy_get_html(i, interface._html_input_prefix, value=default))
+        else:
+            write(legacy_get_html(i, interface._html_input_prefix))
+
+    write('</table>')
+    write('<input type="submit">')
+    write('</form>')
+    write('</div></body></html>')
+
+def time_per_render(f):
+    """Return the best observed time per render of ``f``, in microseconds"""
+    return min(repeat(f, number=NUMBER, repeat=REPEAT)) / NUMBER * 1e6
+
+def main():
+    interface = HTMLInterfaceRegistry('pyqi.interfaces.html.config').get(
+        'make-command')
+    errors = ['Error: download-file is required.']
+    postvars = dict([(k, MiniFieldStorage(k, v)) for k, v in
+                     [('pyqi_name', 'foo'), ('pyqi_author', 'bar'),
+                      ('pyqi_test-code', 'True')]])
+
+    def new():
+        return render_page(
+            lambda write: interface.command_page_writer(write, errors,
+                                                        postvars))
+
+    def legacy():
+        return render_page(
+            lambda write: legacy_command_page_writer(interface, write, errors,
+                                                     postvars))
+
+    assert new() == legacy()
+
+    new_time = time_per_render(new)
+    legacy_time = time_per_render(legacy)
+
+    print "Form template: %.2f us/page" % new_time
+    print "Legacy:        %.2f us/page" % legacy_time
+    print "Speedup:       %.2fx" % (legacy_time / new_time)
+
+if __name__ == '__main__':
+    main()
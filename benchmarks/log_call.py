@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Measure the per-call overhead of logging, disabled and enabled
+
+Disabled calls go to a ``NullLogger`` or are below a logger's level; enabled
+calls are written to ``os.devnull``. Run from the top-level of the
+repository:
+
+    python benchmarks/log_call.py
+"""
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import os
+from timeit import repeat
+import pyqi.core.log
+from pyqi.core.log import (NullLogger, StdErrLogger, JSONLinesLogger,
+                           QueuedLogger)
+from command_call import BenchCommand
+
+NUMBER = 100000
+REPEAT = 5
+
+def time_per_call(f):
+    """Return the best observed time per call of ``f``, in microseconds"""
+    return min(repeat(f, number=NUMBER, repeat=REPEAT)) / NUMBER * 1e6
+
+def main():
+    devnull = open(os.devnull, 'w')
+    pyqi.core.log.stderr = devnull
+
+    loggers = [('NullLogger', NullLogger()),
+               ('StdErrLogger(level=WARN)', StdErrLogger(level='WARN')),
+               ('StdErrLogger', StdErrLogger()),
+               ('JSONLinesLogger', JSONLinesLogger(devnull)),
+               ('QueuedLogger', QueuedLogger(devnull, overflow='block'))]
+
+    print "Logger.info('%s', arg):"
+    for name, logger in loggers:
+        print "  %-26s %.2f us/call" % (name, time_per_call(
+                lambda: logger.info('Processed %s', 'foo')))
+        logger.flush()
+
+    print
+    print "Command.__call__:"
+    cmd = BenchCommand()
+    for name, logger in loggers:
+        cmd._logger = logger
+        print "  %-26s %.2f us/call" % (name, time_per_call(lambda: cmd(a=1)))
+        logger.flush()
+
+if __name__ == '__main__':
+    main()
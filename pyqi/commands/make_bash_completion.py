@@ -16,7 +16,7 @@ __credits__ = ["Daniel McDonald", "Jai Ram Rideout", "Doug Wendel",
 import importlib
 from pyqi.core.command import (Command, CommandIn, CommandOut, 
     ParameterCollection)
-from pyqi.core.interface import get_command_names, get_command_config
+from pyqi.core.manifest import get_command_manifest
 
 def _get_cfg_module(desc):
     """Load a module"""
@@ -78,21 +78,15 @@ class BashCompletion(Command):
         driver = kwargs['driver_name']
         cfg_mod_path = kwargs['command_config_module']
         cfg_mod = _get_cfg_module(cfg_mod_path)
-        command_names = get_command_names(cfg_mod_path)
-        command_list = ' '.join(command_names)
+        manifest = get_command_manifest(cfg_mod_path)
+        command_list = ' '.join([entry['name'] for entry in manifest])
 
         commands = []
-        for cmd in command_names:
-            cmd_cfg, _ = get_command_config(cfg_mod_path, cmd,
-                                            exit_on_failure=False)
-
-            if cmd_cfg is not None:
-                command_options = []
-                command_options.extend(
-                        sorted(['--%s' % p.Name for p in cmd_cfg.inputs]))
-                opts = ' '.join(command_options)
-
-                commands.append(command_fmt % {'command':cmd, 'options':opts})
+        for entry in manifest:
+            if entry['error'] is None:
+                opts = ' '.join(entry['options'])
+                commands.append(command_fmt % {'command':entry['name'],
+                                               'options':opts})
 
         all_commands = ''.join(commands)
         return {'result':script_fmt % {'driver':driver,
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+from __future__ import division
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+from pyqi.core.command import (Command, CommandIn, CommandOut,
+                               ParameterCollection)
+from pyqi.core.interfaces.optparse.daemon import start_daemon
+
+class ServeCLI(Command):
+    BriefDescription = "Start a server that keeps commands loaded"
+    LongDescription = ("Start a server that imports all commands in the "
+        "command_config_module once, and then runs commands forwarded to it "
+        "over a Unix socket. A driver uses the server when the "
+        "PYQI_DAEMON_SOCKET environment variable is set to the socket path, "
+        "avoiding the cost of importing and constructing the command on "
+        "every invocation.")
+    CommandIns = ParameterCollection([
+        CommandIn(Name='socket_path', DataType=str,
+                  Description='The path of the Unix socket to listen on',
+                  Required=True),
+
+        CommandIn(Name='command_config_module', DataType=str,
+                  Description='The CLI command configuration module to serve',
+                  Required=False, Default='pyqi.interfaces.optparse.config')
+    ])
+
+    CommandOuts = ParameterCollection([
+          CommandOut(Name='result', DataType=str,
+                    Description='Signals the termination of the server')
+          ])
+
+    def run(self, **kwargs):
+        """Serve the command_config_module on socket_path"""
+        fin = start_daemon(kwargs['socket_path'],
+                           kwargs['command_config_module'])
+
+        return {'result': fin}
+
+CommandConstructor = ServeCLI
@@ -13,7 +13,7 @@ from __future__ import division
 __credits__ = ["Evan Bolyen"]
 
 from pyqi.core.command import (Command, CommandIn, CommandOut, ParameterCollection)
-from pyqi.core.interfaces.html import start_server
+from pyqi.core.interfaces.html import start_server, SERVER_MODES
 
 class ServeHTMLInterface(Command):
     BriefDescription = "Start the HTMLInterface server"
@@ -26,7 +26,72 @@ class ServeHTMLInterface(Command):
 
         CommandIn(Name='interface_module', DataType=str,
                   Description='The module to serve the interface for',
-                  Required=True)
+                  Required=True),
+
+        CommandIn(Name='server_mode', DataType=str,
+                  Description='How to handle concurrent requests: %s' %
+                              ', '.join(SERVER_MODES),
+                  Required=False, Default='single',
+                  ValidateValue=lambda x: x in SERVER_MODES),
+
+        CommandIn(Name='workers', DataType=int,
+                  Description='The number of worker threads (pool mode) or '
+                              'processes (prefork mode)',
+                  Required=False, Default=4,
+                  ValidateValue=lambda x: x > 0),
+
+        CommandIn(Name='max_queue_depth', DataType=int,
+                  Description='The maximum number of requests waiting for a '
+                              'worker thread in pool mode (0 for no limit)',
+                  Required=False, Default=64,
+                  ValidateValue=lambda x: x >= 0),
+
+        CommandIn(Name='jobs_dir', DataType=str,
+                  Description='The directory to store the results of '
+                              'background jobs in (default: $PYQI_JOBS_DIR '
+                              'or ~/.pyqi/jobs)',
+                  Required=False, Default=None),
+
+        CommandIn(Name='job_workers', DataType=int,
+                  Description='The number of background jobs to run at once',
+                  Required=False, Default=2,
+                  ValidateValue=lambda x: x > 0),
+
+        CommandIn(Name='job_expiry', DataType=int,
+                  Description='The number of seconds to keep the results of '
+                              'background jobs for',
+                  Required=False, Default=86400,
+                  ValidateValue=lambda x: x > 0),
+
+        CommandIn(Name='max_upload_size', DataType=int,
+                  Description='The maximum size of a request body in bytes '
+                              '(default: no limit)',
+                  Required=False, Default=None,
+                  ValidateValue=lambda x: x is None or x > 0),
+
+        CommandIn(Name='upload_memory_threshold', DataType=int,
+                  Description='Uploaded files larger than this many bytes '
+                              'are spooled to temporary files',
+                  Required=False, Default=1024 * 1024,
+                  ValidateValue=lambda x: x >= 0),
+
+        CommandIn(Name='upload_dir', DataType=str,
+                  Description='The directory to spool uploaded files to '
+                              '(default: the system temporary directory)',
+                  Required=False, Default=None),
+
+        CommandIn(Name='keep_alive_timeout', DataType=float,
+                  Description='The number of seconds to keep an idle '
+                              'connection open for',
+                  Required=False, Default=5.0,
+                  ValidateValue=lambda x: x > 0),
+
+        CommandIn(Name='max_keep_alive_requests', DataType=int,
+                  Description='The maximum number of requests to handle on '
+                              'one connection (0 for no limit; default: 100 '
+                              'in thread mode, 1 otherwise)',
+                  Required=False, Default=None,
+                  ValidateValue=lambda x: x is None or x >= 0)
     ])
 
     CommandOuts = ParameterCollection([
@@ -37,7 +102,20 @@ class ServeHTMLInterface(Command):
 
     def run(self, **kwargs):
         """Start the HTMLInterface server with the port and interface_module"""
-        fin = start_server(kwargs['port'], kwargs['interface_module'])
+        fin = start_server(kwargs['port'], kwargs['interface_module'],
+                           server_mode=kwargs['server_mode'],
+                           workers=kwargs['workers'],
+                           max_queue_depth=kwargs['max_queue_depth'],
+                           jobs_dir=kwargs['jobs_dir'],
+                           job_workers=kwargs['job_workers'],
+                           job_expiry=kwargs['job_expiry'],
+                           max_upload_size=kwargs['max_upload_size'],
+                           upload_memory_threshold=
+                               kwargs['upload_memory_threshold'],
+                           upload_dir=kwargs['upload_dir'],
+                           keep_alive_timeout=kwargs['keep_alive_timeout'],
+                           max_keep_alive_requests=
+                               kwargs['max_keep_alive_requests'])
 
         return {'result': fin}
 
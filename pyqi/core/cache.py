@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Result caches for ``Command`` objects
+
+A ``Command`` subclass that sets ``Cacheable = True`` has its results cached,
+keyed on the ``Command`` class and its validated kwargs (after defaults have
+been applied). On a cache hit, ``Command.run`` is not executed. Only set
+``Cacheable`` on commands whose results depend solely on their
+``CommandIns``.
+
+The cache used is the ``Command`` class' ``ResultCache``, or
+``default_cache`` (an in-memory ``LRUCache``) if that is ``None``.
+"""
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import os
+import cPickle
+from collections import OrderedDict
+from hashlib import sha1
+from tempfile import mkstemp
+from threading import Lock
+from time import time
+from os.path import exists, join
+from pyqi.core.exception import IncompetentDeveloperError
+
+def make_cache_key(command_class, kwargs):
+    """Return a stable hash of a ``Command`` class and its kwargs
+
+    ``None`` is returned if the kwargs cannot be hashed (i.e., pickled), in
+    which case the result should not be cached.
+    """
+    items = sorted(kwargs.iteritems())
+
+    try:
+        serialized = cPickle.dumps(items, cPickle.HIGHEST_PROTOCOL)
+    except (cPickle.PicklingError, TypeError, AttributeError):
+        return None
+
+    h = sha1('%s.%s' % (command_class.__module__, command_class.__name__))
+    h.update(serialized)
+    return h.hexdigest()
+
+class ResultCache(object):
+    """Base class for ``Command`` result caches
+
+    ``max_size`` is the maximum number of results to keep (``None`` for no
+    limit), and ``ttl`` is the number of seconds a result stays valid for
+    (``None`` for no expiry). Hits and misses are counted.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        if max_size is not None and max_size < 1:
+            raise IncompetentDeveloperError("max_size must be at least 1, "
+                                            "not %r." % max_size)
+        self.MaxSize = max_size
+        self.TTL = ttl
+        self.Hits = 0
+        self.Misses = 0
+        self._lock = Lock()
+
+    def get(self, key):
+        """Return the cached result for ``key``, or ``None`` on a miss"""
+        with self._lock:
+            result = self._get(key)
+
+            if result is None:
+                self.Misses += 1
+            else:
+                self.Hits += 1
+
+        return result
+
+    def set(self, key, result):
+        """Cache ``result`` under ``key``"""
+        with self._lock:
+            self._set(key, result)
+
+    def clear(self):
+        """Remove all cached results and reset the counters"""
+        with self._lock:
+            self._clear()
+            self.Hits = 0
+            self.Misses = 0
+
+    def _is_expired(self, timestamp):
+        return self.TTL is not None and time() - timestamp > self.TTL
+
+    def _get(self, key):
+        raise NotImplementedError("All subclasses must implement _get.")
+
+    def _set(self, key, result):
+        raise NotImplementedError("All subclasses must implement _set.")
+
+    def _clear(self):
+        raise NotImplementedError("All subclasses must implement _clear.")
+
+class LRUCache(ResultCache):
+    """Keep pickled results in memory, evicting the least recently used
+
+    Results are pickled so that callers can't modify a cached result, even
+    one nested inside it. Results that can't be pickled aren't cached.
+    """
+
+    def __init__(self, max_size=128, ttl=None):
+        super(LRUCache, self).__init__(max_size=max_size, ttl=ttl)
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def _get(self, key):
+        try:
+            timestamp, result = self._results.pop(key)
+        except KeyError:
+            return None
+
+        if self._is_expired(timestamp):
+            return None
+
+        # reinsert to mark as most recently used
+        self._results[key] = (timestamp, result)
+        return cPickle.loads(result)
+
+    def _set(self, key, result):
+        try:
+            data = cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL)
+        except (cPickle.PicklingError, TypeError, AttributeError):
+            return
+
+        self._results.pop(key, None)
+        self._results[key] = (time(), data)
+
+        while self.MaxSize is not None and len(self._results) > self.MaxSize:
+            self._results.popitem(last=False)
+
+    def _clear(self):
+        self._results.clear()
+
+class DiskCache(ResultCache):
+    """Keep pickled results in a directory, evicting the least recently used
+
+    Each result is stored in its own file, along with the time it was
+    cached, which ``ttl`` is measured from. File modification times track
+    recency of use. Results must be picklable. The directory can be shared by
+    several processes.
+    """
+    Suffix = '.pyqi-result'
+
+    def __init__(self, cache_dir, max_size=None, ttl=None):
+        super(DiskCache, self).__init__(max_size=max_size, ttl=ttl)
+        self.CacheDir = cache_dir
+
+        if not exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def __len__(self):
+        return len(self._get_entries())
+
+    def _get_path(self, key):
+        return join(self.CacheDir, key + self.Suffix)
+
+    def _get_entries(self):
+        return [join(self.CacheDir, f) for f in os.listdir(self.CacheDir)
+                if f.endswith(self.Suffix)]
+
+    def _get(self, key):
+        path = self._get_path(key)
+
+        try:
+            with open(path, 'rb') as f:
+                record = cPickle.load(f)
+
+            # files from before records were timestamped hold just the result
+            if not isinstance(record, tuple):
+                return None
+
+            timestamp, result = record
+            if self._is_expired(timestamp):
+                os.remove(path)
+                return None
+
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            return None
+
+        return result
+
+    def _set(self, key, result):
+        try:
+            data = cPickle.dumps((time(), result), cPickle.HIGHEST_PROTOCOL)
+        except (cPickle.PicklingError, TypeError, AttributeError):
+            return
+
+        # write then rename so that readers never see a partial file
+        fd, tmp_path = mkstemp(dir=self.CacheDir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_path, self._get_path(key))
+
+        if self.MaxSize is not None:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self._get_entries():
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except OSError:
+                pass
+
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.MaxSize)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _clear(self):
+        for path in self._get_entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+default_cache = LRUCache()
@@ -14,7 +14,11 @@ __credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
 
 import sys, traceback
 import re
-from pyqi.core.log import NullLogger
+from time import time
+from types import GeneratorType
+from pyqi.core.log import NullLogger, get_size
+from pyqi.core.future import Future, run_coroutine
+from pyqi.core.cache import default_cache, make_cache_key
 from pyqi.core.exception import (IncompetentDeveloperError,
                                  InvalidReturnTypeError,
                                  UnknownParameterError,
@@ -82,7 +86,17 @@ class CommandIn(Parameter):
 
 class CommandOut(Parameter):
     """A ``Command`` output variable type"""
-    def __init__(self, Name, DataType, Description, **kwargs):
+    def __init__(self, Name, DataType, Description, Streaming=False,
+                 **kwargs):
+        """
+
+        If ``Streaming`` is ``True``, ``Command.run`` may return any iterable
+        (e.g., a generator) for this output, and its items are consumed lazily
+        by the interface's output handler. ``DataType`` then describes the
+        items rather than the container.
+        """
+        self.Streaming = Streaming
+
         super(CommandOut, self).__init__(Name, DataType, Description, 
                                          **kwargs)
 
@@ -109,6 +123,46 @@ class ParameterCollection(dict):
         raise TypeError("ParameterCollections are immutable")
     __delattr__ = __setitem__
 
+class ValidationPlan(object):
+    """Precomputed validation state for a ``Command`` class
+
+    Everything ``Command.__call__`` needs to know about ``CommandIns`` and
+    ``CommandOuts`` is derived once here, so that individual calls do not
+    have to walk the ``ParameterCollection`` objects or format log messages.
+    """
+
+    def __init__(self, command_class):
+        self.CommandClass = command_class
+        self.CommandIns = command_class.CommandIns
+        self.CommandOuts = command_class.CommandOuts
+        self.CommandStr = str(command_class)
+
+        cmd_ins = self.CommandIns.values()
+        self.Required = frozenset([p.Name for p in cmd_ins if p.Required])
+        self.Known = frozenset(self.CommandIns)
+        self.Defaults = dict([(p.Name, p.Default) for p in cmd_ins
+                              if not p.Required])
+        self.DefaultNames = frozenset(self.Defaults)
+        self.Validators = [(p.Name, p.ValidateValue) for p in cmd_ins
+                           if p.ValidateValue]
+
+        self.OutputOrder = [p.Name for p in self.CommandOuts.values()]
+        self.Outputs = frozenset(self.OutputOrder)
+        self.Streams = [p.Name for p in self.CommandOuts.values()
+                        if p.Streaming]
+
+        self.StartMessage = 'Starting command: %s' % self.CommandStr
+        self.CompletedMessage = 'Completed command: %s' % self.CommandStr
+        self.ErrorMessage = 'Error executing command: %s' % self.CommandStr
+        self.ReturnTypeMessage = ('Unsupported result return type for '
+                                  'command: %s' % self.CommandStr)
+        self.CacheHitMessage = ('Using cached result for command: %s' %
+                                self.CommandStr)
+        self.StartBatchMessage = ('Starting batch for command: %s' %
+                                  self.CommandStr)
+        self.CompletedBatchMessage = ('Completed batch for command: %s '
+                                      '(%%d calls)' % self.CommandStr)
+
 class Command(object):
     """Base class for ``Command``
 
@@ -120,38 +174,267 @@ class Command(object):
     LongDescription = """""" # longer, more detailed description
     CommandIns = ParameterCollection([])
     CommandOuts = ParameterCollection([])
+    Cacheable = False # results depend only on the CommandIns
+    ResultCache = None # defaults to pyqi.core.cache.default_cache
+    _validation_plan = None
 
     def __init__(self, **kwargs):
         """ """
         self._logger = NullLogger()
 
     def __call__(self, **kwargs):
-        """Safely execute a ``Command``"""
-        self_str = str(self.__class__)
-        self._logger.info('Starting command: %s' % self_str)
-        
+        """Safely execute a ``Command``
+
+        If the logger's ``TimesPhases`` is set, the time taken to validate
+        the kwargs, run and validate the result is logged with its ``phase``
+        method once each phase has completed.
+        """
+        plan = self._get_validation_plan()
+        timed = self._logger.TimesPhases
+        self._logger.info(plan.StartMessage)
+
+        if timed:
+            start = time()
         self._validate_kwargs(kwargs)
         self._set_defaults(kwargs)
+        if timed:
+            start = self._log_phase('validate', start, kwargs, None)
+
+        cache_key = None
+        if self.Cacheable:
+            cache_key, result = self._cache_lookup(kwargs, plan)
+            if result is not None:
+                return result
 
         try:
             result = self.run(**kwargs)
+
+            # run is a coroutine (see acall), so wait for it here
+            if isinstance(result, GeneratorType):
+                result = run_coroutine(result).get()
         except Exception:
-            self._logger.fatal('Error executing command: %s' % self_str)
+            self._logger.fatal(plan.ErrorMessage)
             raise
         else:
-            self._logger.info('Completed command: %s' % self_str)
+            self._logger.info(plan.CompletedMessage)
+
+        if timed:
+            start = self._log_phase('run', start, kwargs, result)
+        self._check_result_type(result, plan)
+        self._validate_result(result)
+        if timed:
+            self._log_phase('validate_result', start, result, None)
+
+        if cache_key is not None:
+            self._get_result_cache().set(cache_key, result)
+
+        return result
+
+    def acall(self, **kwargs):
+        """Execute a ``Command`` and return a ``Future`` of its result
+
+        ``run`` may be a coroutine: a generator that yields futures (see
+        ``pyqi.core.future``) and then yields its result. It is resumed with
+        each future's result once that is ready, so a ``Command`` waiting on
+        I/O doesn't tie up a thread, and the returned ``Future`` is completed
+        by whatever completes the last future it waited for. Any other
+        ``run`` is executed before ``acall`` returns.
+
+        The kwargs and result are validated, defaulted and cached exactly as
+        by ``__call__``, but errors are raised by the ``Future``'s ``get``.
+        """
+        plan = self._get_validation_plan()
+        future = Future()
+        self._logger.info(plan.StartMessage)
+
+        try:
+            self._validate_kwargs(kwargs)
+            self._set_defaults(kwargs)
+
+            cache_key = None
+            if self.Cacheable:
+                cache_key, result = self._cache_lookup(kwargs, plan)
+                if result is not None:
+                    future.set_result(result)
+                    return future
+        except Exception:
+            future.set_exc_info(sys.exc_info())
+            return future
+
+        try:
+            result = self.run(**kwargs)
+        except Exception:
+            self._logger.fatal(plan.ErrorMessage)
+            future.set_exc_info(sys.exc_info())
+            return future
+
+        def finish(run_future):
+            try:
+                result = run_future.get()
+            except Exception:
+                self._logger.fatal(plan.ErrorMessage)
+                future.set_exc_info(sys.exc_info())
+                return
+
+            self._logger.info(plan.CompletedMessage)
+            try:
+                self._check_result_type(result, plan)
+                self._validate_result(result)
+            except Exception:
+                future.set_exc_info(sys.exc_info())
+                return
+
+            if cache_key is not None:
+                self._get_result_cache().set(cache_key, result)
+            future.set_result(result)
+
+        if isinstance(result, GeneratorType):
+            run_coroutine(result).add_done_callback(finish)
+        else:
+            run_future = Future()
+            run_future.set_result(result)
+            finish(run_future)
+
+        return future
+
+    def map(self, iterable_of_kwargs):
+        """Execute a ``Command`` once per kwargs ``dict``, yielding results
+
+        This is equivalent to ``(self(**kwargs) for kwargs in
+        iterable_of_kwargs)``, but the structural checks performed by
+        ``_validate_kwargs`` and the defaults to fill in are worked out only
+        once per distinct set of keys. ``ValidateValue`` functions still run
+        for every item. Start and completion are logged once for the batch
+        rather than once per item.
 
-        # verify the result type
+        If a subclass overrides ``_validate_kwargs`` or ``_set_defaults``, the
+        override is called for every item.
+        """
+        plan = self._get_validation_plan()
+        per_item_validation = self._overrides('_validate_kwargs')
+        per_item_defaults = self._overrides('_set_defaults')
+        shapes = {}
+        count = 0
+
+        self._logger.info(plan.StartBatchMessage)
+
+        for kwargs in iterable_of_kwargs:
+            kwargs = dict(kwargs)
+            shape = frozenset(kwargs)
+
+            try:
+                validators, defaults = shapes[shape]
+            except KeyError:
+                self._validate_kwargs(kwargs)
+                validators = [v for v in plan.Validators if v[0] in shape]
+                defaults = [(name, plan.Defaults[name])
+                            for name in plan.DefaultNames.difference(shape)]
+                shapes[shape] = (validators, defaults)
+            else:
+                if per_item_validation:
+                    self._validate_kwargs(kwargs)
+                else:
+                    self._validate_values(kwargs, validators, plan)
+
+            if per_item_defaults:
+                self._set_defaults(kwargs)
+            else:
+                kwargs.update(defaults)
+
+            cache_key = None
+            if self.Cacheable:
+                cache_key, result = self._cache_lookup(kwargs, plan)
+                if result is not None:
+                    count += 1
+                    yield result
+                    continue
+
+            try:
+                result = self.run(**kwargs)
+
+                if isinstance(result, GeneratorType):
+                    result = run_coroutine(result).get()
+            except Exception:
+                self._logger.fatal(plan.ErrorMessage)
+                raise
+
+            self._check_result_type(result, plan)
+            self._validate_result(result)
+
+            if cache_key is not None:
+                self._get_result_cache().set(cache_key, result)
+
+            count += 1
+            yield result
+
+        self._logger.info(plan.CompletedBatchMessage, count)
+
+    def _get_result_cache(self):
+        """Return the cache used when the ``Command`` is ``Cacheable``"""
+        if self.ResultCache is None:
+            return default_cache
+        return self.ResultCache
+
+    def _cache_lookup(self, kwargs, plan):
+        """Look up a cached result for validated, defaulted kwargs
+
+        Returns ``(key, result)``. ``result`` is ``None`` on a cache miss, and
+        ``key`` is ``None`` if the kwargs cannot be hashed or the results
+        include streams, which can only be consumed once.
+        """
+        if plan.Streams:
+            return None, None
+
+        key = make_cache_key(self.__class__, kwargs)
+        if key is None:
+            return None, None
+
+        result = self._get_result_cache().get(key)
+        if result is not None:
+            self._logger.info(plan.CacheHitMessage)
+
+        return key, result
+
+    def _log_phase(self, phase, start, inputs, outputs):
+        """Log a phase that started at ``start``, returning the time now
+
+        The time taken to log the phase isn't counted in the next one.
+        """
+        self._logger.phase(self.__class__, phase, time() - start,
+                           get_size(inputs),
+                           None if outputs is None else get_size(outputs))
+        return time()
+
+    def _overrides(self, method_name):
+        """Return ``True`` if a subclass overrides the ``Command`` method"""
+        return getattr(self.__class__, method_name).im_func is not \
+                getattr(Command, method_name).im_func
+
+    def _check_result_type(self, result, plan):
+        """Verify that ``Command.run`` returned a ``dict``"""
         if not isinstance(result, dict):
-            self._logger.fatal('Unsupported result return type for command: '
-                               '%s' % self_str)
+            self._logger.fatal(plan.ReturnTypeMessage)
             raise InvalidReturnTypeError("Unsupported result return type. "
                                          "Results must be stored in a "
                                          "dictionary.")
 
-        self._validate_result(result)
+    @classmethod
+    def _get_validation_plan(cls):
+        """Return the ``ValidationPlan`` for this ``Command`` class
 
-        return result
+        The plan is built on first use and cached on the class itself (not on
+        a base class), so each subclass gets its own. It is rebuilt if
+        ``CommandIns`` or ``CommandOuts`` are reassigned.
+        """
+        plan = cls._validation_plan
+
+        if plan is None or plan.CommandClass is not cls or \
+                plan.CommandIns is not cls.CommandIns or \
+                plan.CommandOuts is not cls.CommandOuts:
+            plan = ValidationPlan(cls)
+            cls._validation_plan = plan
+
+        return plan
 
     def _validate_kwargs(self, kwargs):
         """Validate input kwargs prior to executing a ``Command``
@@ -159,56 +442,83 @@ class Command(object):
         This method can be overridden by subclasses. The baseclass defines only
         a basic validation.
         """
-        self_str = str(self.__class__)
+        plan = self._get_validation_plan()
 
         # check required parameters
-        for p in self.CommandIns.values():
-            if p.Required and p.Name not in kwargs:
-                err_msg = 'Missing required CommandIn %s in %s' % (p.Name, 
-                                                                   self_str)
-                self._logger.fatal(err_msg)
-                raise MissingParameterError(err_msg)
+        if not plan.Required.issubset(kwargs):
+            missing = sorted(plan.Required.difference(kwargs))[0]
+            err_msg = 'Missing required CommandIn %s in %s' % (missing,
+                                                               plan.CommandStr)
+            self._logger.fatal(err_msg)
+            raise MissingParameterError(err_msg)
 
-            if p.Name in kwargs and p.ValidateValue:
-                if not p.ValidateValue(kwargs[p.Name]):
-                    err_msg = "CommandIn %s cannot take value %s in %s" % \
-                                (p.Name, kwargs[p.Name], self_str)
-                    self._logger.fatal(err_msg)
-                    raise ValueError(err_msg)
+        self._validate_values(kwargs, plan.Validators, plan)
 
         # make sure we only have things we expect
-        for opt in kwargs:
-            if opt not in self.CommandIns:
-                err_msg = 'Unknown CommandIn %s in %s' % (opt, self_str)
-                self._logger.fatal(err_msg)
-                raise UnknownParameterError(err_msg)
+        if not plan.Known.issuperset(kwargs):
+            for opt in kwargs:
+                if opt not in plan.Known:
+                    err_msg = 'Unknown CommandIn %s in %s' % (opt,
+                                                              plan.CommandStr)
+                    self._logger.fatal(err_msg)
+                    raise UnknownParameterError(err_msg)
     
+    def _validate_values(self, kwargs, validators, plan):
+        """Apply ``ValidateValue`` functions to the values in kwargs
+
+        ``validators`` is a list of ``(name, function)`` pairs, typically
+        ``plan.Validators`` or a subset of it.
+        """
+        for name, validate_value in validators:
+            if name in kwargs and not validate_value(kwargs[name]):
+                err_msg = "CommandIn %s cannot take value %s in %s" % \
+                            (name, kwargs[name], plan.CommandStr)
+                self._logger.fatal(err_msg)
+                raise ValueError(err_msg)
+
     def _validate_result(self, result):
         """Validate the result from a ``Command.run``"""
-        self_str = str(self.__class__)
+        plan = self._get_validation_plan()
 
-        for p in self.CommandOuts.values():
-            if p.Name not in result:
-                err_msg = "CommandOut %s not in %s" % (p.Name, self_str)
+        if result.viewkeys() == plan.Outputs:
+            self._validate_streams(result, plan)
+            return
+
+        for name in plan.OutputOrder:
+            if name not in result:
+                err_msg = "CommandOut %s not in %s" % (name, plan.CommandStr)
                 self._logger.fatal(err_msg)
                 raise UnknownParameterError(err_msg)
         for k in result:
-            if k not in self.CommandOuts:
-                err_msg = "Unknown CommandOut %s in %s" % (k, self_str)
+            if k not in plan.Outputs:
+                err_msg = "Unknown CommandOut %s in %s" % (k, plan.CommandStr)
                 self._logger.fatal(err_msg)
                 raise UnknownParameterError(err_msg)
 
+    def _validate_streams(self, result, plan):
+        """Check that streaming ``CommandOuts`` are iterable
+
+        The items are not inspected, so the stream is not consumed.
+        """
+        for name in plan.Streams:
+            if not hasattr(result[name], '__iter__'):
+                err_msg = "Streaming CommandOut %s in %s is not iterable" % \
+                            (name, plan.CommandStr)
+                self._logger.fatal(err_msg)
+                raise InvalidReturnTypeError(err_msg)
+
     def _set_defaults(self, kwargs):
         """Set defaults for optional parameters"""
-        for p in self.CommandIns.values():
-            if not p.Required and p.Name not in kwargs:
-                kwargs[p.Name] = p.Default
+        plan = self._get_validation_plan()
+
+        for name in plan.DefaultNames.difference(kwargs):
+            kwargs[name] = plan.Defaults[name]
 
     def run(self, **kwargs):
         """Exexcute a ``Command``
         
         A ``Command`` must accept **kwargs to run, and must return a ``dict``
-        as a result.
+        as a result, or be a coroutine that yields one (see ``acall``).
         """
         raise NotImplementedError("All subclasses must implement run.")
 
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Executors for running many ``Command`` invocations
+
+An executor accepts ``Command`` instances and their kwargs, and runs them
+either serially, on a pool of threads, or on a pool of processes. Results
+are available through ``submit`` (a single invocation, returning a handle
+with a ``get`` method) or ``map`` (many invocations, returning an iterator
+over results in submission order).
+
+A ``Command`` is stateless apart from its logger, so the same instance can be
+shared across threads. For a ``ProcessPoolExecutor``, the ``Command`` instance
+and its kwargs must be picklable, which means the ``Command`` class must be
+importable (i.e., defined at the top level of a module).
+"""
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+from itertools import islice
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from pyqi.core.exception import IncompetentDeveloperError
+
+def _execute(command, kwargs):
+    """Execute a single ``Command`` invocation"""
+    return command(**kwargs)
+
+def _execute_chunk(args):
+    """Execute a chunk of invocations of the same ``Command``"""
+    command, chunk = args
+    return list(command.map(chunk))
+
+def _chunks(command, iterable_of_kwargs, chunksize):
+    """Group ``iterable_of_kwargs`` into (command, list) pairs"""
+    iterator = iter(iterable_of_kwargs)
+
+    while True:
+        chunk = list(islice(iterator, chunksize))
+
+        if not chunk:
+            return
+
+        yield command, chunk
+
+def _flatten(iterable_of_lists):
+    for items in iterable_of_lists:
+        for item in items:
+            yield item
+
+class CompletedResult(object):
+    """The result of an invocation that has already been executed
+
+    Mirrors the interface of ``multiprocessing.pool.AsyncResult``.
+    """
+
+    def __init__(self, value=None, error=None):
+        self._value = value
+        self._error = error
+
+    def get(self, timeout=None):
+        """Return the result, or raise the exception raised by the call"""
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def wait(self, timeout=None):
+        pass
+
+    def ready(self):
+        return True
+
+    def successful(self):
+        return self._error is None
+
+class Executor(object):
+    """Base class for ``Command`` executors
+
+    Executors can be used as context managers, in which case they are closed
+    on exit.
+    """
+
+    def submit(self, command, **kwargs):
+        """Schedule ``command(**kwargs)``
+
+        Returns an object with ``get``, ``wait``, ``ready`` and
+        ``successful`` methods, like ``multiprocessing.pool.AsyncResult``.
+        """
+        raise NotImplementedError("All subclasses must implement submit.")
+
+    def map(self, command, iterable_of_kwargs, chunksize=1):
+        """Execute ``command`` once per kwargs ``dict``
+
+        Returns an iterator over the results, in the same order as
+        ``iterable_of_kwargs``. Each chunk of ``chunksize`` kwargs dicts is
+        executed with ``Command.map`` by a single worker.
+        """
+        raise NotImplementedError("All subclasses must implement map.")
+
+    def close(self):
+        """Wait for outstanding work and release any workers"""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class SerialExecutor(Executor):
+    """Execute invocations in the calling thread"""
+
+    def submit(self, command, **kwargs):
+        try:
+            return CompletedResult(value=command(**kwargs))
+        except Exception, e:
+            return CompletedResult(error=e)
+
+    def map(self, command, iterable_of_kwargs, chunksize=1):
+        return command.map(iterable_of_kwargs)
+
+class _PoolExecutor(Executor):
+    """Execute invocations on a ``multiprocessing`` style pool"""
+    PoolConstructor = None
+
+    def __init__(self, workers=None):
+        if workers is not None and workers < 1:
+            raise IncompetentDeveloperError("An executor needs at least one "
+                                            "worker, not %r." % workers)
+        self._pool = self.PoolConstructor(workers)
+
+    def submit(self, command, **kwargs):
+        return self._pool.apply_async(_execute, (command, kwargs))
+
+    def map(self, command, iterable_of_kwargs, chunksize=1):
+        if chunksize < 1:
+            raise IncompetentDeveloperError("chunksize must be at least 1, "
+                                            "not %r." % chunksize)
+
+        chunks = _chunks(command, iterable_of_kwargs, chunksize)
+        return _flatten(self._pool.imap(_execute_chunk, chunks))
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+class ThreadPoolExecutor(_PoolExecutor):
+    """Execute invocations on a pool of threads
+
+    ``workers`` defaults to the number of CPUs. Threads are best suited to
+    ``Command`` objects that spend their time in I/O or in C extensions that
+    release the GIL.
+    """
+    PoolConstructor = ThreadPool
+
+class ProcessPoolExecutor(_PoolExecutor):
+    """Execute invocations on a pool of processes
+
+    ``workers`` defaults to the number of CPUs. ``Command`` instances, their
+    kwargs and their results must all be picklable.
+    """
+    PoolConstructor = staticmethod(Pool)
+
+def get_executor(name, workers=None):
+    """Return an executor by name: 'serial', 'thread' or 'process'"""
+    if name == 'serial':
+        return SerialExecutor()
+    elif name == 'thread':
+        return ThreadPoolExecutor(workers)
+    elif name == 'process':
+        return ProcessPoolExecutor(workers)
+    else:
+        raise IncompetentDeveloperError("Unknown executor '%s'. Must be one "
+                                        "of 'serial', 'thread' or "
+                                        "'process'." % name)
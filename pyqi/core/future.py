@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Results that become available later, and coroutines that wait for them
+
+A ``Future`` is completed by whatever produces its value: an event loop, a
+callback from a networking library or another thread. ``run_coroutine``
+drives a generator that yields ``Future`` objects, resuming it with each
+one's result once it is ready, so that code waiting on I/O doesn't need a
+thread of its own while it waits. This is how ``Command.acall`` runs a
+``Command`` whose ``run`` method is a generator.
+
+Any object with ``add_done_callback``, ``ready`` (or ``done``) and ``get``
+(or ``result``) methods, such as a ``concurrent.futures.Future``, can be
+yielded in place of a ``Future``.
+"""
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import sys
+from threading import Event, Lock
+
+class Future(object):
+    """The result of a computation that may not have finished
+
+    Mirrors the interface of ``multiprocessing.pool.AsyncResult``, with the
+    addition of ``add_done_callback``.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._done = Event()
+        self._value = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def get(self, timeout=None):
+        """Return the result, or raise the exception that was set
+
+        Waits at most ``timeout`` seconds (forever if ``None``) and raises a
+        ``RuntimeError`` if the result isn't available by then.
+        """
+        if not self._done.wait(timeout):
+            raise RuntimeError("Timed out waiting for the result.")
+
+        if self._exc_info is not None:
+            exc_type, exc_value, exc_traceback = self._exc_info
+            raise exc_type, exc_value, exc_traceback
+        return self._value
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+
+    def ready(self):
+        return self._done.is_set()
+
+    def successful(self):
+        return self.ready() and self._exc_info is None
+
+    def set_result(self, value):
+        self._finish(value, None)
+
+    def set_exc_info(self, exc_info):
+        """Fail with an exception, as returned by ``sys.exc_info()``"""
+        self._finish(None, exc_info)
+
+    def add_done_callback(self, callback):
+        """Call ``callback(future)`` once the result is available
+
+        If it already is, ``callback`` is called immediately. Otherwise it is
+        called by whatever completes the ``Future``.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _finish(self, value, exc_info):
+        with self._lock:
+            if self._done.is_set():
+                raise RuntimeError("The result has already been set.")
+            self._value = value
+            self._exc_info = exc_info
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            callback(self)
+
+def _is_done(future):
+    done = getattr(future, 'ready', None) or future.done
+    return done()
+
+def _get_outcome(future):
+    """Return ``(value, exc_info)`` for a completed future-like object"""
+    get = getattr(future, 'get', None) or future.result
+    try:
+        return get(), None
+    except Exception:
+        return None, sys.exc_info()
+
+def run_coroutine(coroutine):
+    """Run a generator that yields futures, and return a ``Future``
+
+    Each future the generator yields is waited for without blocking: the
+    generator is resumed with the future's result (or has the future's
+    exception raised inside it) by whatever completes the future. The first
+    value yielded that isn't a future is the coroutine's result, after which
+    the generator is closed. A generator that finishes without yielding a
+    result has a result of ``None``.
+    """
+    future = Future()
+
+    def step(value, exc_info):
+        # futures that are already done are handled in this loop rather than
+        # by callbacks, so long chains of them don't grow the stack
+        while True:
+            try:
+                if exc_info is None:
+                    yielded = coroutine.send(value)
+                else:
+                    yielded = coroutine.throw(*exc_info)
+            except StopIteration:
+                future.set_result(None)
+                return
+            except Exception:
+                future.set_exc_info(sys.exc_info())
+                return
+
+            if not hasattr(yielded, 'add_done_callback'):
+                coroutine.close()
+                future.set_result(yielded)
+                return
+
+            if not _is_done(yielded):
+                yielded.add_done_callback(
+                        lambda f: step(*_get_outcome(f)))
+                return
+
+            value, exc_info = _get_outcome(yielded)
+
+    step(None, None)
+    return future
@@ -12,14 +12,20 @@ __credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
                "Jai Ram Rideout", "Evan Bolyen"]
 
 import importlib
+import json
+import os
 from sys import exit, stderr
 from ConfigParser import SafeConfigParser
 from glob import glob
-from os.path import basename, dirname, expanduser, join
+from tempfile import mkstemp
+from os.path import basename, dirname, exists, expanduser, getmtime, join
+from time import time
 from pyqi.core.exception import IncompetentDeveloperError
+from pyqi.core.log import get_size
 
 class Interface(object):
     CommandConstructor = None
+    Timings = None # e.g., a pyqi.core.timing.PhaseTimings
 
     def __init__(self, **kwargs):
         """ """
@@ -35,11 +41,46 @@ class Interface(object):
         self._validate_inputs_outputs(self._get_inputs(), self._get_outputs())
     
     def __call__(self, in_, *args, **kwargs):
-        self._the_in_validator(in_)
-        cmd_input = self._input_handler(in_, *args, **kwargs)
-        cmd_result = self.CmdInstance(**cmd_input)
-        self._the_out_validator(cmd_result)
-        return self._output_handler(cmd_result)
+        self._run_phase('in_validator', self._the_in_validator, in_)
+        cmd_input = self._run_phase('input_handler', self._input_handler, in_,
+                                    *args, **kwargs)
+        cmd_result = self._run_phase('command', self.CmdInstance, **cmd_input)
+        self._run_phase('out_validator', self._the_out_validator, cmd_result)
+        return self._run_phase('output_handler', self._handle_output,
+                               cmd_result)
+
+    def _run_phase(self, phase, f, *args, **kwargs):
+        """Return ``f(*args, **kwargs)``, timing it if ``Timings`` is set
+
+        ``Timings`` can be any object with ``start(phase)`` and
+        ``finish(phase)`` methods, which are called before and after ``f``
+        (even if it raises an exception).
+        """
+        timings = self.Timings
+        if timings is None:
+            return f(*args, **kwargs)
+
+        timings.start(phase)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            timings.finish(phase)
+
+    def _handle_output(self, cmd_result):
+        """Call ``_output_handler``, logging the 'output' phase if wanted
+
+        The phase is logged with the ``Command``'s logger if its
+        ``TimesPhases`` is set (see ``pyqi.core.log.Logger.phase``).
+        """
+        logger = self.CmdInstance._logger
+        if not logger.TimesPhases:
+            return self._output_handler(cmd_result)
+
+        start = time()
+        output = self._output_handler(cmd_result)
+        logger.phase(self.CmdInstance.__class__, 'output', time() - start,
+                     get_size(cmd_result), get_size(output))
+        return output
 
     def _validate_usage_examples(self, usage_examples):
         """Perform validation on a list of ``InterfaceUsageExample`` objects.
@@ -262,12 +303,28 @@ class InterfaceUsageExample(object):
         """Interface specific usage example validation"""
         raise NotImplementedError("Must define in the subclass")
 
+# config_base_name -> (config dir, dir mtime, CommandList)
+_command_names_cache = {}
+
+# (config_base_name, command name) -> config module, for entry points
+_entry_point_configs = {}
+
 def get_command_names(config_base_name):
     """Return a list of available command names.
 
     Command names are strings and are returned in alphabetical order.
     ``config_base_name`` must be the python module path to a directory
     containing config files.
+
+    If the config module defines ``entry_point_group``, commands registered
+    under that entry point group are included too. Each entry point's name is
+    the command name and its module is the command's config module.
+
+    Results are cached, and the config directory is only scanned again if its
+    modification time changes. The names found in the directory are also
+    saved next to the command manifest (see ``pyqi.core.manifest``), so that
+    a new driver process only needs to stat the directory. Entry points are
+    looked up in every process.
     """
     # Load the interface configuration base.
     try:
@@ -277,27 +334,128 @@ def get_command_names(config_base_name):
                           config_base_name)
 
     config_base_dir = dirname(config_base_module.__file__)
+    cached = _command_names_cache.get(config_base_name)
 
-    # from http://stackoverflow.com/questions/1057431/loading-all-modules-in-a-folder-in-python
-    command_names = CommandList()
-    for f in glob(join(config_base_dir, '*.py')):
-        command_name = basename(f)
+    # a relative module path breaks if the working directory changes; keep
+    # using what was found before then
+    try:
+        config_base_mtime = getmtime(config_base_dir)
+    except OSError:
+        config_base_mtime = None
+
+    if cached is not None and cached[0] == config_base_dir and \
+            config_base_mtime in (None, cached[1]):
+        return CommandList(cached[2])
+
+    index_fp = None
+    dir_names = None
+    if config_base_mtime is not None:
+        index_fp = _get_command_names_index_path(config_base_name)
+        dir_names = _load_command_names_index(index_fp, config_base_dir,
+                                              config_base_mtime)
+
+    if dir_names is None:
+        # from http://stackoverflow.com/questions/1057431/loading-all-modules-in-a-folder-in-python
+        dir_names = []
+        for f in glob(join(config_base_dir, '*.py')):
+            command_name = basename(f)
+
+            if not command_name.startswith('__init__'):
+                dir_names.append(command_name[:-3])
+
+        if index_fp is not None:
+            _save_command_names_index(index_fp, config_base_dir,
+                                      config_base_mtime, dir_names)
+
+    command_names = CommandList(dir_names)
+
+    entry_point_group = getattr(config_base_module, 'entry_point_group', None)
+    if entry_point_group is not None:
+        for name, module_name in _get_entry_points(entry_point_group):
+            if name not in command_names:
+                command_names.append(name)
+                _entry_point_configs[(config_base_name,
+                                      command_names[-1])] = module_name
 
-        if not command_name.startswith('__init__'):
-            command_names.append(command_name[:-3])
     command_names.sort()
 
+    if config_base_mtime is not None:
+        _command_names_cache[config_base_name] = (config_base_dir,
+                                                  config_base_mtime,
+                                                  CommandList(command_names))
     return command_names
 
+COMMAND_NAMES_INDEX_VERSION = 1
+
+def _get_command_names_index_path(config_base_name):
+    # imported here because pyqi.core.manifest imports this module
+    from pyqi.core.manifest import get_manifest_path
+    return get_manifest_path(config_base_name, suffix='.names.json')
+
+def _load_command_names_index(index_fp, config_base_dir, config_base_mtime):
+    """Return the saved names for an unchanged config dir, or ``None``"""
+    try:
+        with open(index_fp) as f:
+            index = json.load(f)
+    except (IOError, ValueError):
+        return None
+
+    if not isinstance(index, dict) or \
+            index.get('version') != COMMAND_NAMES_INDEX_VERSION or \
+            index.get('dir') != config_base_dir or \
+            index.get('mtime') != config_base_mtime:
+        return None
+    return [name.encode('utf-8') for name in index['names']]
+
+def _save_command_names_index(index_fp, config_base_dir, config_base_mtime,
+                              names):
+    """Save the names found in a config dir; failing to is not an error"""
+    index = {'version': COMMAND_NAMES_INDEX_VERSION,
+             'dir': config_base_dir,
+             'mtime': config_base_mtime,
+             'names': names}
+    index_dir = dirname(index_fp)
+
+    try:
+        if not exists(index_dir):
+            os.makedirs(index_dir)
+
+        # write then rename so that readers never see a partial file
+        fd, tmp_fp = mkstemp(dir=index_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.rename(tmp_fp, index_fp)
+    except (IOError, OSError):
+        pass
+
+def _get_entry_points(group):
+    """Return (name, module name) pairs for an entry point group"""
+    try:
+        from pkg_resources import iter_entry_points
+    except ImportError:
+        return []
+
+    return [(ep.name, ep.module_name) for ep in iter_entry_points(group)]
+
+def get_command_config_module(command_config_module, cmd):
+    """Return the name of the config module for a ``Command``
+
+    This is the module registered through an entry point (see
+    ``get_command_names``) if there is one, and the module for ``cmd`` in
+    ``command_config_module`` otherwise.
+    """
+    return _entry_point_configs.get(
+            (command_config_module, cmd.replace('_', '-')),
+            '.'.join([command_config_module, cmd.replace('-', '_')]))
+
 def get_command_config(command_config_module, cmd, exit_on_failure=True):
     """Get the configuration for a ``Command``"""
     cmd_cfg = None
     error_msg = None
-    python_cmd_name = cmd.replace('-', '_')
+    module_name = get_command_config_module(command_config_module, cmd)
 
     try:
-        cmd_cfg = importlib.import_module('.'.join([command_config_module,
-                                                    python_cmd_name]))
+        cmd_cfg = importlib.import_module(module_name)
     except ImportError, e:
         error_msg = str(e)
 
@@ -311,15 +469,72 @@ def get_command_config(command_config_module, cmd, exit_on_failure=True):
     return cmd_cfg, error_msg
 
 class CommandList(list):
-    def __init__(self):
+    """A sorted-on-demand list of dashed command names with O(1) lookup
+
+    Names are converted to their dashed form as they are added. Every
+    method that changes the list keeps the set used by ``in`` up to date.
+    """
+    def __init__(self, iterable=()):
         super(CommandList, self).__init__()
+        self._names = set()
+        self.extend(iterable)
 
     def append(self, item):
-        super(CommandList, self).append(self._convert_to_dashed_name(item))
+        name = self._convert_to_dashed_name(item)
+        super(CommandList, self).append(name)
+        self._names.add(name)
+
+    def extend(self, iterable):
+        for item in iterable:
+            self.append(item)
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
+    def insert(self, index, item):
+        super(CommandList, self).insert(index,
+                                        self._convert_to_dashed_name(item))
+        self._sync_names()
+
+    def remove(self, item):
+        super(CommandList, self).remove(self._convert_to_dashed_name(item))
+        self._sync_names()
+
+    def pop(self, *args):
+        item = super(CommandList, self).pop(*args)
+        self._sync_names()
+        return item
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = [self._convert_to_dashed_name(v) for v in value]
+        else:
+            value = self._convert_to_dashed_name(value)
+        super(CommandList, self).__setitem__(index, value)
+        self._sync_names()
+
+    def __delitem__(self, index):
+        super(CommandList, self).__delitem__(index)
+        self._sync_names()
+
+    # list implements simple slices with these in Python 2
+    def __setslice__(self, i, j, values):
+        self.__setitem__(slice(max(0, i), max(0, j)), values)
+
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(max(0, i), max(0, j)))
+
+    def __imul__(self, n):
+        super(CommandList, self).__imul__(n)
+        self._sync_names()
+        return self
 
     def __contains__(self, item):
-        return super(CommandList,
-                     self).__contains__(self._convert_to_dashed_name(item))
+        return self._convert_to_dashed_name(item) in self._names
+
+    def _sync_names(self):
+        self._names = set(self)
 
     def _convert_to_dashed_name(self, name):
         return name.replace('_', '-')
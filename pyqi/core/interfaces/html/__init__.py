@@ -11,19 +11,41 @@
 __credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
     "Greg Caporaso"]
 
+import errno
+import json
 import os
 import types
 import os.path
+import signal
+import socket
+import sys
 from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
-from cgi import parse_header, parse_multipart, parse_qs, FieldStorage
+from Queue import Queue, Full
+from SocketServer import ThreadingMixIn
+from threading import Lock, Thread, local
+from time import time
+from urlparse import urlsplit
+from cgi import (parse_header, parse_multipart, parse_qs, escape,
+                 FieldStorage)
 from copy import copy
 from glob import glob
 from os.path import abspath, exists, isdir, isfile, split
 from pyqi.core.interface import (Interface, InterfaceOutputOption, InterfaceInputOption,
                                  InterfaceUsageExample, get_command_names, get_command_config)
 from pyqi.core.factory import general_factory
+from pyqi.core.interfaces.html.api import get_command_kwargs, dump_result
+from pyqi.core.interfaces.html.jobs import JobQueue, COMPLETED, FAILED
+from pyqi.core.interfaces.html.keepalive import RequestBody
+from pyqi.core.interfaces.html.metrics import (Metrics, CountingWriter,
+                                               CONTENT_TYPE as METRICS_CONTENT_TYPE)
+from pyqi.core.interfaces.html.routing import Router
+from pyqi.core.interfaces.html.static import (StaticContent, choose_encoding,
+                                              encode, is_not_modified)
+from pyqi.core.interfaces.html.streaming import get_content_length, iter_chunks
+from pyqi.core.interfaces.html.upload import spooled_field_storage_factory
 from pyqi.core.exception import IncompetentDeveloperError
 from pyqi.core.command import Parameter
+from pyqi.core.future import Future
 from pyqi.util import get_version_string
 
 class HTMLResult(InterfaceOutputOption):
@@ -35,13 +57,19 @@ class HTMLResult(InterfaceOutputOption):
         self.MIMEType = MIMEType;
 
 class HTMLDownload(HTMLResult):
-    """Result class for downloading a file from the server"""
+    """Result class for downloading a file from the server
+
+    The (handled) result can be a string, a file object or an iterable of
+    strings, which are streamed to the client. If ``FilePath`` is ``True``,
+    the result is instead the path of the file to download.
+    """
     def __init__(self, FileExtension=None, FilenameLookup=None, DefaultFilename=None, 
-            MIMEType='application/octet-stream', **kwargs):
+            MIMEType='application/octet-stream', FilePath=False, **kwargs):
         super(HTMLDownload, self).__init__(MIMEType=MIMEType, **kwargs)
         self.FileExtension = FileExtension
         self.FilenameLookup = FilenameLookup
         self.DefaultFilename = DefaultFilename
+        self.FilePath = FilePath
 
 class HTMLPage(HTMLResult):
     """Result class for displaying a page for an HTML config file"""
@@ -64,6 +92,7 @@ class HTMLInputOption(InterfaceInputOption):
 
     def __init__(self, Choices=None, Type=str, **kwargs):
         self.Choices = Choices
+        self._html_templates = {}
         super(HTMLInputOption, self).__init__(Type=Type, **kwargs)
         if Type == bool:
             self.Choices = [True, False]
@@ -76,40 +105,57 @@ class HTMLInputOption(InterfaceInputOption):
         """Return the HTML needed for user input given a default value"""
         if (not value) and (self.Default is not None):
             value = self.Default
-            
-        input_name = prefix + self.Name
-        string_input = lambda: '<input type="text" name="%s" value="%s"/>' % (input_name, value)
-        number_input = lambda: '<input type="number" name="%s" value="%s"/>' % (input_name, value)
-
-        #html input files cannot have default values. 
-        #If the html interface worked as a data service, this would be possible as submit would be ajax.
-        upload_input = lambda: '<input type="file" name="%s" />' % input_name
-        mchoice_input = lambda: ''.join(
-            [ ('(%s<input type="radio" name="%s" value="%s" %s/>)' 
-                    % (choice, input_name, choice, 'checked="true"' if value == choice else '')) 
-                for choice in self.Choices ]
-        )
-
-        input_switch = {
-            None: string_input,
-            str: string_input,
-            bool: mchoice_input,
-            int: number_input,
-            float: number_input,
-            long: number_input,
-            complex: string_input,
-            "multiple_choice": mchoice_input,
-            "upload_file": upload_input
-        }
 
-        return ''.join(['<tr><td class="right">',
+        try:
+            render = self._html_templates[prefix]
+        except KeyError:
+            render = self._html_templates[prefix] = self._compile_html(prefix)
+
+        return render(value)
+
+    def _compile_html(self, prefix):
+        """Return a function of the value that returns this option's HTML
+
+        Everything that doesn't depend on the value is built here, once per
+        input name prefix.
+        """
+        input_name = prefix + self.Name
+        head = ''.join(['<tr><td class="right">',
                         ('<span class="required">*</span>' + self.Name) if self.Required else self.Name,
-                       '</td><td>',
-                       input_switch[self.Type](),
-                       '</td></tr><tr><td></td><td>',
+                        '</td><td>'])
+        tail = ''.join(['</td></tr><tr><td></td><td>',
                         self.Help,
-                       '</td></tr><tr><td>&nbsp;</td></tr>'
-                       ])
+                        '</td></tr><tr><td>&nbsp;</td></tr>'])
+
+        if self.Type in (int, float, long):
+            head += '<input type="number" name="%s" value="' % input_name
+            tail = '"/>' + tail
+        elif self.Type in (None, str, complex):
+            head += '<input type="text" name="%s" value="' % input_name
+            tail = '"/>' + tail
+        elif self.Type == "upload_file":
+            #html input files cannot have default values. 
+            #If the html interface worked as a data service, this would be possible as submit would be ajax.
+            html = head + '<input type="file" name="%s" />' % input_name + tail
+            return lambda value: html
+        else:
+            choices = [(choice, '(%s<input type="radio" name="%s" value="%s" '
+                                % (choice, input_name, choice))
+                       for choice in self.Choices]
+
+            def render_choices(value):
+                parts = [head]
+                for choice, radio in choices:
+                    parts.append(radio)
+                    if value == choice:
+                        parts.append('checked="true"')
+                    parts.append('/>)')
+                parts.append(tail)
+                return ''.join(parts)
+            return render_choices
+
+        # values can come from the query string, so they must be escaped
+        return lambda value: '%s%s%s' % (head, escape(str(value), True), tail)
    
     def _validate_option(self):
         if self.Type not in self._type_handlers:
@@ -132,6 +178,7 @@ class HTMLInterface(Interface):
     #Relative mapping wasn't working on a collegue's MacBook when pyqi was run outside of it's directory
     #Until I understand why that was the case and how to fix it, I am putting the style css here. 
     #This is not a permanent solution.
+    StylesheetPath = '/static/style.css'
     css_style = '\n'.join([
         'html, body {',
         '   margin: 0px;',
@@ -187,8 +234,20 @@ class HTMLInterface(Interface):
 
     def __init__(self, input_prefix="pyqi_", **kwargs):
         self._html_input_prefix = input_prefix
-        self._html_interface_input = {}
+        self._request_state = local()
+        self._page_template = None
         super(HTMLInterface, self).__init__(**kwargs)
+
+    def _get_html_interface_input(self):
+        return getattr(self._request_state, 'input', {})
+
+    def _set_html_interface_input(self, formatted_input):
+        self._request_state.input = formatted_input
+
+    # The formatted input of the request being handled. It is kept per thread
+    # so that one interface object can serve concurrent requests.
+    _html_interface_input = property(_get_html_interface_input,
+                                     _set_html_interface_input)
     
     #Override
     def __call__(self, in_, *args, **kwargs):
@@ -202,7 +261,71 @@ class HTMLInterface(Interface):
         else:        
             cmd_result = self.CmdInstance(**cmd_input)
             self._the_out_validator(cmd_result)       
-            return self._output_handler(cmd_result)
+            return self._handle_output(cmd_result)
+
+    def acall(self, in_, *args, **kwargs):
+        """Like ``__call__``, but return a ``Future`` of the result
+
+        The command is run with ``Command.acall``, so a command whose ``run``
+        is a coroutine doesn't tie up the calling thread while it waits.
+        """
+        future = Future()
+        try:
+            self._the_in_validator(in_)
+            cmd_input, errors = self._input_handler(in_, *args, **kwargs)
+        except Exception:
+            future.set_exc_info(sys.exc_info())
+            return future
+
+        if errors:
+            future.set_result({
+                    'type': 'error',
+                    'errors': errors
+                })
+            return future
+
+        # the output handler may run on whichever thread finishes the command
+        formatted_input = self._html_interface_input
+
+        def finish(cmd_future):
+            try:
+                cmd_result = cmd_future.get()
+                self._the_out_validator(cmd_result)
+                self._html_interface_input = formatted_input
+                result = self._handle_output(cmd_result)
+            except Exception:
+                future.set_exc_info(sys.exc_info())
+            else:
+                future.set_result(result)
+
+        self.CmdInstance.acall(**cmd_input).add_done_callback(finish)
+        return future
+
+    def call_json(self, data):
+        """Run the command with ``CommandIns`` decoded from a JSON object
+
+        Form inputs and their handlers are bypassed: ``data`` maps
+        ``CommandIn`` names to values, which are converted to each
+        ``CommandIn``'s ``DataType``. Returns the ``CommandOuts`` as JSON in
+        ``{'type': 'json', 'contents': ...}``, or ``{'type': 'error', 'errors':
+        [...]}`` if ``data`` doesn't fit the ``CommandIns`` (see
+        ``get_command_kwargs``), in which case the command isn't called.
+        """
+        cmd_input, errors = get_command_kwargs(self.CmdInstance.CommandIns,
+                                               data)
+        if errors:
+            return {
+                    'type': 'error',
+                    'errors': errors
+                }
+
+        cmd_result = self.CmdInstance(**cmd_input)
+        self._the_out_validator(cmd_result)
+        return {
+                'type': 'json',
+                'contents': dump_result(self.CmdInstance.CommandOuts,
+                                        cmd_result)
+            }
 
     def _validate_inputs_outputs(self, inputs, outputs):
         super(HTMLInterface, self)._validate_inputs_outputs(inputs, outputs)  
@@ -243,7 +366,12 @@ class HTMLInterface(Interface):
         for key in in_:
             mod_key = key[ len(self._html_input_prefix): ] 
             formatted_input[mod_key] = in_[key]
-            if not formatted_input[mod_key].value:
+
+            # don't read uploaded files into memory just to check for them
+            if formatted_input[mod_key].filename is not None:
+                if not formatted_input[mod_key].filename:
+                    formatted_input[mod_key] = None
+            elif not formatted_input[mod_key].value:
                 formatted_input[mod_key] = None
 
         cmd_input_kwargs = {}
@@ -295,6 +423,13 @@ class HTMLInterface(Interface):
 
         filehandle = filename + extension
 
+        if output.FilePath:
+            return {
+                'type':'download',
+                'filename':filehandle,
+                'path':handled_results
+                }
+
         return {
             'type':'download',
             'filename':filehandle,
@@ -332,36 +467,65 @@ class HTMLInterface(Interface):
 
     def command_page_writer(self, write, errors, postvars):
         """Write an HTML page which contains a form for user input"""
-        write('<!DOCTYPE html><html><head><title>%s</title>' % self.CommandName)
-        write('<style>')
+        write(self.render_command_page(errors, postvars))
 
-        write(self.css_style)
+    def render_command_page(self, errors, postvars):
+        """Return the command page, showing ``errors`` and ``postvars``
 
-        write('</style>')
-        write('</head><body><h1>%s</h1><div id="content">' % self.CommandName)
+        ``postvars`` may come from the query string of a GET request, so
+        values that can't be cast to their input's type are ignored, and
+        only the first of a repeated value is used.
+        """
+        if self._page_template is None:
+            self._page_template = self._compile_page_template()
+        head, form_start, options, foot = self._page_template
 
-        write(self._build_usage_lines([opt for opt in self._get_inputs() if opt.Required]))
+        parts = [head]
+        for e in errors:
+            parts.append('<div class="error">%s</div>' % e)
 
-        write('<p>An (<span class="required">*</span>) denotes a required field.</p>')
+        parts.append(form_start)
+        for i, full_name, default_html in options:
+            html = default_html
+            if full_name in postvars and i.Type != 'upload_file':
+                field = postvars[full_name]
+                if isinstance(field, list):
+                    field = field[0]
 
-        for e in errors:
-            write('<div class="error">%s</div>' % e)
-
-        write('<form method="POST" enctype="multipart/form-data">')
-        write('<table>')
-        for i in self._get_inputs():
-            full_name = self._html_input_prefix + i.Name
-            if full_name in postvars and i.Type is not 'upload_file':
-                default = i.cast_value(postvars[full_name])
-                write(i.get_html(self._html_input_prefix, value=default))
-            else:
-                write(i.get_html(self._html_input_prefix))
+                try:
+                    default = i.cast_value(field)
+                except (ValueError, TypeError):
+                    pass
+                else:
+                    html = i.get_html(self._html_input_prefix, value=default)
+            parts.append(html)
+        parts.append(foot)
+
+        return ''.join(parts)
+
+    def _compile_page_template(self):
+        """Build the parts of the command page that are the same every time
+
+        Returns the HTML before the errors, the HTML between the errors and
+        the inputs, ``(option, input name, default HTML)`` for each input and
+        the HTML after the inputs.
+        """
+        head = ''.join([
+            '<!DOCTYPE html><html><head><title>%s</title>' % self.CommandName,
+            '<link rel="stylesheet" href="%s"/>' % self.StylesheetPath,
+            '</head><body><h1>%s</h1><div id="content">' % self.CommandName,
+            self._build_usage_lines([opt for opt in self._get_inputs() if opt.Required]),
+            '<p>An (<span class="required">*</span>) denotes a required field.</p>'])
 
-        write('</table>')
-        write('<input type="submit">')
-        write('</form>')
+        form_start = '<form method="POST" enctype="multipart/form-data"><table>'
 
-        write('</div></body></html>')
+        options = [(i, self._html_input_prefix + i.Name,
+                    i.get_html(self._html_input_prefix))
+                   for i in self._get_inputs()]
+
+        foot = '</table><input type="submit"></form></div></body></html>'
+
+        return head, form_start, options, foot
 
 def html_interface_factory(command_constructor, usage_examples, inputs, outputs,
                      version, command_name):
@@ -379,139 +543,797 @@ def get_cmd_obj(cmd_cfg_mod, cmd):
     cmd_obj = cmd_class()
     return cmd_obj
 
-def get_http_handler(module):
-    """Return a subclassed BaseHTTPRequestHandler with module in scope."""
-    module_commands = get_command_names(module)
+# First path segments of the routes in get_router() that are matched ahead of
+# /<command>, so a command with one of these names could not be reached
+RESERVED_COMMAND_NAMES = frozenset(['index', 'home', 'help', 'static', 'api',
+                                    'metrics', 'jobs'])
+
+def get_served_command_names(module):
+    """Return the command names in ``module`` served by the HTML interface
+
+    Raises ``IncompetentDeveloperError`` if a command is named after one of
+    the interface's own routes.
+    """
+    command_names = get_command_names(module)
+    reserved = sorted(RESERVED_COMMAND_NAMES.intersection(command_names))
+    if reserved:
+        raise IncompetentDeveloperError("Commands can't be named %s, since "
+                "these paths are used by the HTML interface."
+                % ', '.join(["'%s'" % name for name in reserved]))
+    return command_names
+
+class HTMLInterfaceRegistry(object):
+    """Build each command's ``HTMLInterface`` once and share it
+
+    Interfaces are built on first use (or all at once by ``preload``) and
+    reused by every later request, including concurrent ones. ``reload``
+    re-imports the config and ``Command`` modules of the commands built so far
+    and drops them, so edits take effect without restarting the server.
+
+    Signal handlers must not call ``reload``, which could then wait for a
+    lock held by the code it interrupted. They call ``request_reload``
+    instead, and the reload happens when the next request calls
+    ``reload_if_requested``.
+
+    Commands named after the interface's own routes (``RESERVED_COMMAND_NAMES``)
+    are rejected with an ``IncompetentDeveloperError``.
+    """
+
+    def __init__(self, module):
+        self.Module = module
+        self.CommandNames = get_served_command_names(module)
+        self._interfaces = {}
+        self._modules = {}
+        self._static = {}
+        self._lock = Lock()
+        self._reload_requested = False
+
+    def get(self, command):
+        """Return the interface object for ``command``"""
+        command = command.replace('_', '-')
+        try:
+            return self._interfaces[command]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if command not in self._interfaces:
+                cmd_cfg, _ = get_command_config(self.Module, command)
+                cmd_module = sys.modules[cmd_cfg.CommandConstructor.__module__]
+                self._interfaces[command] = get_cmd_obj(self.Module, command)
+                self._modules[command] = (cmd_module, cmd_cfg)
+            return self._interfaces[command]
+
+    def get_static(self, key, make_content):
+        """Return the ``StaticContent`` for ``key``, made on first use
+
+        ``make_content`` is called with no arguments to make it. Static
+        content is dropped by ``reload``.
+        """
+        try:
+            return self._static[key]
+        except KeyError:
+            pass
+
+        content = make_content()
+        with self._lock:
+            return self._static.setdefault(key, content)
+
+    def preload(self):
+        """Build the interface of every command that can be loaded"""
+        for command in self.CommandNames:
+            cmd_cfg, _ = get_command_config(self.Module, command,
+                                            exit_on_failure=False)
+            if cmd_cfg is not None:
+                self.get(command)
+
+    def request_reload(self):
+        """Have the next call to ``reload_if_requested`` reload
+
+        Only sets a flag, so it is safe to call from a signal handler.
+        """
+        self._reload_requested = True
+
+    def reload_if_requested(self):
+        """Reload if ``request_reload`` was called since the last reload"""
+        if self._reload_requested:
+            self._reload_requested = False
+            self.reload()
+
+    def reload(self):
+        """Re-import the modules of every built command and drop them"""
+        with self._lock:
+            # Command modules first, since the configs import from them
+            cmd_modules = set([m[0] for m in self._modules.values()])
+            cfg_modules = set([m[1] for m in self._modules.values()])
+            for mod in list(cmd_modules) + list(cfg_modules):
+                reload(mod)
+
+            self._interfaces = {}
+            self._modules = {}
+            self._static = {}
+            self.CommandNames = get_served_command_names(self.Module)
+
+def render_page(output_writer):
+    """Return what ``output_writer`` writes as a string"""
+    chunks = []
+    output_writer(chunks.append)
+    return ''.join(chunks)
+
+def get_router():
+    """Return the ``Router`` used by the HTML interface request handler
+
+    Routes map to the names of handler methods.
+    """
+    router = Router()
+    for path in ['/', '/index', '/home']:
+        router.add('GET', path, 'index_route')
+    router.add('GET', '/help', 'help_route')
+    router.add('GET', HTMLInterface.StylesheetPath, 'stylesheet_route')
+    router.add('GET', '/<command>', 'command_route')
+    router.add('POST', '/<command>', 'post_route')
+    router.add('POST', '/<command>/jobs', 'submit_job_route')
+    router.add('POST', '/api/<command>', 'api_route')
+    router.add('GET', '/metrics', 'metrics_route')
+    router.add('GET', '/jobs/<job_id>', 'job_status_route')
+    router.add('GET', '/jobs/<job_id>/result', 'job_result_route')
+    router.add('POST', '/jobs/<job_id>/cancel', 'cancel_job_route')
+    return router
+
+def get_http_handler(module, registry=None, jobs=None, max_upload_size=None,
+                     upload_memory_threshold=1024 * 1024, upload_dir=None,
+                     keep_alive_timeout=5, max_keep_alive_requests=100,
+                     metrics=None):
+    """Return a subclassed BaseHTTPRequestHandler with module in scope.
+
+    Interface objects are taken from ``registry``, an
+    ``HTMLInterfaceRegistry`` for ``module`` that is created if not provided
+    and is available as the handler's ``Registry`` attribute.
+
+    Commands submitted as jobs are run by ``jobs``, a ``JobQueue`` that is
+    created with default settings if not provided and is available as the
+    handler's ``Jobs`` attribute.
+
+    Request bodies larger than ``max_upload_size`` bytes (``None`` for no
+    limit) are refused. Uploaded files larger than
+    ``upload_memory_threshold`` bytes are spooled to temporary files in
+    ``upload_dir`` (see ``spooled_field_storage_factory``).
+
+    Connections are kept open for further requests (HTTP/1.1, or HTTP/1.0
+    with ``Connection: keep-alive``) until they have been idle for
+    ``keep_alive_timeout`` seconds or have served ``max_keep_alive_requests``
+    requests (0 for no limit).
+
+    Requests are counted and timed by ``metrics``, a ``Metrics`` object that
+    is created if not provided, is available as the handler's ``Metrics``
+    attribute and is served from /metrics.
+    """
+    if registry is None:
+        registry = HTMLInterfaceRegistry(module)
+    if jobs is None:
+        jobs = JobQueue()
+    if metrics is None:
+        metrics = Metrics()
 
     class HTMLInterfaceHTTPHandler(BaseHTTPRequestHandler):
         """Handle incoming HTTP requests"""
-
-        def __init__(self, *args, **kwargs):
-            self._unrouted = True
-            #Apparently this is an 'oldstyle' class, which doesn't allow the use of super()
-            BaseHTTPRequestHandler.__init__(self, *args, **kwargs)
+        Registry = registry
+        Jobs = jobs
+        Metrics = metrics
+        Router = get_router()
+        MaxUploadSize = max_upload_size
+        FieldStorageClass = spooled_field_storage_factory(
+                upload_memory_threshold, upload_dir)
+        KeepAliveTimeout = keep_alive_timeout
+        MaxKeepAliveRequests = max_keep_alive_requests
+
+        protocol_version = 'HTTP/1.1'
+
+        # buffer each response's header lines into one write
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            BaseHTTPRequestHandler.setup(self)
+            self.wfile = CountingWriter(self.wfile)
+
+        def handle(self):
+            """Handle requests until the connection is closed or idle"""
+            self.close_connection = 1
+            self.requests_handled = 0
+
+            self.handle_one_request()
+            while not self.close_connection:
+                self.connection.settimeout(self.KeepAliveTimeout)
+                self.handle_one_request()
+
+        def parse_request(self):
+            # the idle timeout only applies while waiting for a request
+            self.connection.settimeout(None)
+            return BaseHTTPRequestHandler.parse_request(self)
+
+        def send_response(self, code, message=None):
+            self.response_code = code
+            self.connection_header_sent = False
+            BaseHTTPRequestHandler.send_response(self, code, message)
+
+        def send_header(self, keyword, value):
+            if keyword.lower() == 'connection':
+                self.connection_header_sent = True
+            BaseHTTPRequestHandler.send_header(self, keyword, value)
+
+        def end_headers(self):
+            """Tell the client whether the connection stays open"""
+            if not self.connection_header_sent:
+                if self.close_connection:
+                    self.send_header('Connection', 'close')
+                elif self.request_version == 'HTTP/1.0':
+                    self.send_header('Connection', 'keep-alive')
+            BaseHTTPRequestHandler.end_headers(self)
 
         def index(self, write):
             write("<html><head><title>")
             write("PyQi: " + module)
             write("</title>")
-            write("<style>")
-            write(HTMLInterface.css_style)
-            write("</style>")
+            write('<link rel="stylesheet" href="%s"/>' %
+                  HTMLInterface.StylesheetPath)
             write("</head><body>")
             write("<h1>Available Commands:</h1>")
             write("<ul>")
-            for command in module_commands:
+            for command in self.Registry.CommandNames:
                 write( '<li><a href="/%s">%s</a></li>'%(command, command) )
             write("</ul>")
             write("</body></html>")
 
-        def route(self, path, output_writer):
-            """Define a route for an output_writer"""
-            if self._unrouted and self.path == path:
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                output_writer(self.wfile.write)
-                
-                self.wfile.close()
-                self._unrouted = False;
+        def dispatch(self, method):
+            """Call the handler method routed for the request
 
-        def command_route(self, command):
-            """Define a route for a command and write the command page"""
-            if self._unrouted and self.path == ("/" + command):
-                cmd_obj = get_cmd_obj(module, command)
+            The parsed query string is available to handler methods as
+            ``self.query``, a ``FieldStorage``.
+            """
+            # reloads requested by SIGHUP are done here, outside the
+            # signal handler
+            self.Registry.reload_if_requested()
 
-                self.send_response(200)
-                self.send_header('Content-type', 'text/html')
-                self.end_headers()
-                cmd_obj.command_page_writer(self.wfile.write, [], {})
-                
-                self.wfile.close()
-                self._unrouted = False
-
-        def post_route(self, command, postvars):
-            """Define a route for user response and write the output or else provide errors"""
-            if self._unrouted and self.path == ("/" + command):
-                cmd_obj = get_cmd_obj(module, command)
-                try:
-                    result = cmd_obj(postvars)
-                except Exception as e:
-                    result = {
-                        'type':'error',
-                        'errors':[e]
-                    }
-                
-                if result['type'] == 'error':
-                    self.send_response(400)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-                    cmd_obj.command_page_writer(self.wfile.write, result['errors'], postvars)
+            url = urlsplit(self.path)
+            handler, params, allowed = self.Router.resolve(method, url.path)
+            self.query = FieldStorage(environ={'REQUEST_METHOD':'GET',
+                                               'QUERY_STRING':url.query})
 
-                elif result['type'] == 'page':       
-                    self.send_response(200)
-                    self.send_header('Content-type', result['mime_type'])
-                    self.end_headers()
-                    self.wfile.write(result['contents'])
+            self.requests_handled += 1
+            if self.MaxKeepAliveRequests and \
+                    self.requests_handled >= self.MaxKeepAliveRequests:
+                self.close_connection = 1
 
-                elif result['type'] == 'download':
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/octet-stream')
-                    self.send_header('Content-disposition', 'attachment; filename='+result['filename'])
+            # bodies we can't find the end of can't be followed by a request
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                length = 0
+                self.close_connection = 1
+            if 'Transfer-Encoding' in self.headers:
+                self.close_connection = 1
+
+            # only label known commands, so that requests for made-up ones
+            # can't create new metrics
+            command = params.get('command', '')
+            if command and command not in self.Registry.CommandNames:
+                command = ''
+            labels = (handler or '', command.replace('_', '-'))
+            self.Metrics.start(labels)
+            self.response_code = 500
+            start = time()
+            bytes_sent = self.wfile.BytesWritten
+
+            connection_rfile = self.rfile
+            self.rfile = RequestBody(connection_rfile, max(length, 0))
+            try:
+                if handler is not None:
+                    getattr(self, handler)(**params)
+                elif allowed:
+                    self.send_response(405)
+                    self.send_header('Allow', ', '.join(allowed))
+                    self.send_header('Content-Length', '0')
                     self.end_headers()
-                    self.wfile.write(result['contents'])
-                    
-                self.wfile.close()
-                self._unrouted = False
-
-        def end_routes(self):
-            """If a route hasn't matched the path up to now, return a 404 and close stream"""
-            if self._unrouted:
-                self.send_response(404)
+                else:
+                    self.not_found()
+
+                if not self.rfile.discard():
+                    self.close_connection = 1
+            finally:
+                self.Metrics.finish(labels, self.response_code, time() - start,
+                                    max(length, 0) - self.rfile.Remaining,
+                                    self.wfile.BytesWritten - bytes_sent)
+                self.rfile = connection_rfile
+
+        def not_found(self):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def send_page(self, output_writer, status=200):
+            self.send_body(render_page(output_writer), 'text/html',
+                           status=status)
+
+        def send_body(self, body, content_type, status=200, headers=()):
+            """Send ``body``, compressed if the client accepts it"""
+            encoding = choose_encoding(self.headers.get('Accept-Encoding'),
+                                       len(body))
+            body = encode(body, encoding)
+
+            self.send_response(status)
+            self.send_header('Content-type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Vary', 'Accept-Encoding')
+            if encoding != 'identity':
+                self.send_header('Content-Encoding', encoding)
+            for keyword, value in headers:
+                self.send_header(keyword, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_static(self, content, max_age=0):
+            """Send ``StaticContent``, or a 304 if the client has it
+
+            Clients may use their copy for ``max_age`` seconds without
+            revalidating it.
+            """
+            encoding = choose_encoding(self.headers.get('Accept-Encoding'),
+                                       len(content.Body))
+            etag = content.getETag(encoding)
+            headers = [('ETag', etag),
+                       ('Last-Modified', content.getLastModified()),
+                       ('Cache-Control', 'public, max-age=%d' % max_age),
+                       ('Vary', 'Accept-Encoding')]
+
+            if is_not_modified(self.headers, etag, content.LastModified):
+                self.send_response(304)
+                for keyword, value in headers:
+                    self.send_header(keyword, value)
                 self.end_headers()
+                return
+
+            body = content.getBody(encoding)
+            self.send_response(200)
+            self.send_header('Content-type', content.ContentType)
+            self.send_header('Content-Length', str(len(body)))
+            if encoding != 'identity':
+                self.send_header('Content-Encoding', encoding)
+            for keyword, value in headers:
+                self.send_header(keyword, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_json(self, obj, status=200):
+            self.send_body(json.dumps(obj), 'application/json', status=status)
+
+        def get_body_length(self):
+            """Return the length of the request body
+
+            Sends an error and returns ``None`` if the length is missing or
+            larger than ``MaxUploadSize``.
+            """
+            try:
+                length = int(self.headers['Content-Length'])
+            except (KeyError, ValueError):
+                self.send_error(411)
+                return None
 
-                self.wfile.close()
-                self._unrouted = False
+            if self.MaxUploadSize is not None and length > self.MaxUploadSize:
+                self.send_error(413, "Uploads are limited to %d bytes" %
+                                self.MaxUploadSize)
+                return None
 
-        def do_GET(self):
-            """Handle GET requests"""
+            return length
 
-            self.route("/", self.index)
-            self.route("/index", self.index)
-            self.route("/home", self.index)
+        def parse_postvars(self):
+            """Parse the request body, or send an error and return ``None``"""
+            if self.get_body_length() is None:
+                return None
 
+            return self.FieldStorageClass(fp=self.rfile,
+                headers=self.headers,
+                environ={'REQUEST_METHOD':'POST',
+                        'CONTENT_TYPE':self.headers['Content-Type']})
+
+        def send_result(self, cmd_obj, result, postvars):
+            """Write the result of an ``HTMLInterface`` call"""
+            if result['type'] == 'error':
+                self.send_page(lambda write: cmd_obj.command_page_writer(
+                        write, result['errors'], postvars), status=400)
+
+            elif 'path' in result:
+                contents = open(result['path'], 'rb')
+            else:
+                contents = result['contents']
+
+            if result['type'] == 'page':
+                self.send_contents(contents, result['mime_type'])
+
+            elif result['type'] == 'download':
+                self.send_contents(contents, 'application/octet-stream',
+                        [('Content-disposition', 'attachment; filename='+result['filename'])])
+
+        def send_contents(self, contents, content_type, headers=()):
+            """Send a 200 response with ``contents`` as the body
+
+            ``contents`` can be a string, a file object or an iterable of
+            strings. Strings and regular files are sent with a Content-Length.
+            Anything else is streamed with chunked transfer encoding to
+            HTTP/1.1 clients, or until the connection is closed to HTTP/1.0
+            clients. File objects and iterables are closed once sent, if
+            possible.
+            """
+            if isinstance(contents, unicode):
+                contents = contents.encode('utf-8')
+
+            length = get_content_length(contents)
+            chunked = length is None and self.request_version == 'HTTP/1.1'
+
+            try:
+                self.send_response(200)
+                self.send_header('Content-type', content_type)
+                for keyword, value in headers:
+                    self.send_header(keyword, value)
+
+                if length is not None:
+                    self.send_header('Content-Length', str(length))
+                elif chunked:
+                    self.send_header('Transfer-Encoding', 'chunked')
+                else:
+                    # the end of the body is marked by closing the connection
+                    self.send_header('Connection', 'close')
+                self.end_headers()
+
+                if isinstance(contents, basestring):
+                    self.wfile.write(contents)
+                elif chunked:
+                    for chunk in iter_chunks(contents):
+                        self.wfile.write('%x\r\n%s\r\n' % (len(chunk), chunk))
+                        self.wfile.flush()
+                    self.wfile.write('0\r\n\r\n')
+                else:
+                    for chunk in iter_chunks(contents):
+                        self.wfile.write(chunk)
+                        self.wfile.flush()
+            finally:
+                if hasattr(contents, 'close'):
+                    contents.close()
+
+        def index_route(self):
+            """Write the list of commands"""
+            self.send_static(self.Registry.get_static('index',
+                    lambda: StaticContent(render_page(self.index),
+                                          'text/html')))
+
+        def stylesheet_route(self):
+            self.send_static(self.Registry.get_static('stylesheet',
+                    lambda: StaticContent(HTMLInterface.css_style,
+                                          'text/css')),
+                    max_age=86400)
+
+        def help_route(self):
             def r(write):#host.domain.tld/help
                 write("This is still a very in development interface, there is no help.")
-            self.route("/help", r)
+            self.send_page(r)
 
-            for command in module_commands:
-                self.command_route(command)
+        def command_route(self, command):
+            """Write the command page, with defaults from the query string"""
+            if command not in self.Registry.CommandNames:
+                return self.not_found()
+
+            cmd_obj = self.Registry.get(command)
+            page_writer = lambda write: cmd_obj.command_page_writer(
+                    write, [], self.query)
+
+            # without form defaults from the query string, the page only
+            # changes when the command does
+            if self.query:
+                self.send_page(page_writer)
+            else:
+                self.send_static(self.Registry.get_static(
+                        ('command', cmd_obj.CommandName),
+                        lambda: StaticContent(render_page(page_writer),
+                                              'text/html')))
 
-            self.end_routes()
+        def post_route(self, command):
+            """Write the output of the command or else provide errors"""
+            if command not in self.Registry.CommandNames:
+                return self.not_found()
 
-        def do_POST(self):
-            """Handle POST requests"""
-            postvars = FieldStorage(fp=self.rfile,
-                headers=self.headers,
-                environ={'REQUEST_METHOD':'POST',
-                        'CONTENT_TYPE':self.headers['Content-Type']})
+            postvars = self.parse_postvars()
+            if postvars is None:
+                return
+
+            cmd_obj = self.Registry.get(command)
+            try:
+                result = cmd_obj(postvars)
+            except Exception as e:
+                result = {
+                    'type':'error',
+                    'errors':[e]
+                }
 
-            for command in module_commands:
-                self.post_route(command, postvars)
+            self.send_result(cmd_obj, result, postvars)
 
-            self.end_routes()
+        def api_route(self, command):
+            """Run the command with a JSON body and write its result as JSON
 
+            Errors are written as ``{"errors": [...]}``, with a 400 for input
+            that doesn't fit the ``CommandIns`` and a 500 for any error raised
+            once the command has been called.
+            """
+            if command not in self.Registry.CommandNames:
+                return self.send_json({'errors': ['Unknown command: %s' %
+                                                  command]}, status=404)
+
+            length = self.get_body_length()
+            if length is None:
+                return
+
+            try:
+                data = json.loads(self.rfile.read(length))
+            except ValueError, e:
+                return self.send_json({'errors': ['Invalid JSON: %s' % e]},
+                                      status=400)
+
+            cmd_obj = self.Registry.get(command)
+            try:
+                result = cmd_obj.call_json(data)
+            except Exception, e:
+                return self.send_json({'errors': [str(e)]}, status=500)
+
+            if result['type'] == 'error':
+                self.send_json({'errors': ['%s' % err
+                                           for err in result['errors']]},
+                               status=400)
+            else:
+                self.send_body(result['contents'], 'application/json')
+
+        def metrics_route(self):
+            """Write the server's metrics in the Prometheus text format"""
+            gauges = [('pyqi_jobs_queued',
+                       'Background jobs waiting for a worker.',
+                       self.Jobs.get_queue_depth())]
+            if isinstance(self.server, WorkerPoolHTTPServer):
+                gauges.append(('pyqi_http_queue_depth',
+                               'Connections waiting for a worker thread.',
+                               self.server.requests.qsize()))
+
+            self.send_body(self.Metrics.render(gauges), METRICS_CONTENT_TYPE)
+
+        def submit_job_route(self, command):
+            """Queue the command and write the new job's status"""
+            if command not in self.Registry.CommandNames:
+                return self.not_found()
+
+            postvars = self.parse_postvars()
+            if postvars is None:
+                return
+
+            job = self.Jobs.submit(command, self.Registry.get(command),
+                                   postvars)
+
+            if job is None:
+                self.send_json({'errors': ['Too many jobs are queued, '
+                                           'please try again later.']},
+                               status=503)
+            else:
+                self.send_json(job.getStatus(), status=202)
+
+        def job_status_route(self, job_id):
+            status = self.Jobs.get_status(job_id)
+            if status is None:
+                return self.not_found()
+            self.send_json(status)
+
+        def job_result_route(self, job_id):
+            """Write the result of a completed job
+
+            Failed jobs are written like a failed POST. If the job hasn't
+            completed, its status is written with a 409 instead.
+            """
+            status, result = self.Jobs.get_result(job_id)
+            if status is None:
+                return self.not_found()
+
+            if status['status'] == COMPLETED:
+                cmd_obj = self.Registry.get(status['command'])
+                self.send_result(cmd_obj, result, self.query)
+            elif status['status'] == FAILED:
+                cmd_obj = self.Registry.get(status['command'])
+                self.send_result(cmd_obj, {'type': 'error',
+                                           'errors': status['errors']},
+                                 self.query)
+            else:
+                self.send_json(status, status=409)
+
+        def cancel_job_route(self, job_id):
+            status = self.Jobs.cancel(job_id)
+            if status is None:
+                return self.not_found()
+            self.send_json(status)
+
+        def do_GET(self):
+            """Handle GET requests"""
+            self.dispatch('GET')
+
+        def do_POST(self):
+            """Handle POST requests"""
+            self.dispatch('POST')
 
     return HTMLInterfaceHTTPHandler
 
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """Handle each request in a new thread"""
+    daemon_threads = True
+
+class WorkerPoolHTTPServer(HTTPServer):
+    """Handle requests on a fixed pool of worker threads
+
+    Accepted connections wait in a queue of at most ``max_queue_depth``
+    requests (0 for no limit). When the queue is full, the client is sent a
+    503 response instead of waiting.
+    """
+
+    def __init__(self, server_address, RequestHandlerClass, workers=4,
+                 max_queue_depth=64):
+        HTTPServer.__init__(self, server_address, RequestHandlerClass)
+        self.requests = Queue(max_queue_depth)
+        self.workers = []
+
+        for i in range(workers):
+            worker = Thread(target=self._process_queue)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def process_request(self, request, client_address):
+        try:
+            self.requests.put_nowait((request, client_address))
+        except Full:
+            try:
+                request.sendall("HTTP/1.0 503 Service Unavailable\r\n"
+                                "Content-Type: text/plain\r\n"
+                                "Retry-After: 1\r\n\r\n"
+                                "The server is busy, please try again.\n")
+            except socket.error:
+                pass
+            self.shutdown_request(request)
+
+    def _process_queue(self):
+        while True:
+            request, client_address = self.requests.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+SERVER_MODES = ['single', 'thread', 'pool', 'prefork']
+
+def _serve_prefork(interface_server, workers):
+    """Fork ``workers`` processes that accept on the same listening socket"""
+    children = []
+    for i in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                interface_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def forward_signal(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                pass
+    signal.signal(signal.SIGHUP, forward_signal)
+
+    try:
+        for pid in children:
+            while True:
+                try:
+                    os.waitpid(pid, 0)
+                    break
+                except OSError, e:
+                    if e.errno != errno.EINTR:
+                        raise
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        # a bare raise would re-raise the last OSError under Python 2
+        raise KeyboardInterrupt
+
 #This will generally be called from a generated command.
-def start_server(port, module):
-    """Start a server for the HTMLInterface on the specified port"""
-    interface_server = HTTPServer(("", port), get_http_handler(module))
+def start_server(port, module, server_mode='single', workers=4,
+                 max_queue_depth=64, jobs_dir=None, job_workers=2,
+                 job_expiry=86400, max_upload_size=None,
+                 upload_memory_threshold=1024 * 1024, upload_dir=None,
+                 keep_alive_timeout=5, max_keep_alive_requests=None):
+    """Start a server for the HTMLInterface on the specified port
+
+    ``server_mode`` is one of:
+
+    - 'single': handle one request at a time
+    - 'thread': handle each request in a new thread
+    - 'pool': handle requests on ``workers`` threads, queueing at most
+      ``max_queue_depth`` requests
+    - 'prefork': handle requests in ``workers`` forked processes, each
+      handling one request at a time
+
+    Commands POSTed to /<command>/jobs are run in the background on
+    ``job_workers`` threads (per process), and their results are kept in
+    ``jobs_dir`` for ``job_expiry`` seconds (see ``JobQueue``).
+
+    Request bodies larger than ``max_upload_size`` bytes are refused, and
+    uploaded files larger than ``upload_memory_threshold`` bytes are spooled
+    to temporary files in ``upload_dir``.
+
+    Idle connections are closed after ``keep_alive_timeout`` seconds, and
+    every connection is closed after ``max_keep_alive_requests`` requests (0
+    for no limit). Outside 'thread' mode, an open connection holds on to the
+    process or pool thread handling it, even while idle, so by default
+    connections are only kept open (for 100 requests) in 'thread' mode.
+
+    Sending the server SIGHUP reloads the commands when the next request
+    arrives (see ``HTMLInterfaceRegistry.reload``). In prefork mode, the
+    parent process forwards it to the workers.
+    """
+    if server_mode not in SERVER_MODES:
+        raise IncompetentDeveloperError("Unknown server_mode '%s'. Must be "
+                                        "one of: %s" % (server_mode,
+                                        ', '.join(SERVER_MODES)))
+
+    if max_keep_alive_requests is None:
+        if server_mode == 'thread':
+            max_keep_alive_requests = 100
+        else:
+            max_keep_alive_requests = 1
+
+    registry = HTMLInterfaceRegistry(module)
+    jobs = JobQueue(jobs_dir, workers=job_workers, expiry=job_expiry)
+    handler = get_http_handler(module, registry, jobs,
+                               max_upload_size=max_upload_size,
+                               upload_memory_threshold=upload_memory_threshold,
+                               upload_dir=upload_dir,
+                               keep_alive_timeout=keep_alive_timeout,
+                               max_keep_alive_requests=max_keep_alive_requests)
+
+    # prefork workers inherit the interfaces instead of each building them
+    if server_mode == 'prefork':
+        registry.preload()
+
+    signal.signal(signal.SIGHUP,
+                  lambda signum, frame: registry.request_reload())
+
+    if server_mode == 'thread':
+        interface_server = ThreadingHTTPServer(("", port), handler)
+    elif server_mode == 'pool':
+        interface_server = WorkerPoolHTTPServer(("", port), handler,
+                                                workers=workers,
+                                                max_queue_depth=max_queue_depth)
+    else:
+        interface_server = HTTPServer(("", port), handler)
+
     print "-- Starting server at http://localhost:%d --" % port
     print "To close the server, type 'ctrl-c' into this window."
     try:
-        interface_server.serve_forever()
+        if server_mode == 'prefork':
+            _serve_prefork(interface_server, workers)
+        else:
+            interface_server.serve_forever()
 
     except KeyboardInterrupt:
         return "-- Finished serving HTMLInterface --"
+    finally:
+        interface_server.server_close()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Run commands from JSON for the HTML interface's ``/api/<command>`` route
+
+A request body is a JSON object mapping ``CommandIn`` names to values, which
+are converted to each ``CommandIn``'s ``DataType`` and checked with its
+``ValidateValue`` before the command is called. Only JSON-compatible
+``DataType`` values (see ``COERCIBLE_TYPES``) are converted, so request data
+is never passed to other constructors. The response is a JSON object mapping
+``CommandOut`` names to the command's results. The form inputs, handlers and
+output handler of the HTML interface are bypassed.
+"""
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+import json
+
+# the DataTypes that JSON values are converted to
+COERCIBLE_TYPES = (str, unicode, int, long, float, bool, list, tuple, set,
+                   frozenset, dict)
+
+def coerce_value(value, data_type):
+    """Convert a value decoded from JSON to ``data_type``
+
+    ``None`` and values that are already a ``data_type`` are returned as is.
+    Raises a ``ValueError`` or ``TypeError`` if the value can't be converted,
+    including when ``data_type`` isn't in ``COERCIBLE_TYPES``.
+    """
+    if value is None or data_type is None:
+        return value
+
+    if not isinstance(data_type, type):
+        raise TypeError("%r is not a type" % (data_type,))
+
+    if isinstance(value, data_type):
+        return value
+
+    if data_type not in COERCIBLE_TYPES:
+        raise TypeError("Can't convert %r to %r" % (value, data_type))
+
+    if data_type is str and isinstance(value, unicode):
+        return value.encode('utf-8')
+
+    # bool('false') is True, so only accept JSON's true and false
+    if data_type is bool:
+        raise TypeError("%r is not a boolean" % (value,))
+
+    # don't silently turn strings into lists of characters
+    if isinstance(value, basestring) and data_type in (list, tuple, set,
+                                                       frozenset):
+        raise TypeError("%r is not an array" % (value,))
+
+    # nor truncate fractions
+    if data_type in (int, long) and isinstance(value, float) and \
+            value != int(value):
+        raise ValueError("%r is not an integer" % (value,))
+
+    return data_type(value)
+
+def get_command_kwargs(command_ins, data):
+    """Return ``(kwargs, errors)`` for calling a ``Command`` with ``data``
+
+    ``command_ins`` is the command's ``ParameterCollection`` of ``CommandIn``
+    objects and ``data`` is the decoded request body. Values are checked
+    with the ``CommandIn``'s ``ValidateValue``, so that the command is only
+    called with input it accepts.
+    """
+    if not isinstance(data, dict):
+        return {}, ["Error: the request body must be a JSON object."]
+
+    kwargs = {}
+    errors = []
+    for name, value in data.items():
+        if name not in command_ins:
+            errors.append("Error: unknown parameter %s." % name)
+            continue
+
+        # leave out nulls so that defaults apply
+        if value is None:
+            continue
+
+        name = str(name)
+        data_type = command_ins[name].DataType
+        try:
+            value = coerce_value(value, data_type)
+        except (ValueError, TypeError):
+            errors.append("Error: %s must be type %s" % (name, data_type))
+            continue
+
+        validate_value = command_ins[name].ValidateValue
+        try:
+            valid = validate_value is None or validate_value(value)
+        except (ValueError, TypeError):
+            valid = False
+
+        if valid:
+            kwargs[name] = value
+        else:
+            errors.append("Error: %s cannot take value %r." % (name, value))
+
+    for param in command_ins.values():
+        if param.Required and data.get(param.Name) is None:
+            errors.append("Error: %s is required." % param.Name)
+
+    return kwargs, errors
+
+def dump_result(command_outs, result):
+    """Return the JSON for a ``Command``'s result
+
+    Streaming ``CommandOut`` values are consumed into arrays. Raises a
+    ``TypeError`` if a value can't be represented in JSON.
+    """
+    out = {}
+    for name, value in result.items():
+        if name in command_outs and command_outs[name].Streaming and \
+                value is not None:
+            value = list(value)
+        out[name] = value
+
+    try:
+        return json.dumps(out)
+    except UnicodeDecodeError, e:
+        raise TypeError("Result is not UTF-8: %s" % e)
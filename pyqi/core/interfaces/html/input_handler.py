@@ -11,7 +11,11 @@
 
 __credits__ = ["Evan Bolyen"]
 
+import os
+from mmap import mmap, ACCESS_READ
+from os.path import exists
 from pyqi.core.exception import IncompetentDeveloperError
+from pyqi.core.interfaces.html.upload import SpooledUpload
 
 def load_file_lines(option_value):
     """Return a list of strings, one per line in the file.
@@ -29,3 +33,37 @@ def load_file_contents(option_value):
         raise IncompetentDeveloperError("Input type must be a file object.")
     
     return option_value.read()
+
+def _get_file_on_disk(option_value):
+    """Return ``option_value`` once its contents are in a named file"""
+    if not hasattr(option_value, 'read'):
+        raise IncompetentDeveloperError("Input type must be a file object.")
+
+    if isinstance(option_value, SpooledUpload):
+        option_value.rollover()
+
+    if not isinstance(getattr(option_value, 'name', None), str) or \
+            not exists(option_value.name):
+        raise IncompetentDeveloperError("Input must be a file on disk.")
+
+    option_value.flush()
+    return option_value
+
+def upload_file_path(option_value):
+    """Return the path of an uploaded file.
+
+    The file is deleted once the request has been handled, so the path must
+    not be used after the command has run.
+    """
+    return _get_file_on_disk(option_value).name
+
+def upload_file_mmap(option_value):
+    """Return a read-only memory-mapped view of an uploaded file.
+
+    An empty file is returned as an empty string, since it can't be mapped.
+    """
+    f = _get_file_on_disk(option_value)
+    if not os.fstat(f.fileno()).st_size:
+        return ''
+
+    return mmap(f.fileno(), 0, access=ACCESS_READ)
@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Run HTML interface commands in the background
+
+A ``JobQueue`` runs submitted commands on a bounded number of worker threads
+and stores each job (its status and, once finished, the interface's result)
+as a pickle in a directory, so results can be fetched long after the request
+that submitted the job has completed. Finished jobs are removed once they are
+older than the queue's ``Expiry``.
+
+Jobs are run by the server process that accepted them, but their status is
+written to the directory whenever it changes, so any process using the
+directory (e.g., another prefork worker) can report on them. Such a process
+cancels a job by leaving a marker file that the owning process checks before
+running the job and when it finishes.
+"""
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+import os
+import re
+import sys
+import cPickle
+from Queue import Queue, Full
+from tempfile import mkstemp
+from threading import Lock, Thread
+from time import time
+from uuid import uuid4
+from os.path import exists, expanduser, join
+from pyqi.core.future import Future
+from pyqi.core.interfaces.html.streaming import iter_chunks
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED = (COMPLETED, FAILED, CANCELLED)
+
+_job_id_pattern = re.compile('^[0-9a-f]{32}$')
+
+def get_jobs_dir():
+    """Return the default directory that finished jobs are stored in"""
+    return os.environ.get('PYQI_JOBS_DIR',
+                          expanduser(join('~', '.pyqi', 'jobs')))
+
+class Job(object):
+    """A command submitted to a ``JobQueue``"""
+
+    def __init__(self, CommandName):
+        self.Id = uuid4().hex
+        self.CommandName = CommandName
+        self.Status = QUEUED
+        self.Errors = []
+        self.Submitted = time()
+        self.Started = None
+        self.Finished = None
+        self.CancelRequested = False
+
+    def getStatus(self):
+        """Return the job's status as a JSON-serializable ``dict``"""
+        return {'job_id': self.Id,
+                'command': self.CommandName,
+                'status': self.Status,
+                'errors': self.Errors,
+                'submitted': self.Submitted,
+                'started': self.Started,
+                'finished': self.Finished}
+
+class JobQueue(object):
+    """Run commands on at most ``workers`` threads
+
+    A job whose command is a coroutine (see ``Command.acall``) only holds
+    its worker until the command first waits, so any number of them can be
+    in progress at once. At most ``max_queued`` jobs can wait for a worker
+    (0 for no limit).
+    Finished jobs are kept in ``jobs_dir`` for ``expiry`` seconds (``None``
+    to keep them forever). The directory and the worker threads are created
+    when the first job is submitted.
+    """
+    Suffix = '.pyqi-job'
+    ContentsSuffix = '.pyqi-job-contents'
+    CancelSuffix = '.pyqi-job-cancel'
+
+    def __init__(self, jobs_dir=None, workers=2, max_queued=64,
+                 expiry=86400):
+        self.JobsDir = get_jobs_dir() if jobs_dir is None else jobs_dir
+        self.Workers = workers
+        self.Expiry = expiry
+        self._queue = Queue(max_queued)
+        self._jobs = {}
+        self._threads = []
+        self._lock = Lock()
+
+    def submit(self, command_name, cmd_obj, in_):
+        """Queue ``cmd_obj(in_)`` and return the new ``Job``
+
+        Returns ``None`` if the queue is full.
+        """
+        self.purge_expired()
+        self._start_workers()
+
+        job = Job(command_name)
+        self._write(job.Id, self._dump(job.getStatus(), None))
+        with self._lock:
+            self._jobs[job.Id] = job
+
+        try:
+            self._queue.put_nowait((job, cmd_obj, in_))
+        except Full:
+            with self._lock:
+                del self._jobs[job.Id]
+            self._remove(self._get_path(job.Id))
+            return None
+
+        return job
+
+    def get_status(self, job_id):
+        """Return the status ``dict`` of a job, or ``None`` if unknown"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.getStatus()
+
+        record = self._load(job_id)
+        return None if record is None else record['status']
+
+    def get_result(self, job_id):
+        """Return ``(status, result)`` for a job
+
+        ``result`` is the interface's result, or ``None`` if the job hasn't
+        completed. ``status`` is ``None`` if the job is unknown.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None and job.Status not in FINISHED:
+            return job.getStatus(), None
+
+        record = self._load(job_id)
+        if record is None:
+            return None, None
+        return record['status'], record['result']
+
+    def cancel(self, job_id):
+        """Cancel a job and return its status ``dict``
+
+        A queued job will not be run. A running job can't be interrupted, but
+        its result is discarded. Returns ``None`` if the job is unknown.
+
+        A job run by another process is cancelled by that process once it
+        sees the request, so its status is returned unchanged.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                requested = not job.CancelRequested
+                job.CancelRequested = True
+                queued = job.Status == QUEUED
+
+        if job is None:
+            return self._request_cancel(job_id)
+
+        # workers skip jobs whose cancellation was requested while queued
+        if requested and queued:
+            self._finish(job, None, CANCELLED)
+
+        return job.getStatus()
+
+    def get_queue_depth(self):
+        """Return the number of jobs waiting for a worker"""
+        return self._queue.qsize()
+
+    def purge_expired(self):
+        """Remove finished jobs that are older than ``Expiry``"""
+        if self.Expiry is None or not exists(self.JobsDir):
+            return
+
+        cutoff = time() - self.Expiry
+        for f in os.listdir(self.JobsDir):
+            if not (f.endswith(self.Suffix) or
+                    f.endswith(self.ContentsSuffix) or
+                    f.endswith(self.CancelSuffix)):
+                continue
+
+            path = join(self.JobsDir, f)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _start_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+
+            if not exists(self.JobsDir):
+                os.makedirs(self.JobsDir)
+
+            for i in range(self.Workers):
+                worker = Thread(target=self._process_queue)
+                worker.daemon = True
+                worker.start()
+                self._threads.append(worker)
+
+    def _process_queue(self):
+        while True:
+            job, cmd_obj, in_ = self._queue.get()
+
+            # cancelled by another process while queued
+            if self._is_cancel_requested(job):
+                with self._lock:
+                    cancelled = not job.CancelRequested
+                    job.CancelRequested = True
+                if cancelled:
+                    self._finish(job, None, CANCELLED)
+
+            with self._lock:
+                if job.CancelRequested:
+                    continue
+                job.Status = RUNNING
+                job.Started = time()
+            self._write(job.Id, self._dump(job.getStatus(), None))
+
+            # interfaces that can return a Future don't hold on to the worker
+            # while a coroutine command waits
+            try:
+                if hasattr(cmd_obj, 'acall'):
+                    future = cmd_obj.acall(in_)
+                else:
+                    future = Future()
+                    future.set_result(cmd_obj(in_))
+            except Exception:
+                future = Future()
+                future.set_exc_info(sys.exc_info())
+
+            future.add_done_callback(
+                    lambda future, job=job: self._complete(job, future))
+
+    def _complete(self, job, future):
+        """Store the outcome of a job's command"""
+        try:
+            result = future.get()
+            if result['type'] != 'error':
+                result = self._spool_contents(job, result)
+        except Exception, e:
+            result = {'type': 'error', 'errors': [e]}
+
+        if job.CancelRequested or self._is_cancel_requested(job):
+            self._finish(job, None, CANCELLED)
+        elif result['type'] == 'error':
+            self._finish(job, None, FAILED,
+                         [str(e) for e in result['errors']])
+        else:
+            self._finish(job, result, COMPLETED)
+
+    def _finish(self, job, result, status, errors=()):
+        """Store a finished job and stop tracking it in memory
+
+        The record is written without holding the lock, so storing a large
+        result doesn't hold up other requests. The job is only marked as
+        finished once its record is in place, so that whoever sees it
+        finished can load it.
+        """
+        finished = time()
+        record_status = dict(job.getStatus(), status=status,
+                             errors=list(errors), finished=finished)
+
+        try:
+            data = self._dump(record_status, result)
+        except (cPickle.PicklingError, TypeError, AttributeError), e:
+            record_status['status'] = FAILED
+            record_status['errors'] = ["Could not store the result: %s" % e]
+            data = self._dump(record_status, None)
+
+        self._write(job.Id, data)
+
+        with self._lock:
+            # cancelled while the result was being stored; discard it
+            cancelled = job.CancelRequested and status != CANCELLED
+            if not cancelled:
+                job.Status = record_status['status']
+                job.Errors = record_status['errors']
+                job.Finished = finished
+                self._jobs.pop(job.Id, None)
+
+        if cancelled:
+            self._finish(job, None, CANCELLED)
+        else:
+            self._remove(self._get_cancel_path(job.Id))
+
+    def _request_cancel(self, job_id):
+        """Ask the process running a job to cancel it"""
+        record = self._load(job_id)
+        if record is None:
+            return None
+
+        status = record['status']
+        if status['status'] not in FINISHED:
+            open(self._get_cancel_path(job_id), 'wb').close()
+        return status
+
+    def _is_cancel_requested(self, job):
+        return exists(self._get_cancel_path(job.Id))
+
+    def _spool_contents(self, job, result):
+        """Write streamed contents to a file so the result can be stored"""
+        contents = result.get('contents')
+        if contents is None or isinstance(contents, basestring):
+            return result
+
+        path = join(self.JobsDir, job.Id + self.ContentsSuffix)
+        fd, tmp_path = mkstemp(dir=self.JobsDir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter_chunks(contents):
+                    f.write(chunk)
+            os.rename(tmp_path, path)
+        except:
+            os.remove(tmp_path)
+            raise
+        finally:
+            if hasattr(contents, 'close'):
+                contents.close()
+
+        result = dict(result)
+        del result['contents']
+        result['path'] = path
+        return result
+
+    def _get_path(self, job_id):
+        return join(self.JobsDir, job_id + self.Suffix)
+
+    def _get_cancel_path(self, job_id):
+        return join(self.JobsDir, job_id + self.CancelSuffix)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _dump(self, status, result):
+        return cPickle.dumps({'status': status, 'result': result},
+                             cPickle.HIGHEST_PROTOCOL)
+
+    def _write(self, job_id, data):
+        # write then rename so that readers never see a partial file
+        fd, tmp_path = mkstemp(dir=self.JobsDir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_path, self._get_path(job_id))
+
+    def _load(self, job_id):
+        # job ids become file names, so only accept ones we could have made
+        if not _job_id_pattern.match(job_id):
+            return None
+
+        path = self._get_path(job_id)
+        try:
+            if self.Expiry is not None and \
+                    os.stat(path).st_mtime < time() - self.Expiry:
+                return None
+
+            with open(path, 'rb') as f:
+                return cPickle.load(f)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            return None
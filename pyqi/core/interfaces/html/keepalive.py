@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Reuse HTML interface connections for more than one request
+
+On a persistent HTTP/1.1 connection the next request starts right after the
+body of the current one, so the body must be read exactly, even when a
+handler doesn't read it at all (for example when it answers with a 404).
+``RequestBody`` limits reads to the body's Content-Length and discards
+whatever the handler left unread.
+"""
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+# unread bodies larger than this close the connection rather than being read
+MAX_DISCARD = 64 * 1024
+
+class RequestBody(object):
+    """A file-like object for the ``length`` byte body of a request"""
+
+    def __init__(self, rfile, length):
+        self._rfile = rfile
+        self.Remaining = length
+
+    def _limit(self, size):
+        if size is None or size < 0 or size > self.Remaining:
+            return self.Remaining
+        return size
+
+    def read(self, size=-1):
+        size = self._limit(size)
+        if not size:
+            return ''
+
+        data = self._rfile.read(size)
+        self.Remaining -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        size = self._limit(size)
+        if not size:
+            return ''
+
+        data = self._rfile.readline(size)
+        self.Remaining -= len(data)
+        return data
+
+    def discard(self, limit=MAX_DISCARD):
+        """Read and drop the rest of the body
+
+        Returns ``False`` if more than ``limit`` bytes were left or the
+        client closed the connection, in which case the connection can't be
+        reused.
+        """
+        if self.Remaining > limit:
+            return False
+
+        while self.Remaining:
+            if not self.read(64 * 1024):
+                return False
+        return True
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Request metrics for the HTML interface's ``/metrics`` route
+
+``Metrics`` counts the requests handled by a server process, by route and
+command, and renders them in the Prometheus text exposition format. In
+prefork mode each worker process keeps its own metrics.
+"""
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+from bisect import bisect_left
+from threading import Lock
+
+# upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+LABEL_NAMES = ('route', 'command')
+
+def escape_label_value(value):
+    """Escape a label value for the Prometheus text format"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values):
+    """Return ``{name="value",...}``, or '' if there are no labels"""
+    if not names:
+        return ''
+    return '{%s}' % ','.join(['%s="%s"' % (n, escape_label_value(str(v)))
+                              for n, v in zip(names, values)])
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+class Metrics(object):
+    """Thread-safe request counters, gauges and latency histograms
+
+    Requests are labelled with a ``(route, command)`` tuple.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.Buckets = tuple(sorted(buckets))
+        self._lock = Lock()
+        self._requests = {}
+        self._errors = {}
+        self._in_flight = {}
+        self._bytes_received = {}
+        self._bytes_sent = {}
+        self._durations = {}
+
+    def start(self, labels):
+        """Record that a request has started"""
+        with self._lock:
+            self._in_flight[labels] = self._in_flight.get(labels, 0) + 1
+
+    def finish(self, labels, code, duration, bytes_received, bytes_sent):
+        """Record a finished request
+
+        ``code`` is the response's status code, ``duration`` is in seconds
+        and the byte counts include headers sent but not headers received.
+        Responses with a status of 400 or more count as errors.
+        """
+        with self._lock:
+            self._in_flight[labels] -= 1
+
+            key = labels + (str(code),)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if code >= 400:
+                self._errors[labels] = self._errors.get(labels, 0) + 1
+
+            self._bytes_received[labels] = \
+                    self._bytes_received.get(labels, 0) + bytes_received
+            self._bytes_sent[labels] = \
+                    self._bytes_sent.get(labels, 0) + bytes_sent
+
+            if labels not in self._durations:
+                self._durations[labels] = [[0] * (len(self.Buckets) + 1),
+                                           0.0]
+            histogram = self._durations[labels]
+            histogram[0][bisect_left(self.Buckets, duration)] += 1
+            histogram[1] += duration
+
+    def render(self, gauges=()):
+        """Return the metrics in the Prometheus text format
+
+        ``gauges`` are extra ``(name, help, value)`` metrics to include, such
+        as queue depths that the ``Metrics`` object doesn't track itself.
+        """
+        lines = []
+
+        def add(name, type_, help_, samples, label_names=LABEL_NAMES):
+            lines.append('# HELP %s %s' % (name, help_))
+            lines.append('# TYPE %s %s' % (name, type_))
+            for values, value in sorted(samples):
+                lines.append('%s%s %s' % (name,
+                                          format_labels(label_names, values),
+                                          format_value(value)))
+
+        with self._lock:
+            add('pyqi_http_requests_total', 'counter',
+                'HTTP requests handled.', self._requests.items(),
+                LABEL_NAMES + ('code',))
+            add('pyqi_http_request_errors_total', 'counter',
+                'HTTP requests answered with a status of 400 or more.',
+                self._errors.items())
+            add('pyqi_http_requests_in_flight', 'gauge',
+                'HTTP requests being handled.', self._in_flight.items())
+            add('pyqi_http_request_bytes_total', 'counter',
+                'Bytes of request bodies received.',
+                self._bytes_received.items())
+            add('pyqi_http_response_bytes_total', 'counter',
+                'Bytes of responses sent.', self._bytes_sent.items())
+
+            name = 'pyqi_http_request_duration_seconds'
+            lines.append('# HELP %s Time taken to handle HTTP requests.' %
+                         name)
+            lines.append('# TYPE %s histogram' % name)
+            for labels, (counts, total) in sorted(self._durations.items()):
+                cumulative = 0
+                for bound, count in zip(self.Buckets + (float('inf'),),
+                                        counts):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (name,
+                            format_labels(LABEL_NAMES + ('le',),
+                                          labels + (format_value(bound),)),
+                            cumulative))
+                lines.append('%s_sum%s %s' % (name,
+                        format_labels(LABEL_NAMES, labels), repr(total)))
+                lines.append('%s_count%s %d' % (name,
+                        format_labels(LABEL_NAMES, labels), cumulative))
+
+        for name, help_, value in gauges:
+            add(name, 'gauge', help_, [((), value)], ())
+
+        return '\n'.join(lines) + '\n'
+
+class CountingWriter(object):
+    """Wrap a file object, counting the bytes written to it"""
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self.BytesWritten = 0
+
+    def write(self, data):
+        self._wfile.write(data)
+        self.BytesWritten += len(data)
+
+    def __getattr__(self, name):
+        return getattr(self._wfile, name)
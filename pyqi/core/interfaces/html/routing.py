@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+from urllib import unquote
+from pyqi.core.exception import IncompetentDeveloperError
+
+def _split_path(path):
+    """Split a path into unquoted segments, ignoring empty segments"""
+    return [unquote(s) for s in path.split('/') if s]
+
+def _is_param(segment):
+    return segment.startswith('<') and segment.endswith('>')
+
+class _RouteNode(object):
+    """A node in the trie of routes that have parameters"""
+    def __init__(self):
+        self.Children = {}
+        self.ParamName = None
+        self.ParamChild = None
+        self.Methods = {}
+
+class Router(object):
+    """Map request methods and paths to handlers
+
+    Paths are made of '/'-separated segments. A segment written as ``<name>``
+    matches any single segment, which is passed to the handler as the
+    parameter ``name``. Routes without parameters are found with a single
+    ``dict`` lookup and the others by walking a trie of segments, so the cost
+    of resolving a path does not depend on the number of routes. Routes
+    without parameters take precedence.
+    """
+
+    def __init__(self):
+        self._static = {}
+        self._root = _RouteNode()
+
+    def add(self, method, path, handler):
+        """Route ``method`` requests for ``path`` to ``handler``"""
+        segments = _split_path(path)
+
+        if not [s for s in segments if _is_param(s)]:
+            methods = self._static.setdefault(tuple(segments), {})
+        else:
+            node = self._root
+            for segment in segments:
+                if not _is_param(segment):
+                    node = node.Children.setdefault(segment, _RouteNode())
+                    continue
+
+                name = segment[1:-1]
+                if node.ParamChild is None:
+                    node.ParamName = name
+                    node.ParamChild = _RouteNode()
+                elif node.ParamName != name:
+                    raise IncompetentDeveloperError("Route %s names the "
+                            "parameter '%s', but another route names it "
+                            "'%s'." % (path, name, node.ParamName))
+                node = node.ParamChild
+            methods = node.Methods
+
+        if method in methods:
+            raise IncompetentDeveloperError("Found more than one %s route "
+                                            "for %s." % (method, path))
+        methods[method] = handler
+
+    def resolve(self, method, path):
+        """Find the handler for a request
+
+        Returns ``(handler, params, allowed)``, where ``params`` is a ``dict``
+        of the path parameters and ``allowed`` is a sorted list of the methods
+        routed for ``path``. ``handler`` is ``None`` if nothing matched: the
+        path is unknown if ``allowed`` is empty, otherwise the method is not
+        allowed.
+        """
+        segments = _split_path(path)
+        params = {}
+
+        methods = self._static.get(tuple(segments))
+        if methods is None:
+            methods = self._match(self._root, segments, 0, params)
+            if methods is None:
+                return None, {}, []
+
+        return methods.get(method), params, sorted(methods)
+
+    def _match(self, node, segments, index, params):
+        if index == len(segments):
+            return node.Methods or None
+
+        segment = segments[index]
+        child = node.Children.get(segment)
+        if child is not None:
+            methods = self._match(child, segments, index + 1, params)
+            if methods is not None:
+                return methods
+
+        if node.ParamChild is not None:
+            methods = self._match(node.ParamChild, segments, index + 1,
+                                  params)
+            if methods is not None:
+                params[node.ParamName] = segment
+                return methods
+
+        return None
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Compression and HTTP caching for HTML interface responses
+
+``StaticContent`` holds a response body that doesn't change until the server
+reloads its commands, along with its ETag, its Last-Modified time and its
+compressed forms, which are computed once. ``choose_encoding`` negotiates a
+content coding from an Accept-Encoding header, and ``is_not_modified``
+evaluates the conditional request headers.
+"""
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+import zlib
+from email.utils import formatdate, parsedate_tz, mktime_tz
+from hashlib import md5
+from time import time
+
+# bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 256
+
+# in order of preference
+ENCODINGS = ['gzip', 'deflate']
+
+def encode(body, encoding):
+    """Compress ``body`` with the 'gzip', 'deflate' or 'identity' coding"""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(body) + compressor.flush()
+    elif encoding == 'deflate':
+        return zlib.compress(body, 6)
+    return body
+
+def choose_encoding(accept_encoding, body_size):
+    """Return the content coding to use for a body of ``body_size`` bytes
+
+    ``accept_encoding`` is the value of the request's Accept-Encoding header,
+    or ``None``. Returns 'identity' if the body shouldn't be compressed.
+    """
+    if not accept_encoding or body_size < MIN_COMPRESS_SIZE:
+        return 'identity'
+
+    accepted = {}
+    for item in accept_encoding.split(','):
+        parts = [p.strip() for p in item.split(';')]
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[parts[0].lower()] = q
+
+    candidates = [e for e in ENCODINGS
+                  if accepted.get(e, accepted.get('*', 0.0)) > 0]
+    if not candidates:
+        return 'identity'
+
+    # the highest q-value wins; ties go to the earlier, preferred encoding
+    return max(candidates,
+               key=lambda e: (accepted.get(e, accepted.get('*')),
+                              -ENCODINGS.index(e)))
+
+def is_not_modified(headers, etag, last_modified):
+    """Return ``True`` if a 304 should be sent instead of the body
+
+    ``headers`` are the request headers, ``etag`` is the quoted ETag of the
+    representation and ``last_modified`` is a POSIX timestamp.
+    """
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        return '*' in tags or etag in tags or ('W/' + etag) in tags
+
+    if_modified_since = headers.get('If-Modified-Since')
+    if if_modified_since is not None:
+        parsed = parsedate_tz(if_modified_since)
+        if parsed is not None:
+            return int(last_modified) <= mktime_tz(parsed)
+
+    return False
+
+class StaticContent(object):
+    """A response body with its validators and compressed forms"""
+
+    def __init__(self, Body, ContentType, LastModified=None):
+        self.Body = Body
+        self.ContentType = ContentType
+        self.LastModified = time() if LastModified is None else LastModified
+        self.ETag = md5(Body).hexdigest()
+        self._encoded = {'identity': Body}
+
+    def getBody(self, encoding):
+        """Return the body in the ``encoding`` content coding"""
+        if encoding not in self._encoded:
+            self._encoded[encoding] = encode(self.Body, encoding)
+        return self._encoded[encoding]
+
+    def getETag(self, encoding):
+        """Return the quoted ETag of the body in ``encoding``
+
+        Each coding is a different representation, so each gets its own
+        strong ETag.
+        """
+        if encoding == 'identity':
+            return '"%s"' % self.ETag
+        return '"%s-%s"' % (self.ETag, encoding)
+
+    def getLastModified(self):
+        """Return the Last-Modified header value"""
+        return formatdate(self.LastModified, usegmt=True)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Helpers for sending results that may not fit in memory
+
+Results can be strings, file objects or iterables of strings.
+"""
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+import os
+import stat
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def get_content_length(contents):
+    """Return the length of a string or regular file, or ``None``
+
+    The length of a file is the number of bytes left to read.
+    """
+    if isinstance(contents, basestring):
+        return len(contents)
+
+    try:
+        st = os.fstat(contents.fileno())
+        if stat.S_ISREG(st.st_mode):
+            return st.st_size - contents.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        pass
+    return None
+
+def iter_chunks(contents):
+    """Yield the non-empty strings of a file object or iterable of strings"""
+    if hasattr(contents, 'read'):
+        read = contents.read
+        contents = iter(lambda: read(STREAM_CHUNK_SIZE), '')
+
+    for chunk in contents:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('utf-8')
+        if chunk:
+            yield chunk
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Spool uploaded files to disk
+
+``cgi.FieldStorage`` reads request bodies in chunks of at most 64 KiB. The
+``FieldStorage`` classes made by ``spooled_field_storage_factory`` keep each
+uploaded file in memory until it grows past a threshold, then move it to a
+named temporary file, so large uploads never have to fit in memory and input
+handlers can work with a path (see ``pyqi.core.interfaces.html.input_handler``).
+Temporary files are deleted once the ``FieldStorage`` is garbage collected.
+"""
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+from cgi import FieldStorage
+from cStringIO import StringIO
+from tempfile import NamedTemporaryFile
+
+class SpooledUpload(object):
+    """A file kept in memory until it grows past ``max_size`` bytes
+
+    Works like ``tempfile.SpooledTemporaryFile``, except that ``rollover``
+    moves the contents to a ``NamedTemporaryFile`` in ``dir``, so that the
+    upload can be handed to a command as a path. A ``max_size`` of 0 puts
+    the contents on disk straight away.
+    """
+
+    def __init__(self, max_size=0, dir=None):
+        self._max_size = max_size
+        self._dir = dir
+        self._file = StringIO()
+        self._rolled = False
+
+        if max_size == 0:
+            self.rollover()
+
+    def rollover(self):
+        """Move the contents to a named temporary file, if not already"""
+        if self._rolled:
+            return
+
+        file = self._file
+        newfile = NamedTemporaryFile(mode='w+b', prefix='pyqi-upload-',
+                                     dir=self._dir)
+        newfile.write(file.getvalue())
+        newfile.seek(file.tell(), 0)
+
+        self._file = newfile
+        self._rolled = True
+
+    def _check(self):
+        if not self._rolled and self._file.tell() > self._max_size:
+            self.rollover()
+
+    def write(self, s):
+        self._file.write(s)
+        self._check()
+
+    def writelines(self, lines):
+        self._file.writelines(lines)
+        self._check()
+
+    def fileno(self):
+        self.rollover()
+        return self._file.fileno()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, attr):
+        # the rest of the file protocol (read, seek, name, close, ...)
+        return getattr(self._file, attr)
+
+def spooled_field_storage_factory(memory_threshold, upload_dir=None):
+    """Return a ``FieldStorage`` class that spools uploads to disk
+
+    Uploaded files larger than ``memory_threshold`` bytes are written to
+    temporary files in ``upload_dir`` (the system's temporary directory if
+    ``None``). Other form fields are read as ``FieldStorage`` reads them.
+    """
+    class SpooledFieldStorage(FieldStorage):
+        """Dynamic spooling FieldStorage"""
+        MemoryThreshold = memory_threshold
+        UploadDir = upload_dir
+
+        def make_file(self, binary=None):
+            if self.filename is None:
+                return FieldStorage.make_file(self, binary)
+
+            return SpooledUpload(self.MemoryThreshold, self.UploadDir)
+
+        def read_lines(self):
+            FieldStorage.read_lines(self)
+
+            # FieldStorage keeps up to 1000 bytes in a StringIO before it
+            # calls make_file; move small uploads to a SpooledUpload too, so
+            # that every upload can be moved to disk
+            if self.filename is not None and \
+                    not isinstance(self.file, SpooledUpload):
+                upload = self.make_file()
+                upload.write(self.file.getvalue())
+                self.file = upload
+
+    return SpooledFieldStorage
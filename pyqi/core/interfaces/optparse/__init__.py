@@ -13,6 +13,7 @@ __credits__ = ["Greg Caporaso", "Daniel McDonald", "Gavin Huttley",
                "Jose Antonio Navas Molina"]
 
 import os
+import sys
 import types
 from copy import copy
 from glob import glob
@@ -24,6 +25,7 @@ from pyqi.core.interface import (Interface, InterfaceInputOption,
 from pyqi.core.factory import general_factory
 from pyqi.core.exception import IncompetentDeveloperError
 from pyqi.core.command import Parameter
+from pyqi.core.timing import PhaseTimings
 
 class OptparseResult(InterfaceOutputOption):
     def __init__(self, **kwargs):
@@ -270,10 +272,29 @@ def optparse_factory(command_constructor, usage_examples, inputs, outputs,
     return general_factory(command_constructor, usage_examples, inputs,
                            outputs, version, OptparseInterface)
 
+# driver option that prints how long each phase of the interface call took
+TIMINGS_OPTION = '--pyqi-timings'
+
 def optparse_main(interface_object, local_argv):
-    """Construct and execute an interface object"""
+    """Construct and execute an interface object
+
+    If ``local_argv`` contains ``--pyqi-timings``, it is removed and the time
+    and memory taken by each phase of the interface call are written to
+    ``stderr`` once it finishes.
+    """
+    local_argv = list(local_argv)
+    timings = None
+    if TIMINGS_OPTION in local_argv[1:]:
+        local_argv.remove(TIMINGS_OPTION)
+        timings = PhaseTimings()
+
     optparse_cmd = interface_object()
-    result = optparse_cmd(local_argv[1:])
+    optparse_cmd.Timings = timings
+    try:
+        result = optparse_cmd(local_argv[1:])
+    finally:
+        if timings is not None:
+            sys.stderr.write(timings.format() + '\n')
     return 0
 
 # Definition of PyqiOption option type, a subclass of Option that contains
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""A persistent server for command line interfaces
+
+``start_daemon`` imports every command configuration and builds every
+``OptparseInterface`` class up front, then listens on a Unix socket. Each
+request is handled by a forked worker, so commands start from the preloaded
+parent without paying for imports or interface construction.
+
+``run_client`` is the thin client used by a driver script (see
+``scripts/pyqi``, which uses it when ``PYQI_DAEMON_SOCKET`` is set). It
+passes its standard input, output and error file descriptors over the socket,
+followed by argv, the working directory and the environment, then waits for
+the command's exit status. The worker puts the client's descriptors in place
+of its own 0, 1 and 2, so everything the command reads or writes, including
+from subprocesses and C extensions, goes straight to the client's terminal,
+pipes or files.
+
+Messages from the worker to the client are framed as a one-character channel
+(``x`` for the exit status and ``r`` if the request was refused), a four-byte
+big-endian length and the payload.
+"""
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import errno
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+from struct import pack, unpack
+try:
+    from _multiprocessing import sendfd, recvfd
+except ImportError:
+    sendfd = recvfd = None
+from pyqi.core.interface import get_command_names, get_command_config
+from pyqi.core.interfaces.optparse import optparse_factory, optparse_main
+from pyqi.util import get_version_string
+
+EXIT = 'x'
+REFUSED = 'r'
+
+_header_size = 5
+
+def _send_frame(sock, channel, payload):
+    sock.sendall(pack('>cI', channel, len(payload)) + payload)
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return ''.join(chunks)
+
+def _recv_frame(sock):
+    header = _recv_exactly(sock, _header_size)
+    if header is None:
+        return None, None
+
+    channel, size = unpack('>cI', header)
+    return channel, _recv_exactly(sock, size)
+
+def get_interface_classes(command_config_module):
+    """Import every command config and build its ``OptparseInterface`` class
+
+    Returns a ``dict`` mapping command names to interface classes. Commands
+    that cannot be loaded are left out.
+    """
+    version_str = get_version_string(command_config_module)
+    interface_classes = {}
+
+    for cmd in get_command_names(command_config_module):
+        cmd_cfg, _ = get_command_config(command_config_module, cmd,
+                                        exit_on_failure=False)
+
+        if cmd_cfg is not None:
+            interface_classes[cmd] = optparse_factory(
+                    cmd_cfg.CommandConstructor, cmd_cfg.usage_examples,
+                    cmd_cfg.inputs, cmd_cfg.outputs, version_str)
+
+    return interface_classes
+
+def _reap_children(signum, frame):
+    try:
+        while os.waitpid(-1, os.WNOHANG)[0] > 0:
+            pass
+    except OSError:
+        pass
+
+def _exit_status(code):
+    """Convert a ``SystemExit`` code to a process exit status"""
+    if code is None:
+        return 0
+    elif isinstance(code, int):
+        return code
+    else:
+        sys.stderr.write('%s\n' % code)
+        return 1
+
+def _handle_request(conn, command_config_module, interface_classes):
+    """Execute a single request in a forked worker
+
+    Unless the request is refused, an exit status is always sent, so the
+    client can tell a command that failed from a worker that died. Errors
+    before the client's file descriptors have been received are written to
+    the daemon's stderr.
+    """
+    try:
+        # the descriptors come first, since reading the request through a
+        # buffered file could swallow them
+        _use_client_fds([recvfd(conn.fileno()) for i in range(3)])
+        request = json.loads(conn.makefile('rb').readline())
+
+        if request['command_config_module'] != command_config_module:
+            _send_frame(conn, REFUSED, command_config_module)
+            return
+
+        status = _run_request(request, interface_classes)
+    except SystemExit, e:
+        status = _exit_status(e.code)
+    except Exception:
+        traceback.print_exc(file=sys.stderr)
+        status = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    _send_frame(conn, EXIT, str(status))
+
+def _use_client_fds(fds):
+    """Make the client's stdin, stdout and stderr the worker's own"""
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+
+    sys.stdin = os.fdopen(0, 'rb')
+    sys.stdout = os.fdopen(1, 'wb')
+    sys.stderr = os.fdopen(2, 'wb', 0)
+
+def _run_request(request, interface_classes):
+    """Run the command in a request, returning its exit status"""
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    for key, value in request['env'].items():
+        os.environ[key.encode('utf-8')] = value.encode('utf-8')
+
+    driver_name = request['driver_name'].encode('utf-8')
+    argv = [arg.encode('utf-8') for arg in request['argv']]
+
+    if argv and argv[0].lower() in ['help', '--help', '-?', '-h'] and \
+            len(argv) > 1:
+        cmd_name = argv[1]
+        local_argv = ['help', '-h']
+    elif argv:
+        cmd_name = argv[0]
+        local_argv = argv
+    else:
+        cmd_name = None
+
+    if cmd_name not in interface_classes:
+        sys.stderr.write("Unrecognized command %s. To see a list of all "
+                         "available commands, run %s\n" % (cmd_name,
+                                                           driver_name))
+        return 1
+
+    sys.argv = [' '.join([driver_name, cmd_name])] + local_argv[1:]
+    return optparse_main(interface_classes[cmd_name], local_argv)
+
+def start_daemon(socket_path, command_config_module):
+    """Serve command line requests on ``socket_path`` until interrupted"""
+    interface_classes = get_interface_classes(command_config_module)
+
+    # listen on a temporary path and rename it into place, so that clients
+    # never find a socket that isn't accepting connections yet
+    tmp_socket_path = '%s.%d' % (socket_path, os.getpid())
+    if os.path.exists(tmp_socket_path):
+        os.remove(tmp_socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(tmp_socket_path)
+    server.listen(128)
+    os.rename(tmp_socket_path, socket_path)
+
+    signal.signal(signal.SIGCHLD, _reap_children)
+    print "-- Serving %d commands from %s on %s --" % (len(interface_classes),
+                                                      command_config_module,
+                                                      socket_path)
+    print "To close the server, type 'ctrl-c' into this window."
+    sys.stdout.flush()
+
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.error, e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                try:
+                    _handle_request(conn, command_config_module,
+                                    interface_classes)
+                finally:
+                    os._exit(0)
+
+            conn.close()
+    except KeyboardInterrupt:
+        return "-- Finished serving command line requests --"
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+def run_client(socket_path, command_config_module, driver_name, argv,
+               stdin=None, stdout=None, stderr=None):
+    """Run a command through the daemon listening on ``socket_path``
+
+    ``argv`` should not include the driver name. The command reads from and
+    writes to the file descriptors of ``stdin``, ``stdout`` and ``stderr``
+    (by default ``sys``'s). Returns the exit status of the command, or
+    ``None`` if the daemon could not be reached or refused the request, in
+    which case the command hasn't run and the caller should run it itself.
+    If the connection is lost once the request has been sent, the command
+    may have partly run, so it is reported as failed (with a status of 1)
+    rather than left to be run again.
+    """
+    stdin = sys.stdin if stdin is None else stdin
+    stdout = sys.stdout if stdout is None else stdout
+    stderr = sys.stderr if stderr is None else stderr
+
+    if sendfd is None:
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        sock.close()
+        return None
+
+    try:
+        request = {'argv': argv,
+                   'cwd': os.getcwd(),
+                   'env': dict(os.environ),
+                   'driver_name': driver_name,
+                   'command_config_module': command_config_module}
+
+        # anything already written has to come before the command's output
+        stdout.flush()
+        stderr.flush()
+
+        # the request ends with a newline, so a worker can't act on one that
+        # wasn't sent in full
+        try:
+            for f in (stdin, stdout, stderr):
+                sendfd(sock.fileno(), f.fileno())
+            sock.sendall(json.dumps(request) + '\n')
+        except (socket.error, OSError):
+            return None
+
+        try:
+            channel, payload = _recv_frame(sock)
+        except socket.error:
+            channel, payload = None, None
+
+        if channel == EXIT:
+            return int(payload)
+        elif channel == REFUSED:
+            return None
+        else:
+            stderr.write("Lost the connection to the %s server before the "
+                         "command finished.\n" % driver_name)
+            stderr.flush()
+            return 1
+    finally:
+        sock.close()
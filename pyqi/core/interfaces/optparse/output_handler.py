@@ -45,7 +45,9 @@ def write_string(result_key, data, option_value=None):
 def write_list_of_strings(result_key, data, option_value=None):
     """Write a list of strings to a file, one per line.
     
-    A newline will be added to the end of the file.
+    A newline will be added to the end of the file. ``data`` can be any
+    iterable of strings, such as a streaming ``CommandOut``, and is consumed
+    one line at a time.
     """
     if option_value is None:
         raise IncompetentDeveloperError("Cannot write output without a "
@@ -62,7 +64,8 @@ def write_list_of_strings(result_key, data, option_value=None):
 def print_list_of_strings(result_key, data, option_value=None):
     """Print a list of strings to stdout, one per line.
 
-    ``result_key`` and ``option_value`` are ignored.
+    ``result_key`` and ``option_value`` are ignored. ``data`` can be any
+    iterable of strings, such as a streaming ``CommandOut``.
     """
     for line in data:
         print line
@@ -9,41 +9,122 @@
 #-----------------------------------------------------------------------------
 from __future__ import division
 
+import atexit
+import json
+from os import getpid
 from sys import stderr
+from collections import deque
 from datetime import datetime
+from threading import Condition, Event, Lock, Thread
+from time import time
+from pyqi.core.exception import IncompetentDeveloperError
 
 __credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
                "Jai Ram Rideout"]
 
+def get_size(value):
+    """Return the size of a phase's input or output for a phase record
+
+    A ``dict`` (such as a ``Command``'s kwargs or result) is sized per key,
+    as ``{name: len(value)}``, since its values' lengths count different
+    things (e.g., characters in strings and items in lists). Values without
+    a length, such as numbers and streams, have a size of ``None``, as does
+    anything else without a ``len``.
+    """
+    if isinstance(value, dict):
+        return dict([(k, _get_len(v)) for k, v in value.iteritems()])
+    return _get_len(value)
+
+def _get_len(value):
+    if hasattr(value, '__len__'):
+        return len(value)
+    return None
+
 class InvalidLoggerError(Exception):
     pass
 
+def _format(msg, args):
+    """Return ``msg % args``, with a single mapping used for named fields"""
+    if not args:
+        return msg
+    if len(args) == 1 and isinstance(args[0], dict):
+        args = args[0]
+    return msg % args
+
 class Logger(object):
-    """Abstract logging interface"""
+    """Abstract logging interface
+
+    Messages below the logger's ``Level`` are ignored. The logging methods
+    take ``%``-style arguments, which are only formatted into the message if
+    it is logged, so that a disabled call costs little more than the call
+    itself. ``isEnabledFor`` can be used to skip building expensive
+    arguments altogether.
+    """
     DEBUG = 'DEBUG'
     INFO = 'INFO'
     WARN = 'WARN'
     FATAL = 'FATAL'
+    LevelValues = {DEBUG: 10, INFO: 20, WARN: 30, FATAL: 40}
+    Level = DEBUG
+    AutoFlush = True # flush after every message
+    TimesPhases = False # whether phase records are wanted (see phase)
+    _min_value = 10
+
+    def __init__(self, level=DEBUG):
+        self.setLevel(level)
+
+    def setLevel(self, level):
+        """Ignore messages below ``level``"""
+        if level not in self.LevelValues:
+            raise IncompetentDeveloperError("Unknown log level '%s'. Must be "
+                    "one of: %s" % (level, ', '.join(sorted(
+                        self.LevelValues, key=self.LevelValues.get))))
+        self.Level = level
+        self._min_value = self.LevelValues[level]
+
+    def isEnabledFor(self, level):
+        """Return ``True`` if messages at ``level`` are logged"""
+        return self.LevelValues[level] >= self._min_value
+
+    def debug(self, msg, *args):
+        """Log ``msg % args`` at the DEBUG level"""
+        if self._min_value <= 10:
+            self._debug(_format(msg, args))
+            if self.AutoFlush:
+                self.flush()
 
-    def debug(self, msg):
-        """Log at the DEBUG level"""
-        self._debug(msg)
-        self.flush()
+    def info(self, msg, *args):
+        """Log ``msg % args`` at the INFO level"""
+        if self._min_value <= 20:
+            self._info(_format(msg, args))
+            if self.AutoFlush:
+                self.flush()
 
-    def info(self, msg):
-        """Log at the INFO level"""
-        self._info(msg)
-        self.flush()
+    def warn(self, msg, *args):
+        """Log ``msg % args`` at the WARN level"""
+        if self._min_value <= 30:
+            self._warn(_format(msg, args))
+            if self.AutoFlush:
+                self.flush()
 
-    def warn(self, msg):
-        """Log at the WARN level"""
-        self._warn(msg)
-        self.flush()
+    def fatal(self, msg, *args):
+        """Log ``msg % args`` at the FATAL level"""
+        if self._min_value <= 40:
+            self._fatal(_format(msg, args))
+            if self.AutoFlush:
+                self.flush()
 
-    def fatal(self, msg):
-        """Log at the FATAL level"""
-        self._fatal(msg)
-        self.flush()
+    def phase(self, command, phase, duration, input_size=None,
+              output_size=None):
+        """Record that ``command`` (a class) spent ``duration`` in ``phase``
+
+        Phases are 'validate', 'run' and 'validate_result' (from
+        ``Command.__call__``) and 'output' (from ``Interface.__call__``). The
+        sizes are those returned by ``get_size`` for the phase's input and
+        output, or ``None`` if not applicable. Callers only time phases if
+        ``TimesPhases`` is ``True``, and this implementation ignores them.
+        """
+        pass
 
     def _debug(self, msg):
         raise NotImplementedError("All subclasses must implement debug.")
@@ -71,6 +152,11 @@ class Logger(object):
 
 class NullLogger(Logger):
     """Ignore log messages"""
+    _min_value = float('inf') # no level is enabled
+
+    def __init__(self):
+        pass
+
     def _debug(self, msg):
         pass
     def _info(self, msg):
@@ -93,3 +179,258 @@ class StdErrLogger(Logger):
 
     def _fatal(self, msg):
         stderr.write(self._format_line(self.FATAL, msg) + '\n')
+
+# json.dumps builds a new encoder per call unless its arguments are defaults
+_json_encoder = json.JSONEncoder(separators=(',', ':'))
+
+class JSONLinesLogger(Logger):
+    """Log one JSON object per line to ``stream`` (default ``stderr``)
+
+    Messages are written as ``{"time": ..., "level": ..., "message": ...}``
+    and phase records, which are logged at the INFO level, as ``{"time":
+    ..., "level": "INFO", "command": ..., "phase": ..., "duration": ...,
+    "input_size": ..., "output_size": ...}``, where ``command`` is the
+    ``Command`` class's module and name and ``duration`` is in seconds.
+    ``input_size`` and ``output_size`` are as returned by ``get_size``:
+    usually an object mapping each kwarg or result name to the ``len`` of
+    its value (``null`` if it has none), or ``null`` if not applicable.
+    """
+    TimesPhases = True
+
+    def __init__(self, stream=None, level=Logger.DEBUG):
+        super(JSONLinesLogger, self).__init__(level)
+        self.Stream = stream
+
+    def phase(self, command, phase, duration, input_size=None,
+              output_size=None):
+        if self._min_value <= 20:
+            self._write({'time': self._get_timestamp(),
+                         'level': self.INFO,
+                         'command': '%s.%s' % (command.__module__,
+                                               command.__name__),
+                         'phase': phase,
+                         'duration': duration,
+                         'input_size': input_size,
+                         'output_size': output_size})
+            if self.AutoFlush:
+                self.flush()
+
+    def _debug(self, msg):
+        self._write_message(self.DEBUG, msg)
+
+    def _info(self, msg):
+        self._write_message(self.INFO, msg)
+
+    def _warn(self, msg):
+        self._write_message(self.WARN, msg)
+
+    def _fatal(self, msg):
+        self._write_message(self.FATAL, msg)
+
+    def flush(self):
+        self._get_stream().flush()
+
+    def _get_stream(self):
+        return stderr if self.Stream is None else self.Stream
+
+    def _write_message(self, level, msg):
+        self._write({'time': self._get_timestamp(), 'level': level,
+                     'message': msg})
+
+    def _write(self, record):
+        self._get_stream().write(_json_encoder.encode(record) + '\n')
+
+class QueuedLogger(Logger):
+    """Log messages to ``stream`` from a background thread
+
+    Logging a message only appends it to a ``deque``; a writer thread formats
+    the queued messages and writes them in batches of up to ``batch_size``.
+    The writer is only woken once a batch has filled up (or the queue is
+    full), by ``flush`` and by ``close``, so that it doesn't compete with the
+    threads doing the logging. At most ``max_queued`` messages can wait to be
+    written (0 for no limit). When the queue is full, ``overflow`` decides
+    what happens to a new message: 'drop' discards it (the number of
+    discarded messages is logged once there is room again), and 'block'
+    waits for room.
+
+    ``flush`` waits until every message logged so far has been written. The
+    logger is flushed when the interpreter exits, and ``close`` flushes it
+    and stops the writer thread. A forked child starts with an empty queue
+    and its own writer thread.
+    """
+    AutoFlush = False
+    OverflowPolicies = ['drop', 'block']
+
+    def __init__(self, stream=None, max_queued=10000, batch_size=1000,
+                 overflow='drop', level=Logger.DEBUG):
+        super(QueuedLogger, self).__init__(level)
+        if overflow not in self.OverflowPolicies:
+            raise IncompetentDeveloperError("Unknown overflow policy '%s'. "
+                    "Must be one of: %s" % (overflow,
+                                            ', '.join(self.OverflowPolicies)))
+
+        self.Stream = stderr if stream is None else stream
+        self.BatchSize = batch_size
+        self.Overflow = overflow
+        self.Dropped = 0
+        self._max_queued = max_queued
+        self._wake_size = min(batch_size, max_queued or batch_size)
+        self._writer = None
+        self._pid = None
+        self._exit_registered = False
+        self._reset()
+
+    def _reset(self):
+        # deque.append and popleft are atomic, so only waking the writer and
+        # counting dropped messages need locks
+        self._records = deque()
+        self._wake = Event()
+        self._room = Condition(Lock())
+        self._lock = Lock()
+        self._unreported_drops = 0
+
+    def _debug(self, msg):
+        self._put((time(), self.DEBUG, msg))
+
+    def _info(self, msg):
+        self._put((time(), self.INFO, msg))
+
+    def _warn(self, msg):
+        self._put((time(), self.WARN, msg))
+
+    def _fatal(self, msg):
+        self._put((time(), self.FATAL, msg))
+
+    def flush(self):
+        """Wait until every queued message has been written"""
+        self._check_fork()
+        if self._writer is not None:
+            # the writer sets the event once it has written what came before
+            written = Event()
+            self._records.append(written)
+            self._wake.set()
+            written.wait()
+
+    def close(self):
+        """Write every queued message and stop the writer thread"""
+        self._check_fork()
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._records.append(None)
+            self._wake.set()
+            writer.join()
+
+    def _put(self, record):
+        if self._pid != getpid():
+            self._check_fork()
+        if self._writer is None:
+            self._start_writer()
+
+        records = self._records
+        if self._max_queued and len(records) >= self._max_queued:
+            self._wake.set()
+            if self.Overflow == 'drop':
+                with self._lock:
+                    self.Dropped += 1
+                    self._unreported_drops += 1
+                return
+
+            with self._room:
+                while len(records) >= self._max_queued:
+                    self._wake.set()
+                    self._room.wait(0.1)
+
+        records.append(record)
+        if len(records) >= self._wake_size and not self._wake.is_set():
+            self._wake.set()
+
+    def _check_fork(self):
+        """Start afresh in a forked child
+
+        The child doesn't inherit the writer thread, and the parent's queue
+        holds messages that the parent writes itself. The locks are replaced
+        too, since they may have been held when the process forked.
+        """
+        if self._pid is None or self._pid == getpid():
+            return
+
+        self._reset()
+        self._writer = None
+        self._pid = None
+        self.Dropped = 0
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is not None:
+                return
+            self._pid = getpid()
+            self._writer = Thread(target=self._write_queue)
+            self._writer.daemon = True
+            self._writer.start()
+
+            register_exit = not self._exit_registered
+            self._exit_registered = True
+
+        if register_exit:
+            atexit.register(self.close)
+
+    def _write_queue(self):
+        records = self._records
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+
+            stop = False
+            while records and not stop:
+                batch = []
+                written = []
+                while records and len(batch) < self.BatchSize:
+                    record = records.popleft()
+                    if record is None:
+                        stop = True
+                    elif isinstance(record, tuple):
+                        batch.append(record)
+                    else:
+                        written.append(record)
+
+                self._write_batch(batch)
+                for event in written:
+                    event.set()
+                with self._room:
+                    self._room.notify_all()
+
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        with self._lock:
+            dropped, self._unreported_drops = self._unreported_drops, 0
+        if dropped:
+            batch.append((time(), self.WARN,
+                          "Dropped %d log messages" % dropped))
+        if not batch:
+            return
+
+        try:
+            self.Stream.write(self._format_records(batch))
+            self.Stream.flush()
+        except (IOError, ValueError):
+            # the stream is gone (e.g., closed at exit); don't take the
+            # process down with it
+            pass
+
+    def _format_records(self, records):
+        """Return the logging lines for ``(created, level, msg)`` records"""
+        # formatting the date and time is most of the cost of a line, and
+        # consecutive records are usually logged in the same second
+        lines = []
+        second = prefix = None
+        for created, level, msg in records:
+            if int(created) != second:
+                second = int(created)
+                prefix = datetime.fromtimestamp(second).isoformat()
+            lines.append('%s.%06d %s %s\n' % (prefix,
+                                              (created - second) * 1000000,
+                                              level, msg))
+        return ''.join(lines)
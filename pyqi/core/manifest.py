@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""A cached summary of the commands in a command config module
+
+Listing commands (e.g., a driver's usage message or ``make-bash-completion``)
+needs only a little information about each command, but getting it requires
+importing every config module and every ``Command`` module. The manifest
+records that information in a JSON file so that it only has to be collected
+when something changes.
+
+A manifest is reused as long as the set of command names is unchanged and the
+modification time and size of every recorded config and ``Command`` module
+file are unchanged. Manifests are written to ``PYQI_MANIFEST_DIR`` if that
+environment variable is set, and to ``~/.pyqi/manifests`` otherwise, in a
+file named for the config module and its directory, so that checkouts of the
+same project in different places don't share a manifest. Failing to write a
+manifest is not an error.
+"""
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import importlib
+import json
+import os
+import sys
+from hashlib import sha1
+from os.path import abspath, dirname, exists, expanduser, join, splitext
+from tempfile import mkstemp
+from pyqi.core.interface import (get_command_names, get_command_config,
+                                 get_command_config_module)
+
+MANIFEST_VERSION = 1
+
+def get_manifest_dir():
+    """Return the directory that manifests are stored in"""
+    return os.environ.get('PYQI_MANIFEST_DIR',
+                          expanduser(join('~', '.pyqi', 'manifests')))
+
+def get_manifest_path(command_config_module, manifest_dir=None,
+                      suffix='.json'):
+    """Return the path of the manifest for ``command_config_module``
+
+    ``manifest_dir`` defaults to ``get_manifest_dir()``. Other files cached
+    alongside the manifest use a different ``suffix``.
+    """
+    if manifest_dir is None:
+        manifest_dir = get_manifest_dir()
+
+    config_module = importlib.import_module(command_config_module)
+    config_dir = dirname(abspath(config_module.__file__))
+    config_dir_hash = sha1(config_dir).hexdigest()[:12]
+    return join(manifest_dir, '%s-%s%s' % (command_config_module,
+                                           config_dir_hash, suffix))
+
+def get_command_manifest(command_config_module, manifest_dir=None):
+    """Return a manifest entry for each command in ``command_config_module``
+
+    Each entry is a ``dict`` with the keys ``name``, ``brief_description``,
+    ``options`` (the sorted option names, e.g. ``'--input-fp'``),
+    ``config_module`` (the command's config module, which may have been
+    registered through an entry point) and ``error``. If the command couldn't be loaded,
+    ``error`` is the error message and ``brief_description`` and ``options``
+    are ``None``.
+    """
+    command_names = list(get_command_names(command_config_module))
+    manifest_fp = get_manifest_path(command_config_module, manifest_dir)
+
+    manifest = _load_manifest(manifest_fp)
+    if manifest is not None and manifest['names'] == command_names and \
+            _files_unchanged(manifest['files']):
+        return manifest['commands']
+
+    manifest = _build_manifest(command_config_module, command_names)
+
+    # don't save failures, they may be caused by something we can't track
+    if not [c for c in manifest['commands'] if c['error'] is not None]:
+        _save_manifest(manifest_fp, manifest)
+
+    return manifest['commands']
+
+def _get_source_file(module):
+    """Return the .py file for a module, if possible"""
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return None
+
+    base, ext = splitext(path)
+    if ext in ('.pyc', '.pyo') and exists(base + '.py'):
+        path = base + '.py'
+    return path
+
+def _get_file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime, st.st_size]
+
+def _files_unchanged(files):
+    for path, signature in files.items():
+        if _get_file_signature(path) != signature:
+            return False
+    return True
+
+def _build_manifest(command_config_module, command_names):
+    commands = []
+    files = {}
+
+    for name in command_names:
+        cmd_cfg, error_msg = get_command_config(command_config_module, name,
+                                                exit_on_failure=False)
+        entry = {'name': name,
+                 'config_module': get_command_config_module(
+                         command_config_module, name),
+                 'brief_description': None,
+                 'options': None,
+                 'error': error_msg}
+
+        if cmd_cfg is not None:
+            cmd_constructor = cmd_cfg.CommandConstructor
+            entry['brief_description'] = cmd_constructor.BriefDescription
+            entry['options'] = sorted(['--%s' % p.Name
+                                       for p in cmd_cfg.inputs])
+
+            for module in (cmd_cfg, sys.modules[cmd_constructor.__module__]):
+                path = _get_source_file(module)
+                if path is not None:
+                    files[path] = _get_file_signature(path)
+
+        commands.append(entry)
+
+    return {'version': MANIFEST_VERSION,
+            'names': command_names,
+            'files': files,
+            'commands': commands}
+
+def _encode(obj):
+    """Convert the unicode strings that json produces to str"""
+    if isinstance(obj, unicode):
+        return obj.encode('utf-8')
+    elif isinstance(obj, list):
+        return [_encode(o) for o in obj]
+    elif isinstance(obj, dict):
+        return dict([(_encode(k), _encode(v)) for k, v in obj.items()])
+    return obj
+
+def _load_manifest(manifest_fp):
+    try:
+        with open(manifest_fp) as f:
+            manifest = _encode(json.load(f))
+    except (IOError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict) or \
+            manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def _save_manifest(manifest_fp, manifest):
+    manifest_dir = os.path.dirname(manifest_fp)
+
+    try:
+        if not exists(manifest_dir):
+            os.makedirs(manifest_dir)
+
+        # write then rename so that readers never see a partial file
+        fd, tmp_fp = mkstemp(dir=manifest_dir)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.rename(tmp_fp, manifest_fp)
+    except (IOError, OSError):
+        pass
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Chain ``Command`` objects together in-process
+
+A ``Pipeline`` is a directed acyclic graph of named steps. Each step is a
+``Command`` instance, some fixed kwargs, and links that feed ``CommandOuts``
+of earlier steps into its ``CommandIns``. For example::
+
+    pipeline = Pipeline()
+    pipeline.add_step('header', CodeHeaderGenerator(),
+                      inputs={'author': 'Alice'})
+    pipeline.add_step('code', MakeCommand(), inputs={'name': 'foo'},
+                      links={'credits': ('header', 'result')})
+    results = pipeline.run()
+    results['code']['result']
+
+The graph is checked when it is built (``Pipeline.build``, which ``run``
+calls if needed): every link must refer to an existing step and
+``CommandOut``, the ``CommandOut.DataType`` must be compatible with the
+``CommandIn.DataType``, required ``CommandIns`` must be supplied, and there
+can be no cycles. A streaming ``CommandOut`` can only be linked to a
+``CommandIn`` that accepts any iterator, such as one whose ``DataType`` is
+``collections.Iterable``.
+
+Steps are executed on an executor from ``pyqi.core.executor``. Each step is
+submitted as soon as the steps it depends on have completed, so independent
+branches run concurrently when a ``ThreadPoolExecutor`` or
+``ProcessPoolExecutor`` is used, and a slow step only holds up the steps that
+need its results. Streams can't be sent between processes, so a pipeline with
+streaming ``CommandOuts`` can't be run on a ``ProcessPoolExecutor``.
+"""
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+from collections import Iterator
+from types import ClassType
+from pyqi.core.executor import SerialExecutor, ProcessPoolExecutor
+from pyqi.core.exception import (IncompetentDeveloperError,
+                                 MissingParameterError,
+                                 UnknownParameterError)
+
+def is_compatible_type(out_type, in_type, streaming=False):
+    """Return ``True`` if values of ``out_type`` can be used as ``in_type``
+
+    Classes are compatible if ``out_type`` is a subclass of ``in_type``. A
+    ``DataType`` of ``None`` is compatible with anything. Other ``DataType``
+    values (e.g., strings) must be equal.
+
+    If ``streaming`` is ``True``, the values are iterators of ``out_type``
+    (see ``CommandOut.Streaming``), which are compatible only with an
+    ``in_type`` of ``None`` or a class that every iterator is an instance
+    of, such as ``collections.Iterable``.
+    """
+    class_types = (type, ClassType)
+    if streaming:
+        return in_type is None or (isinstance(in_type, class_types) and
+                                   issubclass(Iterator, in_type))
+
+    if out_type is None or in_type is None:
+        return True
+
+    if isinstance(out_type, class_types) and isinstance(in_type, class_types):
+        return issubclass(out_type, in_type)
+
+    return out_type == in_type
+
+class PipelineStep(object):
+    """A ``Command`` with its fixed kwargs and links to other steps"""
+
+    def __init__(self, Name, Command, Inputs, Links):
+        self.Name = Name
+        self.Command = Command
+        self.Inputs = Inputs
+        self.Links = Links
+
+    def getDependencies(self):
+        """Return the names of the steps this step depends on"""
+        return set([step_name for step_name, _ in self.Links.values()])
+
+class Pipeline(object):
+    """A directed acyclic graph of ``Command`` objects"""
+
+    def __init__(self):
+        self.Steps = {}
+        self._order = []
+        self._levels = None
+
+    def add_step(self, name, command, inputs=None, links=None):
+        """Add a step to the pipeline
+
+        ``command`` is a ``Command`` instance. ``inputs`` is a ``dict`` of
+        fixed kwargs. ``links`` maps ``CommandIn`` names to either
+        ``(step_name, command_out_name)`` tuples, or just a step name when the
+        ``CommandOut`` has the same name as the ``CommandIn``.
+        """
+        if name in self.Steps:
+            raise IncompetentDeveloperError("Found duplicate pipeline step "
+                                            "name '%s'. Step names must be "
+                                            "unique." % name)
+
+        normalized_links = {}
+        for in_name, source in (links or {}).items():
+            if isinstance(source, basestring):
+                source = (source, in_name)
+            normalized_links[in_name] = tuple(source)
+
+        self.Steps[name] = PipelineStep(name, command, dict(inputs or {}),
+                                        normalized_links)
+        self._order.append(name)
+        self._levels = None
+
+    def build(self):
+        """Check the pipeline and work out the execution order
+
+        Returns a list of levels, each a list of step names whose
+        dependencies are all in the previous levels.
+        """
+        for name in self._order:
+            self._validate_step(self.Steps[name])
+        self._validate_streams()
+
+        remaining = dict([(name, self.Steps[name].getDependencies())
+                          for name in self._order])
+        done = set()
+        levels = []
+
+        while remaining:
+            level = [name for name in self._order
+                     if name in remaining and remaining[name] <= done]
+
+            if not level:
+                raise IncompetentDeveloperError("Found a cycle between the "
+                                                "pipeline steps: %s" %
+                                                ', '.join(sorted(remaining)))
+
+            for name in level:
+                del remaining[name]
+            done.update(level)
+            levels.append(level)
+
+        self._levels = levels
+        return levels
+
+    def run(self, executor=None):
+        """Execute the pipeline and return the results of every step
+
+        Results are returned as a ``dict`` mapping step names to the result
+        ``dict`` of that step's ``Command``. ``executor`` defaults to a
+        ``SerialExecutor``.
+        """
+        if self._levels is None:
+            self.build()
+
+        if executor is None:
+            executor = SerialExecutor()
+        elif isinstance(executor, ProcessPoolExecutor):
+            self._validate_no_streams()
+
+        results = {}
+        waiting = dict([(name, self.Steps[name].getDependencies())
+                        for name in self._order])
+        running = []
+
+        while waiting or running:
+            for name in self._order:
+                if name in waiting and waiting[name] <= set(results):
+                    del waiting[name]
+                    running.append((name, self._submit(name, results,
+                                                       executor)))
+
+            finished = self._wait_any(running)
+            for name, async_result in finished:
+                running.remove((name, async_result))
+                results[name] = async_result.get()
+
+        return results
+
+    def _submit(self, name, results, executor):
+        step = self.Steps[name]
+        kwargs = dict(step.Inputs)
+
+        for in_name, (step_name, out_name) in step.Links.items():
+            kwargs[in_name] = results[step_name][out_name]
+
+        return executor.submit(step.Command, **kwargs)
+
+    def _wait_any(self, running):
+        """Wait until at least one of the ``running`` steps has finished
+
+        Executor results can't notify us when they are ready, so they are
+        polled, waiting briefly on the oldest in between.
+        """
+        while True:
+            finished = [(name, async_result)
+                        for name, async_result in running
+                        if async_result.ready()]
+            if finished:
+                return finished
+            running[0][1].wait(0.01)
+
+    def _validate_no_streams(self):
+        for name in self._order:
+            for cmd_out in self.Steps[name].Command.CommandOuts.values():
+                if cmd_out.Streaming:
+                    raise IncompetentDeveloperError("Pipeline step '%s' has "
+                            "streaming CommandOut %s, so the pipeline can't "
+                            "be run on a ProcessPoolExecutor: streams can't "
+                            "be sent between processes." % (name,
+                                                            cmd_out.Name))
+
+    def _validate_streams(self):
+        """Streaming ``CommandOuts`` can only be consumed by one step"""
+        consumers = {}
+        for step in self.Steps.values():
+            for source in step.Links.values():
+                consumers[source] = consumers.get(source, 0) + 1
+
+        for (step_name, out_name), count in consumers.items():
+            cmd_out = self.Steps[step_name].Command.CommandOuts[out_name]
+            if cmd_out.Streaming and count > 1:
+                raise IncompetentDeveloperError("Streaming CommandOut %s of "
+                                                "pipeline step '%s' can only "
+                                                "be linked once." %
+                                                (out_name, step_name))
+
+    def _validate_step(self, step):
+        cmd_ins = step.Command.CommandIns
+
+        for in_name in step.Inputs:
+            if in_name not in cmd_ins:
+                raise UnknownParameterError("Unknown CommandIn %s in pipeline "
+                                            "step '%s'" % (in_name, step.Name))
+
+        for in_name, (step_name, out_name) in step.Links.items():
+            if in_name not in cmd_ins:
+                raise UnknownParameterError("Unknown CommandIn %s in pipeline "
+                                            "step '%s'" % (in_name, step.Name))
+
+            if in_name in step.Inputs:
+                raise IncompetentDeveloperError("CommandIn %s in pipeline "
+                                                "step '%s' is both linked and "
+                                                "given a fixed value." %
+                                                (in_name, step.Name))
+
+            if step_name not in self.Steps:
+                raise IncompetentDeveloperError("Pipeline step '%s' links to "
+                                                "unknown step '%s'." %
+                                                (step.Name, step_name))
+
+            cmd_outs = self.Steps[step_name].Command.CommandOuts
+            if out_name not in cmd_outs:
+                raise UnknownParameterError("Unknown CommandOut %s in pipeline "
+                                            "step '%s'" % (out_name,
+                                                           step_name))
+
+            out_type = cmd_outs[out_name].DataType
+            in_type = cmd_ins[in_name].DataType
+            streaming = cmd_outs[out_name].Streaming
+            if not is_compatible_type(out_type, in_type, streaming):
+                raise IncompetentDeveloperError("Cannot link %sCommandOut %s "
+                        "(%r) of step '%s' to CommandIn %s (%r) of step '%s'."
+                        % ('streaming ' if streaming else '', out_name,
+                           out_type, step_name, in_name, in_type, step.Name))
+
+        for p in cmd_ins.values():
+            if p.Required and p.Name not in step.Inputs and \
+                    p.Name not in step.Links:
+                raise MissingParameterError("Missing required CommandIn %s "
+                                            "in pipeline step '%s'" %
+                                            (p.Name, step.Name))
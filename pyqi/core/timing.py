@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+"""Time the phases of an ``Interface`` call
+
+An ``Interface`` whose ``Timings`` is set calls its ``start`` and ``finish``
+methods around each phase of ``Interface.__call__``: 'in_validator',
+'input_handler', 'command', 'out_validator' and 'output_handler'.
+``PhaseTimings`` records the wall time, CPU time and peak memory increase of
+each.
+"""
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import os
+import sys
+from time import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def get_max_rss():
+    """Return the peak resident memory of this process so far, in KiB
+
+    Returns ``None`` where it isn't available.
+    """
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # reported in bytes on OS X and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        max_rss //= 1024
+    return max_rss
+
+def get_cpu_time():
+    """Return the user and system CPU time of this process, in seconds"""
+    # getrusage has a finer resolution than os.times' clock ticks
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+
+    times = os.times()
+    return times[0] + times[1]
+
+class PhaseTiming(object):
+    """The time and memory taken by one phase
+
+    ``Wall`` and ``CPU`` are in seconds. ``PeakRSSIncrease`` is how much the
+    process's peak memory use rose during the phase, in KiB (``None`` if
+    unavailable). It is 0 for a phase that fit in memory the process had
+    already used, however much that phase used itself.
+    """
+
+    def __init__(self, Phase, Wall, CPU, PeakRSSIncrease):
+        self.Phase = Phase
+        self.Wall = Wall
+        self.CPU = CPU
+        self.PeakRSSIncrease = PeakRSSIncrease
+
+class PhaseTimings(object):
+    """Record a ``PhaseTiming`` for each phase, in the order they finish
+
+    A phase that raises an exception is still recorded. An object is meant
+    for one call at a time; use one per thread.
+    """
+
+    def __init__(self):
+        self.Timings = []
+        self._started = {}
+
+    def start(self, phase):
+        self._started[phase] = (time(), get_cpu_time(), get_max_rss())
+
+    def finish(self, phase):
+        wall_start, cpu_start, max_rss_start = self._started.pop(phase)
+        max_rss = get_max_rss()
+        if max_rss is not None:
+            max_rss -= max_rss_start
+
+        self.Timings.append(PhaseTiming(phase, time() - wall_start,
+                                        get_cpu_time() - cpu_start, max_rss))
+
+    def clear(self):
+        self.Timings = []
+        self._started = {}
+
+    def format(self):
+        """Return the timings as a table"""
+        lines = ['%-16s %12s %12s %23s' % ('Phase', 'Wall (s)', 'CPU (s)',
+                                           'Peak RSS increase (KiB)')]
+        for t in self.Timings:
+            increase = 'n/a' if t.PeakRSSIncrease is None \
+                             else str(t.PeakRSSIncrease)
+            lines.append('%-16s %12.6f %12.6f %23s' % (t.Phase, t.Wall, t.CPU,
+                                                       increase))
+        return '\n'.join(lines)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+from pyqi.core.interfaces.optparse import (OptparseOption,
+                                           OptparseResult,
+                                           OptparseUsageExample)
+from pyqi.core.interfaces.optparse.output_handler import print_string
+from pyqi.core.command import (make_command_in_collection_lookup_f,
+                               make_command_out_collection_lookup_f)
+from pyqi.commands.serve_cli import CommandConstructor
+
+cmd_in_lookup = make_command_in_collection_lookup_f(CommandConstructor)
+cmd_out_lookup = make_command_out_collection_lookup_f(CommandConstructor)
+
+usage_examples = [
+    OptparseUsageExample(ShortDesc="Start a command server",
+                         LongDesc="Serve the pyqi commands on a Unix socket. "
+                                  "Then, in another shell, run "
+                                  "'export PYQI_DAEMON_SOCKET=/tmp/pyqi.sock' "
+                                  "so that pyqi commands are run by the "
+                                  "server",
+                         Ex='%prog -s /tmp/pyqi.sock')
+]
+
+inputs = [
+    OptparseOption(Parameter=cmd_in_lookup('socket_path'),
+                   ShortName='s'),
+
+    OptparseOption(Parameter=cmd_in_lookup('command_config_module'),
+                   ShortName='m')
+]
+
+outputs = [
+    OptparseResult(Parameter=cmd_out_lookup('result'),
+                   Handler=print_string)
+]
@@ -26,7 +26,13 @@ cmdout_lookup = make_command_out_collection_lookup_f(CommandConstructor)
 usage_examples = [
     OptparseUsageExample(ShortDesc="Start html interface",
                          LongDesc="Starts an html interface server on the specified --port and --interface-module",
-                         Ex='%prog -p 8080 -m pyqi.interfaces.html.config')
+                         Ex='%prog -p 8080 -m pyqi.interfaces.html.config'),
+    OptparseUsageExample(ShortDesc="Start a concurrent html interface",
+                         LongDesc="Handle requests on a pool of 8 worker "
+                                  "threads, so that slow commands don't "
+                                  "block other users",
+                         Ex='%prog -p 8080 -m pyqi.interfaces.html.config '
+                            '-s pool -w 8')
 ]
 
 inputs = [
@@ -36,7 +42,39 @@ inputs = [
 
     OptparseOption(Parameter=cmdin_lookup('interface_module'),
                    ShortName='m',
-                   Required=True)
+                   Required=True),
+
+    OptparseOption(Parameter=cmdin_lookup('server_mode'),
+                   ShortName='s'),
+
+    OptparseOption(Parameter=cmdin_lookup('workers'),
+                   ShortName='w',
+                   Type=int),
+
+    OptparseOption(Parameter=cmdin_lookup('max_queue_depth'),
+                   Type=int),
+
+    OptparseOption(Parameter=cmdin_lookup('jobs_dir')),
+
+    OptparseOption(Parameter=cmdin_lookup('job_workers'),
+                   Type=int),
+
+    OptparseOption(Parameter=cmdin_lookup('job_expiry'),
+                   Type=int),
+
+    OptparseOption(Parameter=cmdin_lookup('max_upload_size'),
+                   Type=int),
+
+    OptparseOption(Parameter=cmdin_lookup('upload_memory_threshold'),
+                   Type=int),
+
+    OptparseOption(Parameter=cmdin_lookup('upload_dir')),
+
+    OptparseOption(Parameter=cmdin_lookup('keep_alive_timeout'),
+                   Type=float),
+
+    OptparseOption(Parameter=cmdin_lookup('max_keep_alive_requests'),
+                   Type=int)
 ]
 
 outputs = [
@@ -9,6 +9,7 @@ from __future__ import division
 # The full license is in the file COPYING.txt, distributed with this software.
 #-----------------------------------------------------------------------------
 
+import os
 import sys
 from os import mkdir
 from os.path import dirname, join
@@ -64,7 +65,17 @@ class BashCompletionTests(TestCase):
 
         sys.path.append(self.temp_module_dir)
 
+        # keep the command manifest out of the user's home directory
+        self.saved_manifest_dir = os.environ.get('PYQI_MANIFEST_DIR')
+        os.environ['PYQI_MANIFEST_DIR'] = join(self.temp_module_dir,
+                                               'manifests')
+
     def tearDown(self):
+        if self.saved_manifest_dir is None:
+            del os.environ['PYQI_MANIFEST_DIR']
+        else:
+            os.environ['PYQI_MANIFEST_DIR'] = self.saved_manifest_dir
+
         sys.path.remove(self.temp_module_dir)
         rmtree(self.temp_module_dir)
 
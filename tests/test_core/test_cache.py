@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import sleep, time
+from unittest import TestCase, main
+from pyqi.core.cache import LRUCache, DiskCache, make_cache_key
+from pyqi.core.command import (Command, CommandIn, CommandOut,
+                               ParameterCollection)
+from pyqi.core.exception import IncompetentDeveloperError
+
+class Counter(Command):
+    Cacheable = True
+    CommandIns = ParameterCollection([
+        CommandIn('x', int, '', Required=True),
+        CommandIn('y', int, '', Default=1)])
+    CommandOuts = ParameterCollection([CommandOut('result', int, '')])
+
+    def __init__(self, **kwargs):
+        super(Counter, self).__init__(**kwargs)
+        self.Calls = 0
+
+    def run(self, **kwargs):
+        self.Calls += 1
+        return {'result': kwargs['x'] * kwargs['y']}
+
+class TopLevelTests(TestCase):
+    def test_make_cache_key(self):
+        """Keys depend on the command class and the kwargs"""
+        k1 = make_cache_key(Counter, {'x':1, 'y':2})
+        self.assertEqual(k1, make_cache_key(Counter, {'y':2, 'x':1}))
+        self.assertNotEqual(k1, make_cache_key(Counter, {'x':2, 'y':2}))
+        self.assertNotEqual(k1, make_cache_key(Command, {'x':1, 'y':2}))
+
+        # unpicklable kwargs cannot be cached
+        self.assertEqual(make_cache_key(Counter, {'x':lambda: None}), None)
+
+class LRUCacheTests(TestCase):
+    def test_get_set(self):
+        cache = LRUCache(max_size=2)
+        self.assertEqual(cache.get('a'), None)
+
+        cache.set('a', {'result':1})
+        cache.set('b', {'result':2})
+        self.assertEqual(cache.get('a'), {'result':1})
+
+        # 'b' is the least recently used
+        cache.set('c', {'result':3})
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), {'result':3})
+
+        self.assertEqual((cache.Hits, cache.Misses), (2, 2))
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.Hits, cache.Misses), (0, 0))
+
+    def test_copies(self):
+        """Nested values can't be modified through the cache"""
+        cache = LRUCache()
+        result = {'result':[1, {'a':2}]}
+        cache.set('a', result)
+        result['result'].append(3)
+
+        hit = cache.get('a')
+        hit['result'][1]['a'] = 42
+        self.assertEqual(cache.get('a'), {'result':[1, {'a':2}]})
+
+        # unpicklable results aren't cached
+        cache.set('b', {'result':lambda: None})
+        self.assertEqual(cache.get('b'), None)
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=-1)
+        cache.set('a', {'result':1})
+        self.assertEqual(cache.get('a'), None)
+
+    def test_invalid(self):
+        self.assertRaises(IncompetentDeveloperError, LRUCache, max_size=0)
+
+class DiskCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.cache_dir)
+
+    def test_get_set(self):
+        cache = DiskCache(self.cache_dir, max_size=2)
+        self.assertEqual(cache.get('a'), None)
+
+        cache.set('a', {'result':1})
+        cache.set('b', {'result':2})
+        os.utime(cache._get_path('a'), (0, 0))
+        cache.set('c', {'result':3})
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), {'result':2})
+
+        # shared through the file system
+        self.assertEqual(DiskCache(self.cache_dir).get('c'), {'result':3})
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl(self):
+        """Results expire however often they are read"""
+        cache = DiskCache(self.cache_dir, ttl=0.5)
+        cache.set('a', {'result':1})
+
+        start = time()
+        while time() - start < 0.3:
+            self.assertEqual(cache.get('a'), {'result':1})
+            sleep(0.05)
+
+        sleep(0.3)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(len(cache), 0)
+
+class CacheableCommandTests(TestCase):
+    def setUp(self):
+        Counter.ResultCache = LRUCache()
+
+    def tearDown(self):
+        Counter.ResultCache = None
+
+    def test_call(self):
+        """Cached results skip Command.run"""
+        cmd = Counter()
+        self.assertEqual(cmd(x=2, y=3), {'result':6})
+        self.assertEqual(cmd(x=2, y=3), {'result':6})
+        self.assertEqual(cmd.Calls, 1)
+
+        # defaults are applied before computing the key
+        self.assertEqual(cmd(x=2), {'result':2})
+        self.assertEqual(cmd(x=2, y=1), {'result':2})
+        self.assertEqual(cmd.Calls, 2)
+
+        # cached results cannot be modified by the caller
+        cmd(x=2)['result'] = 42
+        self.assertEqual(cmd(x=2), {'result':2})
+
+    def test_map(self):
+        cmd = Counter()
+        obs = list(cmd.map([{'x':1}, {'x':2}, {'x':1}]))
+        self.assertEqual(obs, [{'result':1}, {'result':2}, {'result':1}])
+        self.assertEqual(cmd.Calls, 2)
+        self.assertEqual(Counter.ResultCache.Hits, 1)
+
+if __name__ == '__main__':
+    main()
@@ -12,11 +12,17 @@ from __future__ import division
 __credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
                "Jai Ram Rideout"]
 
+import sys
+import json
+from StringIO import StringIO
 from unittest import TestCase, main
 from pyqi.core.command import CommandIn, CommandOut, ParameterCollection, Command
+from pyqi.core.future import Future
+from pyqi.core.log import JSONLinesLogger
 from pyqi.core.exception import (IncompetentDeveloperError, 
                                  UnknownParameterError, 
-                                 MissingParameterError)
+                                 MissingParameterError,
+                                 InvalidReturnTypeError)
 
 class CommandTests(TestCase):
     def setUp(self):
@@ -30,6 +36,16 @@ class CommandTests(TestCase):
                 return {}
         self.stubby = stubby
 
+        class summy(Command):
+            CommandIns = ParameterCollection([
+                            CommandIn('a',int,'', Required=True),
+                            CommandIn('b',int,'', Required=False, Default=5,
+                                      ValidateValue=lambda x: x > 0)])
+            CommandOuts = ParameterCollection([CommandOut('sum',int,'')])
+            def run(self, **kwargs):
+                return {'sum':kwargs['a'] + kwargs['b']}
+        self.summy = summy
+
     def test_init(self):
         """Jog the init"""
         c = Command()
@@ -77,6 +93,158 @@ class CommandTests(TestCase):
 
         self.assertEqual(kwargs, exp)
 
+    def test_validation_plan(self):
+        """The validation plan is built once per class and reused"""
+        stub = self.stubby()
+        plan = stub._get_validation_plan()
+
+        self.assertEqual(plan.Required, frozenset(['a']))
+        self.assertEqual(plan.Defaults, {'b':5, 'c':10})
+        self.assertEqual([name for name, _ in plan.Validators], ['c'])
+        self.assertTrue(self.stubby()._get_validation_plan() is plan)
+
+        # subclasses get their own plan
+        class stubby2(self.stubby):
+            CommandIns = ParameterCollection([CommandIn('d',int,'')])
+        self.assertEqual(stubby2._get_validation_plan().Known,
+                         frozenset(['d']))
+        self.assertTrue(self.stubby._get_validation_plan() is plan)
+
+    def test_map(self):
+        """Batch execution yields one result per kwargs dict"""
+        summy = self.summy()
+        kwargs = [{'a':1}, {'a':2, 'b':3}, {'a':3}]
+        obs = summy.map(kwargs)
+
+        self.assertFalse(isinstance(obs, list))
+        self.assertEqual(list(obs), [{'sum':6}, {'sum':5}, {'sum':8}])
+
+        # the caller's dicts are not modified
+        self.assertEqual(kwargs, [{'a':1}, {'a':2, 'b':3}, {'a':3}])
+
+        self.assertEqual(list(summy.map([])), [])
+
+    def test_map_validation(self):
+        """Every item is validated, including repeated key shapes"""
+        summy = self.summy()
+
+        with self.assertRaises(ValueError):
+            list(summy.map([{'a':1, 'b':1}, {'a':1, 'b':-1}]))
+        with self.assertRaises(MissingParameterError):
+            list(summy.map([{'a':1}, {'b':1}]))
+        with self.assertRaises(UnknownParameterError):
+            list(summy.map([{'a':1}, {'a':1, 'z':1}]))
+
+        class overridden(self.summy):
+            def _validate_kwargs(self, kwargs):
+                if kwargs['a'] == 42:
+                    raise ValueError("no 42s")
+        with self.assertRaises(ValueError):
+            list(overridden().map([{'a':1}, {'a':42}]))
+
+    def test_validate_result(self):
+        class outy(Command):
+            CommandOuts = ParameterCollection([CommandOut('x',int,''),
+                                               CommandOut('y',int,'')])
+        obj = outy()
+
+        obj._validate_result({'x':1, 'y':2})
+        self.assertRaises(UnknownParameterError, obj._validate_result,
+                          {'x':1})
+        self.assertRaises(UnknownParameterError, obj._validate_result,
+                          {'x':1, 'y':2, 'z':3})
+
+    def test_streaming_result(self):
+        """Streaming CommandOuts are passed through without being consumed"""
+        consumed = []
+        def stream(n):
+            for i in range(n):
+                consumed.append(i)
+                yield str(i)
+
+        class streamy(Command):
+            CommandIns = ParameterCollection([CommandIn('n',int,'')])
+            CommandOuts = ParameterCollection([
+                CommandOut('lines',str,'', Streaming=True)])
+            def run(self, **kwargs):
+                return {'lines':stream(kwargs['n'])}
+
+        obs = streamy()(n=3)
+        self.assertEqual(consumed, [])
+        self.assertEqual(list(obs['lines']), ['0', '1', '2'])
+
+        class notstreamy(streamy):
+            def run(self, **kwargs):
+                return {'lines':42}
+        self.assertRaises(InvalidReturnTypeError, notstreamy(), n=3)
+
+    def test_acall(self):
+        """Coroutine run methods are resumed as the futures they yield finish"""
+        waiting = []
+        class waity(Command):
+            CommandIns = ParameterCollection([CommandIn('a',int,'')])
+            CommandOuts = ParameterCollection([CommandOut('sum',int,'')])
+            def run(self, **kwargs):
+                future = Future()
+                waiting.append(future)
+                b = yield future
+                yield {'sum':kwargs['a'] + b}
+
+        future = waity().acall(a=1)
+        self.assertFalse(future.ready())
+        waiting[0].set_result(2)
+        self.assertEqual(future.get(0), {'sum':3})
+
+        # synchronous run methods and errors
+        self.assertEqual(self.summy().acall(a=1).get(0), {'sum':6})
+        future = self.summy().acall()
+        self.assertTrue(future.ready())
+        self.assertRaises(MissingParameterError, future.get)
+        self.assertRaises(ValueError, self.summy().acall(a=1, b=0).get)
+
+        # exceptions set on a future are raised inside the coroutine
+        future = waity().acall(a=1)
+        try:
+            raise ValueError('foo')
+        except ValueError:
+            waiting[1].set_exc_info(sys.exc_info())
+        self.assertRaises(ValueError, future.get)
+
+        # __call__ waits for coroutines
+        done = Future()
+        done.set_result(2)
+        waiting[:] = []
+        class ready(waity):
+            def run(self, **kwargs):
+                b = yield done
+                yield {'sum':kwargs['a'] + b}
+        self.assertEqual(ready()(a=1), {'sum':3})
+        self.assertEqual(list(ready().map([{'a':1}, {'a':2}])),
+                         [{'sum':3}, {'sum':4}])
+
+    def test_phase_logging(self):
+        """Phases are logged to loggers that time them"""
+        stream = StringIO()
+        cmd = self.summy()
+        cmd._logger = JSONLinesLogger(stream)
+        self.assertEqual(cmd(a=1, b=2), {'sum':3})
+
+        records = [json.loads(l) for l in stream.getvalue().splitlines()]
+        phases = [r for r in records if 'phase' in r]
+        self.assertEqual([r['phase'] for r in phases],
+                         ['validate', 'run', 'validate_result'])
+        for r in phases:
+            self.assertEqual(r['command'], '%s.summy' % __name__)
+            self.assertTrue(r['duration'] >= 0)
+        self.assertEqual([r['message'] for r in records if 'message' in r],
+                         ['Starting command: %s' % self.summy,
+                          'Completed command: %s' % self.summy])
+
+        # no phase is logged once validation fails
+        stream.truncate(0)
+        self.assertRaises(ValueError, cmd, a=1, b=0)
+        self.assertFalse('"phase"' in stream.getvalue())
+
 class ParameterTests(TestCase):
     def test_init(self):
         """Jog the init"""
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+from unittest import TestCase, main
+from pyqi.core.executor import (SerialExecutor, ThreadPoolExecutor,
+                                ProcessPoolExecutor, get_executor)
+from pyqi.core.exception import (IncompetentDeveloperError,
+                                 UnknownParameterError)
+from pyqi.commands.code_header_generator import CodeHeaderGenerator
+
+class ExecutorTests(TestCase):
+    def setUp(self):
+        self.cmd = CodeHeaderGenerator()
+        self.kwargs = [{'author':'Alice'}, {'author':'Bob'},
+                       {'author':'Carol', 'version':'1.0'}]
+        self.exp = [self.cmd(**kw) for kw in self.kwargs]
+
+    def check_executor(self, executor):
+        with executor:
+            obs = executor.submit(self.cmd, **self.kwargs[0])
+            self.assertEqual(obs.get(), self.exp[0])
+            self.assertTrue(obs.successful())
+
+            obs = executor.submit(self.cmd, foo='bar')
+            self.assertRaises(UnknownParameterError, obs.get)
+
+            self.assertEqual(list(executor.map(self.cmd, self.kwargs)),
+                             self.exp)
+            self.assertEqual(list(executor.map(self.cmd, self.kwargs,
+                                               chunksize=2)), self.exp)
+            self.assertEqual(list(executor.map(self.cmd, [])), [])
+
+    def test_serial(self):
+        self.check_executor(SerialExecutor())
+
+    def test_thread_pool(self):
+        self.check_executor(ThreadPoolExecutor(2))
+
+    def test_process_pool(self):
+        self.check_executor(ProcessPoolExecutor(2))
+
+    def test_invalid(self):
+        self.assertRaises(IncompetentDeveloperError, ThreadPoolExecutor, 0)
+        with ThreadPoolExecutor(1) as executor:
+            self.assertRaises(IncompetentDeveloperError, executor.map,
+                              self.cmd, self.kwargs, chunksize=0)
+
+    def test_get_executor(self):
+        self.assertTrue(isinstance(get_executor('serial'), SerialExecutor))
+
+        executor = get_executor('thread', 1)
+        self.assertTrue(isinstance(executor, ThreadPoolExecutor))
+        executor.close()
+
+        self.assertRaises(IncompetentDeveloperError, get_executor, 'foo')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import sys
+from threading import Timer
+from unittest import TestCase, main
+from pyqi.core.future import Future, run_coroutine
+
+def failed(exception):
+    future = Future()
+    try:
+        raise exception
+    except Exception:
+        future.set_exc_info(sys.exc_info())
+    return future
+
+class FutureTests(TestCase):
+    def test_result(self):
+        future = Future()
+        called = []
+        future.add_done_callback(called.append)
+        self.assertFalse(future.ready())
+        self.assertRaises(RuntimeError, future.get, 0)
+
+        future.set_result(42)
+        self.assertEqual(called, [future])
+        self.assertTrue(future.successful())
+        self.assertEqual(future.get(), 42)
+        self.assertRaises(RuntimeError, future.set_result, 43)
+
+        # callbacks added later are called immediately
+        future.add_done_callback(called.append)
+        self.assertEqual(called, [future, future])
+
+    def test_exception(self):
+        future = failed(ValueError('foo'))
+        self.assertTrue(future.ready())
+        self.assertFalse(future.successful())
+        self.assertRaises(ValueError, future.get)
+
+    def test_get_waits(self):
+        future = Future()
+        Timer(0.01, future.set_result, [42]).start()
+        self.assertEqual(future.get(5), 42)
+
+class RunCoroutineTests(TestCase):
+    def test_run_coroutine(self):
+        pending = Future()
+        closed = []
+
+        def coroutine():
+            try:
+                a = yield pending
+                try:
+                    yield failed(ValueError('foo'))
+                except ValueError:
+                    pass
+                for i in range(10000):
+                    done = Future()
+                    done.set_result(i)
+                    a += yield done
+                yield a
+            finally:
+                closed.append(True)
+
+        future = run_coroutine(coroutine())
+        self.assertFalse(future.ready())
+
+        pending.set_result(1)
+        self.assertEqual(future.get(0), 1 + sum(range(10000)))
+        self.assertEqual(closed, [True])
+
+    def test_errors(self):
+        def coroutine():
+            yield failed(ValueError('foo'))
+        self.assertRaises(ValueError, run_coroutine(coroutine()).get, 0)
+
+        def empty():
+            return
+            yield
+        self.assertEqual(run_coroutine(empty()).get(0), None)
+
+if __name__ == '__main__':
+    main()
@@ -12,15 +12,23 @@ from __future__ import division
 __credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
                "Jai Ram Rideout"]
 
+import os
+import sys
+import json
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
 from unittest import TestCase, main
-from pyqi.core.interface import get_command_names, get_command_config
+import pyqi.core.interface
+from pyqi.core.interface import (get_command_names, get_command_config,
+                                 CommandList)
 import pyqi.interfaces.optparse.config.make_bash_completion
 
 class TopLevelTests(TestCase):
     def test_get_command_names(self):
         """Test that command names are returned from a config directory."""
         exp = ['make-bash-completion', 'make-command', 'make-optparse', 
-               'make-release', 'serve-html-interface']
+               'make-release', 'serve-cli', 'serve-html-interface']
         obs = get_command_names('pyqi.interfaces.optparse.config')
         self.assertEqual(obs, exp)
 
@@ -43,6 +51,116 @@ class TopLevelTests(TestCase):
         self.assertEqual(error_msg, 'No module named hopefully.nonexistent.'
                                     'python.module.umm')
 
+class CommandDiscoveryTests(TestCase):
+    def setUp(self):
+        self.temp_dir = mkdtemp()
+        self.config_dir = join(self.temp_dir, 'pyqi_discovery_test')
+        os.mkdir(self.config_dir)
+        self.write_file('__init__.py', '')
+        self.write_file('foo.py', '')
+        sys.path.append(self.temp_dir)
+
+        self.saved_get_entry_points = pyqi.core.interface._get_entry_points
+
+        # keep the command names index out of the user's home directory
+        self.saved_manifest_dir = os.environ.get('PYQI_MANIFEST_DIR')
+        os.environ['PYQI_MANIFEST_DIR'] = join(self.temp_dir, 'manifests')
+
+    def tearDown(self):
+        pyqi.core.interface._get_entry_points = self.saved_get_entry_points
+        if self.saved_manifest_dir is None:
+            del os.environ['PYQI_MANIFEST_DIR']
+        else:
+            os.environ['PYQI_MANIFEST_DIR'] = self.saved_manifest_dir
+        sys.path.remove(self.temp_dir)
+        for name in sys.modules.keys():
+            if name.startswith('pyqi_discovery_test'):
+                del sys.modules[name]
+        rmtree(self.temp_dir)
+
+    def write_file(self, name, contents):
+        with open(join(self.config_dir, name), 'w') as f:
+            f.write(contents)
+
+    def test_index(self):
+        """Names found in the config dir are saved for other processes"""
+        self.assertEqual(get_command_names('pyqi_discovery_test'), ['foo'])
+        index_fp = pyqi.core.interface._get_command_names_index_path(
+                'pyqi_discovery_test')
+        self.assertTrue(index_fp.startswith(self.temp_dir))
+
+        # a new process reads the index instead of scanning the directory
+        pyqi.core.interface._command_names_cache.clear()
+        with open(index_fp) as f:
+            index = json.load(f)
+        index['names'].append('from_index')
+        with open(index_fp, 'w') as f:
+            json.dump(index, f)
+        self.assertEqual(get_command_names('pyqi_discovery_test'),
+                         ['foo', 'from-index'])
+
+        # but not once the directory has changed
+        pyqi.core.interface._command_names_cache.clear()
+        os.utime(self.config_dir, (0, 0))
+        self.assertEqual(get_command_names('pyqi_discovery_test'), ['foo'])
+
+    def test_cache_invalidation(self):
+        """New config files are found once the directory changes"""
+        self.assertEqual(get_command_names('pyqi_discovery_test'), ['foo'])
+
+        self.write_file('bar_baz.py', '')
+        os.utime(self.config_dir, (0, 0))
+        self.assertEqual(get_command_names('pyqi_discovery_test'),
+                         ['bar-baz', 'foo'])
+
+    def test_entry_points(self):
+        """Commands can be registered through entry points"""
+        self.write_file('__init__.py', 'entry_point_group = "pyqi.test"\n')
+        os.utime(self.config_dir, (1, 1))
+        pyqi.core.interface._get_entry_points = lambda group: \
+                [('ep-cmd', 'pyqi.interfaces.optparse.config.make_command')]
+
+        obs = get_command_names('pyqi_discovery_test')
+        self.assertEqual(obs, ['ep-cmd', 'foo'])
+
+        cmd_cfg, _ = get_command_config('pyqi_discovery_test', 'ep_cmd')
+        self.assertEqual(cmd_cfg.__name__,
+                         'pyqi.interfaces.optparse.config.make_command')
+
+class CommandListTests(TestCase):
+    def test_contains(self):
+        obs = CommandList(['foo_bar', 'baz'])
+        self.assertEqual(obs, ['foo-bar', 'baz'])
+        self.assertTrue('foo-bar' in obs)
+        self.assertTrue('foo_bar' in obs)
+        self.assertFalse('foo' in obs)
+
+        obs.append('new_cmd')
+        self.assertTrue('new-cmd' in obs)
+
+    def test_mutation(self):
+        """Every way of changing the list keeps lookups in sync"""
+        obs = CommandList(['a', 'b', 'c'])
+        obs.remove('b')
+        self.assertFalse('b' in obs)
+        obs.pop()
+        self.assertFalse('c' in obs)
+        obs.insert(0, 'd_e')
+        self.assertTrue('d-e' in obs)
+        obs[0] = 'f'
+        self.assertFalse('d-e' in obs)
+        self.assertTrue('f' in obs)
+        obs += ['g_h']
+        self.assertTrue('g-h' in obs)
+        obs[1:] = ['i']
+        self.assertEqual(obs, ['f', 'i'])
+        self.assertFalse('a' in obs)
+        self.assertTrue('i' in obs)
+        del obs[0]
+        self.assertFalse('f' in obs)
+        del obs[:]
+        self.assertFalse('i' in obs)
+        self.assertTrue(isinstance(obs, CommandList))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+import json
+from unittest import TestCase, main
+from pyqi.core.command import CommandIn, CommandOut, ParameterCollection
+from pyqi.core.interfaces.html.api import (coerce_value, get_command_kwargs,
+                                           dump_result)
+
+class APITests(TestCase):
+    def setUp(self):
+        self.command_ins = ParameterCollection([
+            CommandIn('a', str, 'a', Required=True),
+            CommandIn('b', int, 'b', Default=1,
+                      ValidateValue=lambda x: x > 0),
+            CommandIn('c', list, 'c')])
+
+    def test_coerce_value(self):
+        self.assertEqual(coerce_value(u'foo', str), 'foo')
+        self.assertTrue(type(coerce_value(u'foo', str)) is str)
+        self.assertEqual(coerce_value(2, float), 2.0)
+        self.assertEqual(coerce_value(2.0, int), 2)
+        self.assertEqual(coerce_value([1, 2], tuple), (1, 2))
+        self.assertEqual(coerce_value(True, bool), True)
+        self.assertEqual(coerce_value(None, int), None)
+
+        self.assertRaises(TypeError, coerce_value, 'false', bool)
+        self.assertRaises(TypeError, coerce_value, 'ab', list)
+        self.assertRaises(ValueError, coerce_value, 2.5, int)
+        self.assertRaises(ValueError, coerce_value, 'x', int)
+
+        # request data isn't passed to arbitrary constructors
+        self.assertRaises(TypeError, coerce_value, 'x', Exception)
+        self.assertRaises(TypeError, coerce_value, 'x', 'biom')
+        self.assertEqual(coerce_value({u'a': 1}, dict), {u'a': 1})
+        self.assertEqual(coerce_value(u'x', object), u'x')
+
+    def test_get_command_kwargs(self):
+        self.assertEqual(get_command_kwargs(self.command_ins,
+                                            {u'a': u'x', u'b': None,
+                                             u'c': [1]}),
+                         ({'a': 'x', 'c': [1]}, []))
+
+        kwargs, errors = get_command_kwargs(self.command_ins,
+                                            {u'b': u'x', u'd': 1})
+        self.assertEqual(sorted(errors),
+                         ["Error: a is required.",
+                          "Error: b must be type <type 'int'>",
+                          "Error: unknown parameter d."])
+
+        # ValidateValue is checked before the command is called
+        self.assertEqual(get_command_kwargs(self.command_ins,
+                                            {u'a': u'x', u'b': 0}),
+                         ({'a': 'x'}, ["Error: b cannot take value 0."]))
+
+        self.assertEqual(get_command_kwargs(self.command_ins, []),
+                         ({}, ["Error: the request body must be a JSON "
+                               "object."]))
+
+    def test_dump_result(self):
+        command_outs = ParameterCollection([
+            CommandOut('a', int, 'a', Streaming=True),
+            CommandOut('b', str, 'b')])
+        obs = dump_result(command_outs, {'a': iter([1, 2]), 'b': 'foo'})
+        self.assertEqual(json.loads(obs), {'a': [1, 2], 'b': 'foo'})
+
+        self.assertRaises(TypeError, dump_result, command_outs,
+                          {'b': object()})
+        self.assertRaises(TypeError, dump_result, command_outs,
+                          {'b': '\xff'})
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,552 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+import json
+import urllib2
+from gzip import GzipFile
+from StringIO import StringIO
+from BaseHTTPServer import BaseHTTPRequestHandler
+from cgi import MiniFieldStorage, FieldStorage
+from shutil import rmtree
+from httplib import HTTPConnection
+from tempfile import mkdtemp, NamedTemporaryFile
+from threading import Event, Thread
+from time import sleep
+from urllib import urlencode
+from unittest import TestCase, main
+import pyqi.core.interfaces.html
+from pyqi.core.interfaces.html import (WorkerPoolHTTPServer,
+                                       ThreadingHTTPServer, start_server,
+                                       HTMLInterfaceRegistry, get_http_handler,
+                                       get_router, html_interface_factory,
+                                       HTMLInputOption, HTMLPage)
+from pyqi.core.command import (Command, CommandIn, CommandOut,
+                               ParameterCollection)
+from pyqi.core.interfaces.html.jobs import JobQueue
+from pyqi.core.exception import IncompetentDeveloperError
+
+class BlockingHandler(BaseHTTPRequestHandler):
+    """/slow blocks until the server's release event is set"""
+    def do_GET(self):
+        if self.path == '/slow':
+            self.server.started.set()
+            self.server.release.wait(5)
+
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(self.path)
+
+    def log_message(self, *args):
+        pass
+
+def get(url, data=None):
+    try:
+        return urllib2.urlopen(url, data, timeout=5).read()
+    except urllib2.HTTPError, e:
+        e.read()
+        return e.code
+
+class ConcurrentServerTests(TestCase):
+    def start(self, server):
+        server.started = Event()
+        server.release = Event()
+        self.server = server
+        self.url = 'http://localhost:%d' % server.server_address[1]
+
+        t = Thread(target=server.serve_forever)
+        t.daemon = True
+        t.start()
+
+    def tearDown(self):
+        self.server.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_in_background(self, path, results):
+        t = Thread(target=lambda: results.append(get(self.url + path)))
+        t.start()
+        return t
+
+    def check_not_blocked(self):
+        """A slow request doesn't block other requests"""
+        results = []
+        slow = self.get_in_background('/slow', results)
+        self.server.started.wait(5)
+
+        self.assertEqual(get(self.url + '/fast'), '/fast')
+        self.assertEqual(results, [])
+
+        self.server.release.set()
+        slow.join()
+        self.assertEqual(results, ['/slow'])
+
+    def test_threading(self):
+        self.start(ThreadingHTTPServer(('localhost', 0), BlockingHandler))
+        self.check_not_blocked()
+
+    def test_worker_pool(self):
+        self.start(WorkerPoolHTTPServer(('localhost', 0), BlockingHandler,
+                                        workers=2))
+        self.check_not_blocked()
+
+    def test_worker_pool_full(self):
+        """Requests beyond the queue depth are rejected with a 503"""
+        self.start(WorkerPoolHTTPServer(('localhost', 0), BlockingHandler,
+                                        workers=1, max_queue_depth=1))
+
+        results = []
+        slow = self.get_in_background('/slow', results)
+        self.server.started.wait(5)
+        queued = self.get_in_background('/queued', results)
+
+        while self.server.requests.empty():
+            self.server.release.wait(0.01)
+        self.assertEqual(get(self.url + '/rejected'), 503)
+
+        self.server.release.set()
+        slow.join()
+        queued.join()
+        self.assertEqual(sorted(results), ['/queued', '/slow'])
+
+class HTMLInterfaceRegistryTests(TestCase):
+    def setUp(self):
+        self.registry = HTMLInterfaceRegistry('pyqi.interfaces.html.config')
+
+    def test_get(self):
+        """Interfaces are built once and reused"""
+        obs = self.registry.get('make-command')
+        self.assertEqual(obs.CommandName, 'make-command')
+        self.assertTrue(self.registry.get('make-command') is obs)
+
+    def test_reserved_names(self):
+        """Commands can't be named after the interface's own routes"""
+        saved = pyqi.core.interfaces.html.get_command_names
+        pyqi.core.interfaces.html.get_command_names = \
+                lambda module: ['make-command', 'metrics', 'api']
+        try:
+            self.assertRaises(IncompetentDeveloperError, HTMLInterfaceRegistry,
+                              'pyqi.interfaces.html.config')
+            self.assertRaises(IncompetentDeveloperError, self.registry.reload)
+        finally:
+            pyqi.core.interfaces.html.get_command_names = saved
+
+    def test_preload(self):
+        self.registry.preload()
+        self.assertEqual(sorted(self.registry._interfaces),
+                         self.registry.CommandNames)
+
+    def test_reload(self):
+        """Interfaces are rebuilt from re-imported modules after a reload"""
+        first = self.registry.get('make-command')
+        self.registry.reload()
+        second = self.registry.get('make-command')
+
+        self.assertFalse(first is second)
+        self.assertFalse(first.CommandConstructor is
+                         second.CommandConstructor)
+
+    def test_request_reload(self):
+        """Requested reloads only happen in reload_if_requested"""
+        first = self.registry.get('make-command')
+
+        # as a signal handler would, while the lock is held
+        with self.registry._lock:
+            self.registry.request_reload()
+        self.assertTrue(self.registry.get('make-command') is first)
+
+        self.registry.reload_if_requested()
+        second = self.registry.get('make-command')
+        self.assertFalse(second is first)
+
+        self.registry.reload_if_requested()
+        self.assertTrue(self.registry.get('make-command') is second)
+
+class HTMLInterfaceTests(TestCase):
+    def setUp(self):
+        self.registry = HTMLInterfaceRegistry('pyqi.interfaces.html.config')
+
+    def test_request_input_per_thread(self):
+        """Form input of a request is not visible to other threads"""
+        cmd_obj = self.registry.get('make-command')
+        cmd_obj._html_interface_input = {'download-file': 'foo'}
+
+        results = []
+        t = Thread(target=lambda: results.append(
+                cmd_obj._html_interface_input))
+        t.start()
+        t.join()
+
+        self.assertEqual(results, [{}])
+        self.assertEqual(cmd_obj._html_interface_input,
+                         {'download-file': 'foo'})
+
+    def test_render_command_page(self):
+        """Errors and submitted values are filled into the form template"""
+        cmd_obj = self.registry.get('make-command')
+        blank = cmd_obj.render_command_page([], {})
+        self.assertEqual(cmd_obj.render_command_page([], {}), blank)
+        self.assertTrue(blank.startswith('<!DOCTYPE html>'))
+        self.assertTrue(blank.endswith('</html>'))
+        self.assertFalse('class="error"' in blank)
+        self.assertTrue('<input type="text" name="pyqi_name" value=""/>'
+                        in blank)
+        self.assertTrue('value="False" checked="true"/>' in blank)
+
+        postvars = {'pyqi_name': MiniFieldStorage('pyqi_name', 'foo'),
+                    'pyqi_test-code': MiniFieldStorage('pyqi_test-code',
+                                                       'True')}
+        obs = cmd_obj.render_command_page(['Error: bar'], postvars)
+        self.assertTrue('<div class="error">Error: bar</div>' in obs)
+        self.assertTrue('<input type="text" name="pyqi_name" value="foo"/>'
+                        in obs)
+        self.assertTrue('value="True" checked="true"/>' in obs)
+        self.assertFalse('value="False" checked="true"/>' in obs)
+
+        # the template isn't changed by a request's values
+        self.assertEqual(cmd_obj.render_command_page([], {}), blank)
+
+        written = []
+        cmd_obj.command_page_writer(written.append, [], {})
+        self.assertEqual(written, [blank])
+
+    def test_render_command_page_query(self):
+        """Query string defaults are escaped, and bad ones ignored"""
+        def query(qs):
+            return FieldStorage(environ={'REQUEST_METHOD':'GET',
+                                         'QUERY_STRING':qs})
+
+        cmd_obj = self.registry.get('make-command')
+        obs = cmd_obj.render_command_page([], query(
+                'pyqi_name=%22%2F%3E%3Cscript%3E'))
+        self.assertFalse('<script>' in obs)
+        self.assertTrue('value="&quot;/&gt;&lt;script&gt;"/>' in obs)
+
+        # repeated keys use the first value
+        obs = cmd_obj.render_command_page([], query(
+                'pyqi_name=foo&pyqi_name=bar'))
+        self.assertTrue('<input type="text" name="pyqi_name" value="foo"/>'
+                        in obs)
+
+        class Adder(Command):
+            CommandIns = ParameterCollection([CommandIn('x', int, 'x')])
+            CommandOuts = ParameterCollection([CommandOut('y', int, 'y')])
+            def run(self, **kwargs):
+                return {'y': kwargs['x'] + 1}
+
+        interface = html_interface_factory(Adder, [],
+                [HTMLInputOption(Parameter=Adder.CommandIns['x'], Type=int)],
+                [HTMLPage(Parameter=Adder.CommandOuts['y'])], '0.1',
+                'adder')()
+        blank = interface.render_command_page([], {})
+        self.assertEqual(interface.render_command_page([], query('pyqi_x=abc')),
+                         blank)
+        self.assertTrue('name="pyqi_x" value="42"/>' in
+                        interface.render_command_page([], query('pyqi_x=42')))
+
+class ServerTestCase(TestCase):
+    """Base class for tests that make requests to a running server"""
+
+    def setUp(self):
+        self.registry = HTMLInterfaceRegistry('pyqi.interfaces.html.config')
+
+    def start_server(self, handler):
+        class QuietHandler(handler):
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('localhost', 0), QuietHandler)
+        t = Thread(target=server.serve_forever)
+        t.daemon = True
+        t.start()
+        return server, 'http://localhost:%d' % server.server_address[1]
+
+class HTTPHandlerTests(ServerTestCase):
+    def test_registry(self):
+        """The request handler takes interfaces from the registry"""
+        handler = get_http_handler('pyqi.interfaces.html.config',
+                                   self.registry)
+        self.assertTrue(handler.Registry is self.registry)
+        server, url = self.start_server(handler)
+
+        try:
+            self.assertTrue('<form' in get(url + '/make-command'))
+            self.assertTrue('value="foo"' in
+                            get(url + '/make-command?pyqi_name=foo'))
+            self.assertEqual(get(url + '/not-a-command'), 404)
+
+            self.assertEqual(get(url + '/help', ''), 405)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(self.registry._interfaces.keys(), ['make-command'])
+
+    def test_upload_limits(self):
+        """Request bodies over the maximum upload size are refused"""
+        handler = get_http_handler('pyqi.interfaces.html.config',
+                                   self.registry, max_upload_size=10)
+        server, url = self.start_server(handler)
+
+        try:
+            self.assertEqual(get(url + '/make-command', 'x' * 11), 413)
+            self.assertEqual(get(url + '/make-command', 'pyqi_name='), 400)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class CachingTests(ServerTestCase):
+    def test_static_pages(self):
+        """Static pages are compressed and can be revalidated"""
+        handler = get_http_handler('pyqi.interfaces.html.config',
+                                   self.registry)
+        server, url = self.start_server(handler)
+        port = server.server_address[1]
+
+        def request(path, headers={}):
+            conn = HTTPConnection('localhost', port)
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            return response, response.read()
+
+        try:
+            response, body = request('/static/style.css')
+            self.assertEqual(response.getheader('content-type'), 'text/css')
+            self.assertEqual(response.getheader('cache-control'),
+                             'public, max-age=86400')
+            self.assertTrue('font-family' in body)
+
+            response, body = request('/make-command',
+                                     {'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.getheader('content-encoding'), 'gzip')
+            page = GzipFile(fileobj=StringIO(body)).read()
+            self.assertTrue('href="/static/style.css"' in page)
+            self.assertFalse('font-family' in page)
+
+            etag = response.getheader('etag')
+            response, body = request('/make-command',
+                                     {'Accept-Encoding': 'gzip',
+                                      'If-None-Match': etag})
+            self.assertEqual(response.status, 304)
+            self.assertEqual(body, '')
+
+            # the uncompressed page is a different representation
+            response, body = request('/make-command', {'If-None-Match': etag})
+            self.assertEqual(response.status, 200)
+            self.assertEqual(body, page)
+
+            response, body = request('/')
+            last_modified = response.getheader('last-modified')
+            response, body = request('/',
+                                     {'If-Modified-Since': last_modified})
+            self.assertEqual(response.status, 304)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class StreamingTests(ServerTestCase):
+    def test_results(self):
+        """Results are sent chunked unless their length is known"""
+        data_file = NamedTemporaryFile()
+        data_file.write('x' * 100000)
+        data_file.flush()
+
+        class StreamingHandler(get_http_handler('pyqi.interfaces.html.config',
+                                                self.registry)):
+            Router = get_router()
+            Router.add('GET', '/stream/<kind>', 'stream_route')
+
+            def stream_route(self, kind):
+                if kind == 'iter':
+                    self.send_contents(iter(['a', 'b']), 'text/plain')
+                else:
+                    self.send_result(None, {'type': 'download',
+                                            'filename': 'foo',
+                                            'path': data_file.name}, None)
+
+        server, url = self.start_server(StreamingHandler)
+
+        try:
+            conn = HTTPConnection('localhost', server.server_address[1])
+            conn.request('GET', '/stream/iter')
+            response = conn.getresponse()
+            self.assertEqual(response.getheader('transfer-encoding'),
+                             'chunked')
+            self.assertEqual(response.read(), 'ab')
+
+            conn = HTTPConnection('localhost', server.server_address[1])
+            conn.request('GET', '/stream/path')
+            response = conn.getresponse()
+            self.assertEqual(response.getheader('content-length'), '100000')
+            self.assertEqual(response.getheader('content-disposition'),
+                             'attachment; filename=foo')
+            self.assertEqual(response.read(), 'x' * 100000)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class JobTests(ServerTestCase):
+    def test_submit(self):
+        """Commands can be submitted as jobs and their results fetched"""
+        jobs_dir = mkdtemp()
+        handler = get_http_handler('pyqi.interfaces.html.config',
+                                   self.registry, JobQueue(jobs_dir))
+        server, url = self.start_server(handler)
+
+        try:
+            data = urlencode({'pyqi_name': 'foo', 'pyqi_author': 'bar',
+                              'pyqi_email': 'baz', 'pyqi_license': 'BSD',
+                              'pyqi_copyright': '2013',
+                              'pyqi_command-version': '0.1',
+                              'pyqi_download-file': 'foo'})
+            job = json.loads(get(url + '/make-command/jobs', data))
+            self.assertEqual(job['command'], 'make-command')
+
+            job_url = url + '/jobs/' + job['job_id']
+            for i in range(500):
+                status = json.loads(get(job_url))
+                if status['status'] == 'completed':
+                    break
+                sleep(0.01)
+
+            self.assertTrue('__author__ = "bar"' in get(job_url + '/result'))
+            self.assertEqual(json.loads(get(job_url + '/cancel', ''))['status'],
+                             'completed')
+            self.assertEqual(get(url + '/jobs/' + 'f' * 32), 404)
+            self.assertEqual(get(url + '/not-a-command/jobs', ''), 404)
+        finally:
+            server.shutdown()
+            server.server_close()
+            rmtree(jobs_dir)
+
+class APITests(ServerTestCase):
+    def test_run(self):
+        """Commands can be run with JSON input and output"""
+        handler = get_http_handler('pyqi.interfaces.html.config',
+                                   self.registry)
+        server, url = self.start_server(handler)
+
+        try:
+            data = {'name': 'foo', 'author': 'bar', 'email': 'baz',
+                    'license': 'BSD', 'copyright': '2013', 'version': '0.1',
+                    'credits': ['qux'], 'test_code': False}
+            obs = json.loads(get(url + '/api/make-command', json.dumps(data)))
+            self.assertEqual(obs.keys(), ['result'])
+            self.assertTrue('__author__ = "bar"' in obs['result'])
+            self.assertTrue('__credits__ = ["bar", "qux"]' in obs['result'])
+
+            data['test_code'] = 'no'
+            self.assertEqual(get(url + '/api/make-command', json.dumps(data)),
+                             400)
+            self.assertEqual(get(url + '/api/make-command', '{'), 400)
+            self.assertEqual(get(url + '/api/not-a-command', '{}'), 404)
+            self.assertEqual(get(url + '/api/make-command'), 405)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class KeepAliveTests(ServerTestCase):
+    def test_request_cap(self):
+        """Requests are served on one connection up to the request cap"""
+        handler = get_http_handler('pyqi.interfaces.html.config',
+                                   self.registry, max_upload_size=10,
+                                   max_keep_alive_requests=4)
+        server, url = self.start_server(handler)
+
+        try:
+            conn = HTTPConnection('localhost', server.server_address[1])
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            self.assertEqual(response.version, 11)
+            self.assertEqual(response.getheader('connection'), None)
+            response.read()
+            sock = conn.sock
+
+            # an unread body doesn't get in the way of the next request
+            conn.request('POST', '/not-a-command', 'foo')
+            response = conn.getresponse()
+            self.assertEqual(response.status, 404)
+            response.read()
+
+            conn.request('GET', '/make-command')
+            response = conn.getresponse()
+            self.assertEqual(response.status, 200)
+            response.read()
+            self.assertTrue(conn.sock is sock)
+
+            conn.request('GET', '/help')
+            response = conn.getresponse()
+            self.assertEqual(response.getheader('connection'), 'close')
+            response.read()
+            self.assertEqual(conn.sock, None)
+
+            # bodies too large to read close the connection
+            conn.request('POST', '/make-command', 'x' * 11)
+            response = conn.getresponse()
+            self.assertEqual(response.status, 413)
+            self.assertEqual(response.getheader('connection'), 'close')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_timeout(self):
+        """Idle connections are closed"""
+        handler = get_http_handler('pyqi.interfaces.html.config',
+                                   self.registry, keep_alive_timeout=0.1)
+        server, url = self.start_server(handler)
+
+        try:
+            conn = HTTPConnection('localhost', server.server_address[1])
+            conn.request('GET', '/help')
+            conn.getresponse().read()
+
+            conn.sock.settimeout(5)
+            self.assertEqual(conn.sock.recv(1), '')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class MetricsTests(ServerTestCase):
+    def test_requests(self):
+        """Requests are counted by route and command"""
+        handler = get_http_handler('pyqi.interfaces.html.config',
+                                   self.registry)
+        server, url = self.start_server(handler)
+
+        try:
+            get(url + '/make-command')
+            get(url + '/make-command', 'pyqi_name=foo')
+            get(url + '/not-a-command')
+
+            obs = get(url + '/metrics').splitlines()
+            self.assertTrue('pyqi_http_requests_total{route="command_route",'
+                            'command="make-command",code="200"} 1' in obs)
+            self.assertTrue('pyqi_http_requests_total{route="post_route",'
+                            'command="make-command",code="400"} 1' in obs)
+            self.assertTrue('pyqi_http_request_errors_total{route='
+                            '"command_route",command=""} 1' in obs)
+            self.assertTrue('pyqi_http_request_bytes_total{route="post_route",'
+                            'command="make-command"} 13' in obs)
+            self.assertTrue('pyqi_http_requests_in_flight{route='
+                            '"metrics_route",command=""} 1' in obs)
+            self.assertTrue('pyqi_jobs_queued 0' in obs)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+class StartServerTests(TestCase):
+    def test_invalid_mode(self):
+        self.assertRaises(IncompetentDeveloperError, start_server, 0,
+                          'pyqi.interfaces.html.config', server_mode='foo')
+
+if __name__ == '__main__':
+    main()
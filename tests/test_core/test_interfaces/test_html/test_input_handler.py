@@ -11,10 +11,12 @@
 __credits__ = ["Evan Bolyen"]
 
 from StringIO import StringIO
+from tempfile import NamedTemporaryFile
 from unittest import TestCase, main
 from pyqi.core.exception import IncompetentDeveloperError
 from pyqi.core.interfaces.html.input_handler import (load_file_lines,
-        load_file_contents)
+        load_file_contents, upload_file_path, upload_file_mmap)
+from pyqi.core.interfaces.html.upload import SpooledUpload
 
 class HTMLInputHandlerTests(TestCase):
     def setUp(self):
@@ -48,5 +50,30 @@ class HTMLInputHandlerTests(TestCase):
         #Note the whitespace
         self.assertEqual(result, "This is line 1\n This is line 2\nThis is line 3 \n")
 
+    def test_upload_file_path(self):
+        """Uploads are moved to disk to get a path"""
+        self.assertRaises(IncompetentDeveloperError, upload_file_path,
+                          'This is not a file')
+        self.assertRaises(IncompetentDeveloperError, upload_file_path,
+                          self.file_like_object)
+
+        upload = SpooledUpload(1024)
+        upload.write("This is line 1\n")
+        path = upload_file_path(upload)
+        self.assertEqual(open(path).read(), "This is line 1\n")
+
+        f = NamedTemporaryFile()
+        self.assertEqual(upload_file_path(f), f.name)
+
+    def test_upload_file_mmap(self):
+        upload = SpooledUpload(1024)
+        self.assertEqual(upload_file_mmap(upload), '')
+
+        upload.write("This is line 1\n")
+        view = upload_file_mmap(upload)
+        self.assertEqual(view[:4], 'This')
+        self.assertEqual(len(view), 15)
+        view.close()
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Event
+from time import sleep, time
+from unittest import TestCase, main
+from pyqi.core.future import Future
+from pyqi.core.interfaces.html.jobs import (JobQueue, COMPLETED, FAILED,
+                                            CANCELLED, FINISHED)
+
+def page(in_):
+    return {'type': 'page', 'mime_type': 'text/plain', 'contents': in_}
+
+def error(in_):
+    return {'type': 'error', 'errors': ['Error: %s is required.' % in_]}
+
+def unpicklable(in_):
+    return {'type': 'page', 'mime_type': lambda: None, 'contents': in_}
+
+def fail(in_):
+    raise ValueError(in_)
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.jobs_dir = mkdtemp()
+        self.jobs = JobQueue(self.jobs_dir, workers=1)
+        self.started = Event()
+        self.release = Event()
+
+    def tearDown(self):
+        self.release.set()
+        rmtree(self.jobs_dir)
+
+    def block(self, in_):
+        self.started.set()
+        self.release.wait(5)
+        return page(in_)
+
+    def wait(self, job_id, jobs=None):
+        jobs = self.jobs if jobs is None else jobs
+        for i in range(500):
+            status = jobs.get_status(job_id)
+            if status['status'] in FINISHED:
+                return status
+            sleep(0.01)
+        self.fail("Job %s didn't finish" % job_id)
+
+    def test_completed(self):
+        job = self.jobs.submit('foo', page, 'bar')
+        self.assertEqual(self.wait(job.Id)['status'], COMPLETED)
+
+        status, result = self.jobs.get_result(job.Id)
+        self.assertEqual(status['command'], 'foo')
+        self.assertEqual(result['contents'], 'bar')
+
+        # finished jobs are read back from the directory
+        status, result = JobQueue(self.jobs_dir).get_result(job.Id)
+        self.assertEqual(status['status'], COMPLETED)
+        self.assertEqual(result['contents'], 'bar')
+
+    def test_failed(self):
+        job = self.jobs.submit('foo', error, 'bar')
+        status = self.wait(job.Id)
+        self.assertEqual(status['status'], FAILED)
+        self.assertEqual(status['errors'], ['Error: bar is required.'])
+
+        job = self.jobs.submit('foo', fail, 'baz')
+        self.assertEqual(self.wait(job.Id)['errors'], ['baz'])
+        self.assertEqual(self.jobs.get_result(job.Id)[1], None)
+
+    def test_streamed_contents(self):
+        """Streamed contents are written to a file in the jobs directory"""
+        job = self.jobs.submit('foo', page, iter(['a', u'b', '']))
+        self.assertEqual(self.wait(job.Id)['status'], COMPLETED)
+
+        result = self.jobs.get_result(job.Id)[1]
+        self.assertFalse('contents' in result)
+        self.assertEqual(open(result['path']).read(), 'ab')
+
+        os.utime(result['path'], (0, 0))
+        self.jobs.purge_expired()
+        self.assertFalse(os.path.exists(result['path']))
+
+    def test_unpicklable_result(self):
+        job = self.jobs.submit('foo', unpicklable, 'bar')
+        status = self.wait(job.Id)
+        self.assertEqual(status['status'], FAILED)
+        self.assertTrue(status['errors'][0].startswith('Could not store'))
+
+    def test_slow_save(self):
+        """Storing a result doesn't hold up other requests"""
+        started, release = self.started, self.release
+        class SlowPickle(str):
+            def __reduce__(self):
+                started.set()
+                release.wait(5)
+                return (str, ('saved',))
+
+        job = self.jobs.submit('foo', page, SlowPickle('bar'))
+        started.wait(5)
+
+        start = time()
+        other = self.jobs.submit('foo', page, 'bar')
+        self.assertEqual(self.jobs.get_status(job.Id)['status'], 'running')
+        self.assertTrue(time() - start < 1)
+
+        release.set()
+        self.assertEqual(self.wait(job.Id)['status'], COMPLETED)
+        self.assertEqual(self.jobs.get_result(job.Id)[1]['contents'], 'saved')
+        self.assertEqual(self.wait(other.Id)['status'], COMPLETED)
+
+    def test_async(self):
+        """Jobs that return a Future don't hold on to a worker"""
+        pending = Future()
+        class waity(object):
+            def acall(self, in_):
+                return pending
+
+        waiting = self.jobs.submit('foo', waity(), 'bar')
+        job = self.jobs.submit('foo', page, 'baz')
+        self.assertEqual(self.wait(job.Id)['status'], COMPLETED)
+        self.assertEqual(self.jobs.get_status(waiting.Id)['status'], 'running')
+
+        pending.set_result(page('bar'))
+        self.assertEqual(self.wait(waiting.Id)['status'], COMPLETED)
+        self.assertEqual(self.jobs.get_result(waiting.Id)[1]['contents'],
+                         'bar')
+
+    def test_cancel(self):
+        running = self.jobs.submit('foo', self.block, 'running')
+        self.started.wait(5)
+        queued = self.jobs.submit('foo', page, 'queued')
+
+        self.assertEqual(self.jobs.get_result(queued.Id),
+                         (queued.getStatus(), None))
+        self.assertEqual(self.jobs.cancel(queued.Id)['status'], CANCELLED)
+        self.assertEqual(self.jobs.cancel(running.Id)['status'], 'running')
+
+        self.release.set()
+        self.assertEqual(self.wait(running.Id)['status'], CANCELLED)
+        self.assertEqual(self.wait(queued.Id)['status'], CANCELLED)
+        self.assertEqual(self.jobs.get_result(running.Id)[1], None)
+
+    def test_other_process(self):
+        """Jobs can be polled and cancelled through another queue"""
+        other = JobQueue(self.jobs_dir)
+        running = self.jobs.submit('foo', self.block, 'running')
+        self.started.wait(5)
+        queued = self.jobs.submit('foo', page, 'queued')
+        polled = self.jobs.submit('foo', page, 'polled')
+
+        self.assertEqual(other.get_status(running.Id)['status'], 'running')
+        self.assertEqual(other.get_result(queued.Id),
+                         (queued.getStatus(), None))
+
+        # the owning queue cancels the jobs once it sees the requests
+        self.assertEqual(other.cancel(running.Id)['status'], 'running')
+        self.assertEqual(other.cancel(queued.Id)['status'], 'queued')
+
+        self.release.set()
+        self.assertEqual(self.wait(running.Id, other)['status'], CANCELLED)
+        self.assertEqual(self.wait(queued.Id, other)['status'], CANCELLED)
+        self.assertEqual(self.wait(polled.Id, other)['status'], COMPLETED)
+        self.assertEqual(other.get_result(polled.Id)[1]['contents'], 'polled')
+        self.assertEqual([f for f in os.listdir(self.jobs_dir)
+                          if f.endswith(JobQueue.CancelSuffix)], [])
+
+    def test_queue_full(self):
+        jobs = JobQueue(self.jobs_dir, workers=1, max_queued=1)
+        running = jobs.submit('foo', self.block, 'running')
+        self.started.wait(5)
+
+        self.assertNotEqual(jobs.submit('foo', page, 'queued'), None)
+        self.assertEqual(jobs.submit('foo', page, 'rejected'), None)
+
+        self.release.set()
+        self.wait(running.Id, jobs)
+
+    def test_expiry(self):
+        job = self.jobs.submit('foo', page, 'bar')
+        self.wait(job.Id)
+
+        path = os.path.join(self.jobs_dir, job.Id + JobQueue.Suffix)
+        os.utime(path, (0, 0))
+        self.assertEqual(self.jobs.get_status(job.Id), None)
+
+        self.jobs.purge_expired()
+        self.assertFalse(os.path.exists(path))
+
+    def test_unknown(self):
+        self.assertEqual(self.jobs.get_status('f' * 32), None)
+        self.assertEqual(self.jobs.get_status('../foo'), None)
+        self.assertEqual(self.jobs.get_result('f' * 32), (None, None))
+        self.assertEqual(self.jobs.cancel('f' * 32), None)
+
+if __name__ == '__main__':
+    main()
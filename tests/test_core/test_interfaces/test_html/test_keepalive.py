@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+from StringIO import StringIO
+from unittest import TestCase, main
+from pyqi.core.interfaces.html.keepalive import RequestBody
+
+class RequestBodyTests(TestCase):
+    def test_read(self):
+        """Reads stop at the end of the body"""
+        rfile = StringIO('foo\nbarGET / HTTP/1.1')
+        body = RequestBody(rfile, 7)
+        self.assertEqual(body.readline(), 'foo\n')
+        self.assertEqual(body.read(), 'bar')
+        self.assertEqual(body.read(), '')
+        self.assertEqual(body.readline(), '')
+        self.assertEqual(rfile.read(), 'GET / HTTP/1.1')
+
+    def test_discard(self):
+        rfile = StringIO('foobarGET / HTTP/1.1')
+        body = RequestBody(rfile, 6)
+        self.assertEqual(body.read(2), 'fo')
+        self.assertTrue(body.discard())
+        self.assertEqual(rfile.read(), 'GET / HTTP/1.1')
+
+        self.assertFalse(RequestBody(StringIO('foobar'), 6).discard(5))
+        self.assertFalse(RequestBody(StringIO('foo'), 6).discard())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+from StringIO import StringIO
+from unittest import TestCase, main
+from pyqi.core.interfaces.html.metrics import (Metrics, CountingWriter,
+                                               format_labels)
+
+class MetricsTests(TestCase):
+    def test_render(self):
+        metrics = Metrics(buckets=[1.0, 0.1])
+        labels = ('post_route', 'foo')
+        metrics.start(labels)
+        metrics.start(labels)
+        metrics.finish(labels, 200, 0.05, 10, 100)
+
+        obs = metrics.render([('pyqi_jobs_queued', 'Queued jobs.', 3)])
+        lines = obs.splitlines()
+        self.assertTrue('pyqi_http_requests_in_flight'
+                        '{route="post_route",command="foo"} 1' in lines)
+        self.assertTrue('pyqi_http_requests_total'
+                        '{route="post_route",command="foo",code="200"} 1'
+                        in lines)
+        self.assertTrue('pyqi_http_request_bytes_total'
+                        '{route="post_route",command="foo"} 10' in lines)
+        self.assertTrue('pyqi_http_response_bytes_total'
+                        '{route="post_route",command="foo"} 100' in lines)
+        self.assertTrue('# TYPE pyqi_jobs_queued gauge' in lines)
+        self.assertTrue('pyqi_jobs_queued 3' in lines)
+
+        metrics.finish(labels, 400, 2.0, 0, 50)
+        lines = metrics.render().splitlines()
+        self.assertTrue('pyqi_http_request_errors_total'
+                        '{route="post_route",command="foo"} 1' in lines)
+
+        name = 'pyqi_http_request_duration_seconds'
+        self.assertEqual([l for l in lines if l.startswith(name)], [
+            name + '_bucket{route="post_route",command="foo",le="0.1"} 1',
+            name + '_bucket{route="post_route",command="foo",le="1.0"} 1',
+            name + '_bucket{route="post_route",command="foo",le="+Inf"} 2',
+            name + '_sum{route="post_route",command="foo"} 2.05',
+            name + '_count{route="post_route",command="foo"} 2'])
+
+    def test_format_labels(self):
+        self.assertEqual(format_labels(('a', 'b'), ('x', 'y"\\\n')),
+                         '{a="x",b="y\\"\\\\\\n"}')
+        self.assertEqual(format_labels((), ()), '')
+
+    def test_counting_writer(self):
+        f = CountingWriter(StringIO())
+        f.write('foo')
+        f.write('ba')
+        self.assertEqual(f.BytesWritten, 5)
+        self.assertEqual(f.getvalue(), 'fooba')
+
+if __name__ == '__main__':
+    main()
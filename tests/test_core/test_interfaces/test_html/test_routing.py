@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+from unittest import TestCase, main
+from pyqi.core.interfaces.html.routing import Router
+from pyqi.core.exception import IncompetentDeveloperError
+
+class RouterTests(TestCase):
+    def setUp(self):
+        self.router = Router()
+        self.router.add('GET', '/', 'index')
+        self.router.add('GET', '/help', 'help')
+        self.router.add('GET', '/<command>', 'command')
+        self.router.add('POST', '/<command>', 'post')
+        self.router.add('GET', '/<command>/jobs/<job_id>', 'job')
+        self.router.add('GET', '/<command>/jobs/latest', 'latest')
+
+    def test_static(self):
+        self.assertEqual(self.router.resolve('GET', '/'),
+                         ('index', {}, ['GET']))
+        self.assertEqual(self.router.resolve('GET', '/help/'),
+                         ('help', {}, ['GET']))
+
+    def test_params(self):
+        self.assertEqual(self.router.resolve('POST', '/make-command'),
+                         ('post', {'command': 'make-command'},
+                          ['GET', 'POST']))
+        self.assertEqual(self.router.resolve('GET', '/foo/jobs/a%20b'),
+                         ('job', {'command': 'foo', 'job_id': 'a b'},
+                          ['GET']))
+
+    def test_literal_precedence(self):
+        """Literal segments are preferred over parameters"""
+        self.assertEqual(self.router.resolve('GET', '/foo/jobs/latest'),
+                         ('latest', {'command': 'foo'}, ['GET']))
+
+    def test_not_found(self):
+        self.assertEqual(self.router.resolve('GET', '/foo/bar'),
+                         (None, {}, []))
+        self.assertEqual(self.router.resolve('GET', '/foo/jobs'),
+                         (None, {}, []))
+
+    def test_method_not_allowed(self):
+        self.assertEqual(self.router.resolve('POST', '/help'),
+                         (None, {}, ['GET']))
+        self.assertEqual(self.router.resolve('DELETE', '/foo'),
+                         (None, {'command': 'foo'}, ['GET', 'POST']))
+
+    def test_many_routes(self):
+        router = Router()
+        for i in range(1000):
+            router.add('GET', '/cmd-%d' % i, i)
+        self.assertEqual(router.resolve('GET', '/cmd-999'),
+                         (999, {}, ['GET']))
+
+    def test_invalid_routes(self):
+        self.assertRaises(IncompetentDeveloperError, self.router.add, 'GET',
+                          '/help', 'other')
+        self.assertRaises(IncompetentDeveloperError, self.router.add, 'GET',
+                          '/<name>/foo', 'other')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+import zlib
+from gzip import GzipFile
+from StringIO import StringIO
+from unittest import TestCase, main
+from pyqi.core.interfaces.html.static import (StaticContent, choose_encoding,
+                                              encode, is_not_modified)
+
+class StaticTests(TestCase):
+    def test_encode(self):
+        body = 'abc' * 100
+        self.assertEqual(encode(body, 'identity'), body)
+        self.assertEqual(GzipFile(fileobj=StringIO(encode(body, 'gzip'))
+                                  ).read(), body)
+        self.assertEqual(zlib.decompress(encode(body, 'deflate')), body)
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding(None, 1000), 'identity')
+        self.assertEqual(choose_encoding('gzip', 10), 'identity')
+        self.assertEqual(choose_encoding('gzip, deflate', 1000), 'gzip')
+        self.assertEqual(choose_encoding('deflate', 1000), 'deflate')
+        self.assertEqual(choose_encoding('gzip;q=0.5, deflate', 1000),
+                         'deflate')
+        self.assertEqual(choose_encoding('gzip;q=0, br', 1000), 'identity')
+        self.assertEqual(choose_encoding('*', 1000), 'gzip')
+        self.assertEqual(choose_encoding('*;q=0, deflate;q=0.1', 1000),
+                         'deflate')
+
+    def test_is_not_modified(self):
+        last_modified = 1380000000
+        self.assertFalse(is_not_modified({}, '"a"', last_modified))
+        self.assertTrue(is_not_modified({'If-None-Match': '"b", "a"'}, '"a"',
+                                        last_modified))
+        self.assertTrue(is_not_modified({'If-None-Match': 'W/"a"'}, '"a"',
+                                        last_modified))
+        self.assertFalse(is_not_modified({'If-None-Match': '"b"'}, '"a"',
+                                         last_modified))
+
+        since = 'Tue, 24 Sep 2013 05:20:00 GMT'
+        self.assertTrue(is_not_modified({'If-Modified-Since': since}, '"a"',
+                                        last_modified))
+        self.assertFalse(is_not_modified({'If-Modified-Since': since}, '"a"',
+                                         last_modified + 1))
+
+        # If-None-Match takes precedence
+        self.assertFalse(is_not_modified({'If-None-Match': '"b"',
+                                          'If-Modified-Since': since}, '"a"',
+                                         last_modified))
+
+    def test_static_content(self):
+        content = StaticContent('abc' * 100, 'text/plain',
+                                LastModified=1380000000)
+        self.assertEqual(content.getETag('identity'), '"%s"' % content.ETag)
+        self.assertEqual(content.getETag('gzip'), '"%s-gzip"' % content.ETag)
+        self.assertEqual(content.getLastModified(),
+                         'Tue, 24 Sep 2013 05:20:00 GMT')
+        self.assertTrue(content.getBody('gzip') is content.getBody('gzip'))
+
+if __name__ == '__main__':
+    main()
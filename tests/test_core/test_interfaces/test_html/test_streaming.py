@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+from StringIO import StringIO
+from tempfile import TemporaryFile
+from unittest import TestCase, main
+from pyqi.core.interfaces.html.streaming import (get_content_length,
+                                                 iter_chunks,
+                                                 STREAM_CHUNK_SIZE)
+
+class StreamingTests(TestCase):
+    def test_get_content_length(self):
+        self.assertEqual(get_content_length('abc'), 3)
+        self.assertEqual(get_content_length(StringIO('abc')), None)
+        self.assertEqual(get_content_length(iter(['abc'])), None)
+
+        f = TemporaryFile()
+        f.write('abcdef')
+        f.seek(2)
+        self.assertEqual(get_content_length(f), 4)
+
+    def test_iter_chunks(self):
+        self.assertEqual(list(iter_chunks(['a', '', u'b'])), ['a', 'b'])
+
+        f = StringIO('x' * (STREAM_CHUNK_SIZE + 1))
+        self.assertEqual([len(c) for c in iter_chunks(f)],
+                         [STREAM_CHUNK_SIZE, 1])
+
+if __name__ == '__main__':
+    main()
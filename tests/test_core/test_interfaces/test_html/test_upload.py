@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Evan Bolyen", "Jai Ram Rideout", "Daniel McDonald",
+               "Greg Caporaso"]
+
+import os
+from shutil import rmtree
+from StringIO import StringIO
+from tempfile import mkdtemp
+from unittest import TestCase, main
+from pyqi.core.interfaces.html.upload import (SpooledUpload,
+                                              spooled_field_storage_factory)
+
+def multipart_body(fields):
+    """Return ``(body, content_type)`` for a multipart/form-data POST"""
+    lines = []
+    for name, filename, value in fields:
+        lines.append('--BOUNDARY')
+        if filename is None:
+            lines.append('Content-Disposition: form-data; name="%s"' % name)
+        else:
+            lines.append('Content-Disposition: form-data; name="%s"; '
+                         'filename="%s"' % (name, filename))
+        lines.append('')
+        lines.append(value)
+    lines.append('--BOUNDARY--')
+    lines.append('')
+    return '\r\n'.join(lines), 'multipart/form-data; boundary=BOUNDARY'
+
+class SpooledUploadTests(TestCase):
+    def setUp(self):
+        self.upload_dir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.upload_dir)
+
+    def test_rollover(self):
+        f = SpooledUpload(10, self.upload_dir)
+        f.write('a' * 10)
+        self.assertFalse(f._rolled)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+        f.write('b')
+        self.assertTrue(f._rolled)
+        self.assertEqual(os.path.dirname(f.name), self.upload_dir)
+
+        f.seek(0)
+        self.assertEqual(f.read(), 'a' * 10 + 'b')
+        f.close()
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_no_threshold(self):
+        """A threshold of 0 spools everything to disk"""
+        f = SpooledUpload(0, self.upload_dir)
+        self.assertTrue(f._rolled)
+        f.close()
+
+    def test_field_storage(self):
+        body, content_type = multipart_body([
+                ('small', 'small.txt', 'x' * 10),
+                ('large', 'large.txt', 'y\n' * 100000),
+                ('text', None, 'foo')])
+        storage_class = spooled_field_storage_factory(100, self.upload_dir)
+        fs = storage_class(fp=StringIO(body),
+                           headers={'content-type': content_type,
+                                    'content-length': str(len(body))},
+                           environ={'REQUEST_METHOD': 'POST'})
+
+        self.assertFalse(fs['small'].file._rolled)
+        self.assertTrue(fs['large'].file._rolled)
+        self.assertEqual(len(os.listdir(self.upload_dir)), 1)
+
+        self.assertEqual(fs['small'].file.read(), 'x' * 10)
+        self.assertEqual(fs['large'].file.read(), 'y\n' * 100000)
+        self.assertEqual(fs['text'].value, 'foo')
+
+    def test_field_storage_text(self):
+        """Only file uploads are spooled"""
+        body, content_type = multipart_body([
+                ('file', 'file.txt', 'x' * 10),
+                ('text', None, 'foo'),
+                ('long', None, 'z' * 2000)])
+        storage_class = spooled_field_storage_factory(0, self.upload_dir)
+        fs = storage_class(fp=StringIO(body),
+                           headers={'content-type': content_type,
+                                    'content-length': str(len(body))},
+                           environ={'REQUEST_METHOD': 'POST'})
+
+        self.assertTrue(isinstance(fs['file'].file, SpooledUpload))
+        self.assertFalse(isinstance(fs['text'].file, SpooledUpload))
+        self.assertFalse(isinstance(fs['long'].file, SpooledUpload))
+        self.assertEqual(len(os.listdir(self.upload_dir)), 1)
+
+        self.assertEqual(fs['file'].file.read(), 'x' * 10)
+        self.assertEqual(fs['text'].value, 'foo')
+        self.assertEqual(fs['long'].value, 'z' * 2000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import os
+import json
+import socket
+import sys
+import time
+from multiprocessing import Process
+from shutil import rmtree
+from tempfile import mkdtemp, TemporaryFile
+from threading import Thread
+from unittest import TestCase, main
+from _multiprocessing import sendfd, recvfd
+from pyqi.core.interfaces.optparse.daemon import (start_daemon, run_client,
+                                                  get_interface_classes,
+                                                  _handle_request, _recv_frame,
+                                                  EXIT)
+
+CFG_MOD = 'pyqi.interfaces.optparse.config'
+
+def _quiet_daemon(socket_path):
+    sys.stdout = open(os.devnull, 'w')
+    start_daemon(socket_path, CFG_MOD)
+
+class Cat(object):
+    """An interface that copies stdin to stdout below the file objects"""
+    def __call__(self, argv):
+        os.write(1, os.read(0, 1024))
+        os.system('echo from a subprocess >&2')
+
+def _serve_one(server):
+    conn, _ = server.accept()
+    _handle_request(conn, CFG_MOD, {'cat': Cat})
+
+class DaemonTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+        self.socket_path = os.path.join(self.tmp_dir, 'pyqi.sock')
+
+        # keep the command manifest out of the user's home directory
+        self.saved_manifest_dir = os.environ.get('PYQI_MANIFEST_DIR')
+        os.environ['PYQI_MANIFEST_DIR'] = self.tmp_dir
+
+        self.daemon = Process(target=_quiet_daemon, args=(self.socket_path,))
+        self.daemon.start()
+
+        for i in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        if self.saved_manifest_dir is None:
+            del os.environ['PYQI_MANIFEST_DIR']
+        else:
+            os.environ['PYQI_MANIFEST_DIR'] = self.saved_manifest_dir
+
+        self.daemon.terminate()
+        self.daemon.join()
+        rmtree(self.tmp_dir)
+
+    def run_client(self, argv, cfg_mod=CFG_MOD, stdin=''):
+        stdin_f, stdout, stderr = TemporaryFile(), TemporaryFile(), \
+                                  TemporaryFile()
+        stdin_f.write(stdin)
+        stdin_f.seek(0)
+        status = run_client(self.socket_path, cfg_mod, 'pyqi', argv,
+                            stdin=stdin_f, stdout=stdout, stderr=stderr)
+
+        output = []
+        for f in (stdin_f, stdout, stderr):
+            f.seek(0)
+            output.append(f.read())
+            f.close()
+        return status, output[1], output[2]
+
+    def test_get_interface_classes(self):
+        obs = get_interface_classes(CFG_MOD)
+        self.assertTrue('make-command' in obs)
+        self.assertTrue('serve-cli' in obs)
+
+    def test_run_command(self):
+        """Commands run in the daemon's workers, in the client's cwd"""
+        out_fp = os.path.join(self.tmp_dir, 'completion.sh')
+        argv = ['make-bash-completion', '--command-config-module', CFG_MOD,
+                '--driver-name', 'pyqi', '-o', 'completion.sh']
+
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir)
+        try:
+            status, _, _ = self.run_client(argv)
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual(status, 0)
+        with open(out_fp) as f:
+            self.assertTrue('_pyqi_complete()' in f.read())
+
+    def test_help(self):
+        status, stdout, _ = self.run_client(['help', 'make-command'])
+        self.assertEqual(status, 0)
+        self.assertTrue(stdout.startswith('Usage: pyqi make-command'))
+
+    def test_errors(self):
+        status, _, stderr = self.run_client(['make-command', '--foo'])
+        self.assertEqual(status, 2)
+        self.assertTrue('no such option: --foo' in stderr)
+
+        status, _, stderr = self.run_client(['not-a-command'])
+        self.assertEqual(status, 1)
+        self.assertTrue('Unrecognized command not-a-command' in stderr)
+
+    def test_fallback(self):
+        """None is returned if the daemon can't run the command"""
+        status, _, _ = self.run_client(['make-command'], cfg_mod='foo.bar')
+        self.assertEqual(status, None)
+
+        self.socket_path = os.path.join(self.tmp_dir, 'missing.sock')
+        status, _, _ = self.run_client(['make-command'])
+        self.assertEqual(status, None)
+
+    def test_request_errors(self):
+        """Requests that fail in the worker still get an exit status"""
+        def send(request):
+            stderr = TemporaryFile()
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socket_path)
+            for fd in (0, 1, stderr.fileno()):
+                sendfd(sock.fileno(), fd)
+            sock.sendall(request + '\n')
+            frames = []
+            while True:
+                channel, payload = _recv_frame(sock)
+                if channel is None:
+                    break
+                frames.append((channel, payload))
+            sock.close()
+            stderr.seek(0)
+            return frames, stderr.read()
+
+        frames, stderr = send('not json')
+        self.assertEqual(frames, [(EXIT, '1')])
+        self.assertTrue('ValueError' in stderr)
+
+        frames, stderr = send(json.dumps({'argv': ['make-command'],
+                                          'cwd': os.path.join(self.tmp_dir,
+                                                              'foo'),
+                                          'env': {}, 'driver_name': 'pyqi',
+                                          'command_config_module': CFG_MOD}))
+        self.assertEqual(frames, [(EXIT, '1')])
+
+    def test_fds(self):
+        """Commands use the client's descriptors, not just sys's files"""
+        self.socket_path = os.path.join(self.tmp_dir, 'one.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(1)
+        worker = Process(target=_serve_one, args=(server,))
+        worker.start()
+        server.close()
+
+        try:
+            status, stdout, stderr = self.run_client(['cat'], stdin='foo')
+        finally:
+            worker.join()
+
+        self.assertEqual(status, 0)
+        self.assertEqual(stdout, 'foo')
+        self.assertEqual(stderr, 'from a subprocess\n')
+
+    def test_lost_connection(self):
+        """A worker that dies mid-command is a failure, not a fallback"""
+        self.socket_path = os.path.join(self.tmp_dir, 'dying.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(1)
+
+        def die():
+            conn, _ = server.accept()
+            fds = [recvfd(conn.fileno()) for i in range(3)]
+            conn.makefile('rb').readline()
+            os.write(fds[1], 'foo')
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+
+        t = Thread(target=die)
+        t.start()
+        try:
+            status, stdout, stderr = self.run_client(['make-command'])
+        finally:
+            t.join()
+            server.close()
+
+        self.assertEqual(status, 1)
+        self.assertEqual(stdout, 'foo')
+        self.assertTrue('Lost the connection' in stderr)
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,9 @@
 __credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
                "Jai Ram Rideout", "Jose Antonio Navas Molina"]
 
+import sys
+import json
+from StringIO import StringIO
 from unittest import TestCase, main
 from pyqi.core.interfaces.optparse import (OptparseResult, OptparseOption,
                                            OptparseUsageExample,
@@ -26,7 +29,10 @@ from pyqi.core.interfaces.optparse import (OptparseResult, OptparseOption,
                                            check_existing_path, check_new_path,
                                            check_multiple_choice,
                                            check_blast_db)
-from pyqi.core.exception import IncompetentDeveloperError
+from pyqi.core.exception import (IncompetentDeveloperError,
+                                 InvalidReturnTypeError)
+from pyqi.core.log import JSONLinesLogger
+from pyqi.core.timing import PhaseTimings
 from pyqi.core.command import (Command, CommandIn, CommandOut,
                                ParameterCollection, Parameter)
 from tempfile import mkstemp, mkdtemp
@@ -111,6 +117,34 @@ class OptparseInterfaceTests(TestCase):
         obs = self.interface._output_handler(results)
         self.assertEqual(obs, {'itsaresult':40})
 
+    def test_call_phases(self):
+        stream = StringIO()
+        self.interface.CmdInstance._logger = JSONLinesLogger(stream)
+        self.assertEqual(self.interface(['--c','foo']), {'itsaresult':20})
+
+        records = [json.loads(l) for l in stream.getvalue().splitlines()]
+        phases = [r for r in records if 'phase' in r]
+        self.assertEqual([r['phase'] for r in phases],
+                         ['validate', 'run', 'validate_result', 'output'])
+        self.assertEqual(phases[-1]['command'], '%s.ghetto' % __name__)
+        self.assertEqual(phases[-1]['input_size'], {'itsaresult': None})
+        self.assertEqual(phases[-1]['output_size'], {'itsaresult': None})
+
+    def test_call_timings(self):
+        self.interface.Timings = PhaseTimings()
+        self.assertEqual(self.interface(['--c','foo']), {'itsaresult':20})
+        self.assertEqual([t.Phase for t in self.interface.Timings.Timings],
+                         ['in_validator', 'input_handler', 'command',
+                          'out_validator', 'output_handler'])
+
+        # phases that fail are recorded too
+        self.interface.Timings.clear()
+        self.interface.CmdInstance.run = lambda **kwargs: 42
+        self.assertRaises(InvalidReturnTypeError, self.interface,
+                          ['--c','foo'])
+        self.assertEqual([t.Phase for t in self.interface.Timings.Timings],
+                         ['in_validator', 'input_handler', 'command'])
+
 class GeneralTests(TestCase):
     def setUp(self):
         self.obj = optparse_factory(ghetto,
@@ -131,6 +165,20 @@ class GeneralTests(TestCase):
         # exercise it
         _ = optparse_main(self.obj, ['testing', '--c', 'bar'])
 
+    def test_optparse_main_timings(self):
+        argv = ['testing', '--c', 'bar', '--pyqi-timings']
+        saved_stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            self.assertEqual(optparse_main(self.obj, argv), 0)
+            lines = sys.stderr.getvalue().splitlines()
+        finally:
+            sys.stderr = saved_stderr
+
+        self.assertEqual(argv[-1], '--pyqi-timings')
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[3].startswith('command '))
+
 class ghetto(Command):
     CommandIns = ParameterCollection([CommandIn('c', str, 'b')])
     CommandOuts = ParameterCollection([CommandOut('itsaresult', str, 'x')])
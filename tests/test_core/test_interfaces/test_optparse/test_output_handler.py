@@ -52,6 +52,14 @@ class OutputHandlerTests(TestCase):
 
         self.assertEqual(obs, 'bar\nbaz\n')
 
+        # streams are accepted too
+        os.remove(self.fp)
+        write_list_of_strings('foo', (x for x in ['bar', 'baz']), self.fp)
+        with open(self.fp, 'U') as obs_f:
+            obs = obs_f.read()
+
+        self.assertEqual(obs, 'bar\nbaz\n')
+
     def test_print_list_of_strings(self):
         """Correctly prints a list of strings."""
         # Save stdout and replace it with something that will capture the print
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+from __future__ import division
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import atexit
+import json
+import os
+import signal
+from StringIO import StringIO
+from threading import Event
+from unittest import TestCase, main
+from pyqi.core.log import (Logger, NullLogger, JSONLinesLogger, QueuedLogger,
+                           get_size)
+from pyqi.core.exception import IncompetentDeveloperError
+
+class BlockingStream(StringIO):
+    """A stream whose writes wait until ``release`` is set"""
+    def __init__(self):
+        StringIO.__init__(self)
+        self.writing = Event()
+        self.release = Event()
+        self.writes = 0
+
+    def write(self, s):
+        self.writing.set()
+        self.release.wait(5)
+        self.writes += 1
+        StringIO.write(self, s)
+
+class RecordingLogger(Logger):
+    """Keep the messages logged, in a list"""
+    def __init__(self, level=Logger.DEBUG):
+        super(RecordingLogger, self).__init__(level)
+        self.messages = []
+
+    def _debug(self, msg):
+        self.messages.append(('DEBUG', msg))
+    def _info(self, msg):
+        self.messages.append(('INFO', msg))
+    def _warn(self, msg):
+        self.messages.append(('WARN', msg))
+    def _fatal(self, msg):
+        self.messages.append(('FATAL', msg))
+    def flush(self):
+        pass
+
+class Unformattable(object):
+    """An argument that fails the test if it is formatted"""
+    def __str__(self):
+        raise AssertionError("Argument was formatted.")
+    __repr__ = __str__
+
+class LoggerTests(TestCase):
+    def test_args(self):
+        logger = RecordingLogger()
+        logger.debug('%d of %s', 1, 'foo')
+        logger.info('100%')
+        logger.fatal('%(a)s', {'a': 'b'})
+        self.assertEqual(logger.messages, [('DEBUG', '1 of foo'),
+                                           ('INFO', '100%'),
+                                           ('FATAL', 'b')])
+
+    def test_level(self):
+        logger = RecordingLogger(level=Logger.WARN)
+        self.assertEqual(logger.Level, 'WARN')
+        logger.debug('%s', Unformattable())
+        logger.info('%s', Unformattable())
+        logger.warn('warn %s', 'foo')
+        logger.fatal('fatal')
+        self.assertEqual(logger.messages, [('WARN', 'warn foo'),
+                                           ('FATAL', 'fatal')])
+
+        logger.setLevel(Logger.DEBUG)
+        logger.debug('debug')
+        self.assertEqual(logger.messages[-1], ('DEBUG', 'debug'))
+
+    def test_isEnabledFor(self):
+        logger = RecordingLogger(level=Logger.INFO)
+        self.assertFalse(logger.isEnabledFor(Logger.DEBUG))
+        self.assertTrue(logger.isEnabledFor(Logger.INFO))
+        self.assertTrue(logger.isEnabledFor(Logger.FATAL))
+
+        logger = NullLogger()
+        for level in Logger.LevelValues:
+            self.assertFalse(logger.isEnabledFor(level))
+        logger.fatal('%s', Unformattable())
+
+    def test_invalid_level(self):
+        self.assertRaises(IncompetentDeveloperError, RecordingLogger, 'foo')
+        logger = RecordingLogger()
+        self.assertRaises(IncompetentDeveloperError, logger.setLevel, 10)
+        self.assertEqual(logger.Level, 'DEBUG')
+
+class JSONLinesLoggerTests(TestCase):
+    def test_messages(self):
+        stream = StringIO()
+        logger = JSONLinesLogger(stream)
+        logger.info('%d of %s', 1, 'foo')
+        logger.fatal('bar')
+
+        records = [json.loads(l) for l in stream.getvalue().splitlines()]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['level'], 'INFO')
+        self.assertEqual(records[0]['message'], '1 of foo')
+        self.assertEqual(records[1]['level'], 'FATAL')
+        self.assertTrue('time' in records[1])
+
+    def test_phase(self):
+        stream = StringIO()
+        logger = JSONLinesLogger(stream)
+        self.assertTrue(logger.TimesPhases)
+        logger.phase(JSONLinesLoggerTests, 'run', 0.5, {'a': 3}, None)
+
+        record = json.loads(stream.getvalue())
+        del record['time']
+        self.assertEqual(record,
+                {'level': 'INFO',
+                 'command': '%s.JSONLinesLoggerTests' % __name__,
+                 'phase': 'run', 'duration': 0.5, 'input_size': {'a': 3},
+                 'output_size': None})
+
+        # phases are logged at the INFO level
+        stream = StringIO()
+        logger = JSONLinesLogger(stream, level=Logger.WARN)
+        logger.phase(JSONLinesLoggerTests, 'run', 0.5)
+        logger.info('foo')
+        self.assertEqual(stream.getvalue(), '')
+
+    def test_get_size(self):
+        self.assertEqual(get_size({'a': [1, 2], 'b': 'foo', 'c': 42,
+                                   'd': iter([1])}),
+                         {'a': 2, 'b': 3, 'c': None, 'd': None})
+        self.assertEqual(get_size({}), {})
+        self.assertEqual(get_size('foo'), 3)
+        self.assertEqual(get_size(None), None)
+
+class QueuedLoggerTests(TestCase):
+    def test_batching(self):
+        stream = BlockingStream()
+        stream.release.set()
+        logger = QueuedLogger(stream, batch_size=3)
+
+        # the writer isn't woken until a batch has filled up
+        logger.info('first')
+        logger.info('second')
+        self.assertFalse(stream.writing.wait(0.1))
+        logger.info('third')
+        self.assertTrue(stream.writing.wait(5))
+
+        for i in range(4):
+            logger.debug('message %d' % i)
+        logger.fatal('last')
+        logger.flush()
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 8)
+        self.assertTrue(lines[0].endswith(' INFO first'))
+        self.assertTrue(lines[3].endswith(' DEBUG message 0'))
+        self.assertTrue(lines[-1].endswith(' FATAL last'))
+        self.assertEqual(stream.writes, 3)
+        logger.close()
+
+    def test_drop(self):
+        stream = BlockingStream()
+        logger = QueuedLogger(stream, max_queued=2)
+        logger.info('first')
+        logger.info('second')
+        stream.writing.wait(5)
+
+        for i in range(5):
+            logger.warn('message %d' % i)
+        self.assertEqual(logger.Dropped, 3)
+
+        stream.release.set()
+        logger.close()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[3].endswith(' WARN message 1'))
+        self.assertTrue(lines[4].endswith(' WARN Dropped 3 log messages'))
+
+    def test_close(self):
+        stream = StringIO()
+        logger = QueuedLogger(stream, overflow='block', max_queued=1)
+        for i in range(10):
+            logger.info('message %d' % i)
+        logger.close()
+        self.assertEqual(len(stream.getvalue().splitlines()), 10)
+
+        # logging again starts a new writer
+        logger.info('again')
+        logger.flush()
+        self.assertTrue(stream.getvalue().endswith(' INFO again\n'))
+        logger.close()
+
+    def test_close_exit(self):
+        """The logger is closed at exit only once"""
+        registered = []
+        register = atexit.register
+        atexit.register = registered.append
+        try:
+            logger = QueuedLogger(StringIO())
+            for i in range(3):
+                logger.info('message %d' % i)
+                logger.close()
+        finally:
+            atexit.register = register
+
+        self.assertEqual(registered, [logger.close])
+
+    def test_fork(self):
+        """A forked child only writes the messages it logs"""
+        stream = BlockingStream()
+        logger = QueuedLogger(stream, batch_size=1)
+        logger.info('first')
+        stream.writing.wait(5)
+        logger.info('queued')
+
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                signal.alarm(5)
+                os.close(read_fd)
+                stream.release.set()
+                stream.truncate(0)
+                logger.info('child')
+                logger.flush()
+                logger.close()
+                os.write(write_fd, stream.getvalue())
+            finally:
+                os._exit(0)
+
+        os.close(write_fd)
+        child_output = os.read(read_fd, 4096)
+        os.close(read_fd)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+
+        lines = child_output.splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith(' INFO child'))
+
+        stream.release.set()
+        logger.close()
+        self.assertEqual(len(stream.getvalue().splitlines()), 2)
+
+    def test_level(self):
+        stream = StringIO()
+        logger = QueuedLogger(stream, level=Logger.INFO)
+        logger.debug('%s', Unformattable())
+        logger.info('%s of %s', 1, 2)
+        logger.close()
+        self.assertTrue(stream.getvalue().endswith(' INFO 1 of 2\n'))
+        self.assertEqual(len(stream.getvalue().splitlines()), 1)
+
+    def test_invalid_overflow(self):
+        self.assertRaises(IncompetentDeveloperError, QueuedLogger,
+                          overflow='foo')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+import os
+import sys
+import json
+import importlib
+import pyqi.core.interface
+from os.path import exists, join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase, main
+from pyqi.core.manifest import get_command_manifest, get_manifest_path
+
+config_template = """
+from pyqi.core.interfaces.optparse import OptparseOption
+from pyqi.core.command import Command, CommandIn, ParameterCollection
+
+class Foo(Command):
+    BriefDescription = %r
+    CommandIns = ParameterCollection([CommandIn('bar', str, 'bar')])
+
+CommandConstructor = Foo
+inputs = [OptparseOption(Parameter=Foo.CommandIns['bar'])]
+"""
+
+class CommandManifestTests(TestCase):
+    def setUp(self):
+        self.temp_dir = mkdtemp()
+        self.manifest_dir = join(self.temp_dir, 'manifests')
+        self.config_dir = join(self.temp_dir, 'pyqi_manifest_test')
+        os.mkdir(self.config_dir)
+
+        with open(join(self.config_dir, '__init__.py'), 'w') as f:
+            f.write('')
+        self.write_config('foo_cmd', 'do foo')
+
+        sys.path.append(self.temp_dir)
+
+        self.saved_get_entry_points = pyqi.core.interface._get_entry_points
+
+        # keep the command names index out of the user's home directory
+        self.saved_manifest_dir = os.environ.get('PYQI_MANIFEST_DIR')
+        os.environ['PYQI_MANIFEST_DIR'] = self.manifest_dir
+
+    def tearDown(self):
+        pyqi.core.interface._get_entry_points = self.saved_get_entry_points
+        if self.saved_manifest_dir is None:
+            del os.environ['PYQI_MANIFEST_DIR']
+        else:
+            os.environ['PYQI_MANIFEST_DIR'] = self.saved_manifest_dir
+        sys.path.remove(self.temp_dir)
+        for name in sys.modules.keys():
+            if name.startswith('pyqi_manifest_test'):
+                del sys.modules[name]
+        rmtree(self.temp_dir)
+
+    def write_config(self, name, brief_description):
+        fp = join(self.config_dir, name + '.py')
+        with open(fp, 'w') as f:
+            f.write(config_template % brief_description)
+        return fp
+
+    def get_manifest(self):
+        return get_command_manifest('pyqi_manifest_test', self.manifest_dir)
+
+    def get_manifest_path(self):
+        return get_manifest_path('pyqi_manifest_test', self.manifest_dir)
+
+    def forget_config(self, name):
+        """Forget an imported config, as a new driver process would"""
+        del sys.modules['pyqi_manifest_test.%s' % name]
+
+    def test_get_command_manifest(self):
+        """The manifest describes each command and is saved for reuse"""
+        exp = [{'name': 'foo-cmd',
+                'config_module': 'pyqi_manifest_test.foo_cmd',
+                'brief_description': 'do foo',
+                'options': ['--bar'],
+                'error': None}]
+        self.assertEqual(self.get_manifest(), exp)
+
+        manifest_fp = self.get_manifest_path()
+        self.assertTrue(manifest_fp.startswith(self.manifest_dir))
+        self.assertTrue(exists(manifest_fp))
+
+        # the saved manifest is used instead of importing the config again
+        with open(manifest_fp) as f:
+            manifest = json.load(f)
+        manifest['commands'][0]['brief_description'] = 'cached'
+        with open(manifest_fp, 'w') as f:
+            json.dump(manifest, f)
+
+        self.assertEqual(self.get_manifest()[0]['brief_description'],
+                         'cached')
+
+    def test_invalidation(self):
+        """The manifest is rebuilt when config files change"""
+        self.get_manifest()
+
+        # changing a file invalidates the manifest
+        fp = self.write_config('foo_cmd', 'do foo differently')
+        mtime = os.stat(fp).st_mtime + 10
+        os.utime(fp, (mtime, mtime))
+        self.forget_config('foo_cmd')
+        self.assertEqual(self.get_manifest()[0]['brief_description'],
+                         'do foo differently')
+
+        # as does adding a command
+        self.write_config('baz_cmd', 'do baz')
+        obs = self.get_manifest()
+        self.assertEqual([e['name'] for e in obs], ['baz-cmd', 'foo-cmd'])
+
+    def test_errors(self):
+        """Commands that can't be loaded are reported and not saved"""
+        with open(join(self.config_dir, 'broken.py'), 'w') as f:
+            f.write('import hopefully_nonexistent_module\n')
+
+        obs = self.get_manifest()
+        self.assertEqual(obs[0]['name'], 'broken')
+        self.assertEqual(obs[0]['brief_description'], None)
+        self.assertTrue('hopefully_nonexistent_module' in obs[0]['error'])
+        self.assertEqual(obs[1]['brief_description'], 'do foo')
+
+        self.assertFalse(exists(self.get_manifest_path()))
+
+    def test_entry_points(self):
+        """Entries name the config modules of entry point commands"""
+        with open(join(self.config_dir, '__init__.py'), 'w') as f:
+            f.write('entry_point_group = "pyqi.test"\n')
+        os.utime(self.config_dir, (1, 1))
+        pyqi.core.interface._get_entry_points = lambda group: \
+                [('ep-cmd', 'pyqi.interfaces.optparse.config.make_command')]
+
+        obs = self.get_manifest()
+        self.assertEqual([e['name'] for e in obs], ['ep-cmd', 'foo-cmd'])
+        self.assertEqual(obs[0]['config_module'],
+                         'pyqi.interfaces.optparse.config.make_command')
+        self.assertEqual(obs[1]['config_module'],
+                         'pyqi_manifest_test.foo_cmd')
+
+        for entry in obs:
+            config = importlib.import_module(entry['config_module'])
+            self.assertEqual(config.CommandConstructor.BriefDescription,
+                             entry['brief_description'])
+
+    def test_manifest_path(self):
+        """Configs in different directories don't share a manifest"""
+        fp = self.get_manifest_path()
+        self.assertTrue(os.path.basename(fp).startswith('pyqi_manifest_test-'))
+
+        other_dir = join(self.temp_dir, 'other')
+        os.mkdir(other_dir)
+        os.rename(self.config_dir, join(other_dir, 'pyqi_manifest_test'))
+        sys.path.remove(self.temp_dir)
+        sys.path.append(other_dir)
+        del sys.modules['pyqi_manifest_test']
+        try:
+            self.assertNotEqual(self.get_manifest_path(), fp)
+        finally:
+            sys.path.remove(other_dir)
+            sys.path.append(self.temp_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+from collections import Iterable
+from threading import Event
+from unittest import TestCase, main
+from pyqi.core.command import (Command, CommandIn, CommandOut,
+                               ParameterCollection)
+from pyqi.core.executor import ThreadPoolExecutor, ProcessPoolExecutor
+from pyqi.core.pipeline import Pipeline, is_compatible_type
+from pyqi.core.exception import (IncompetentDeveloperError,
+                                 MissingParameterError,
+                                 UnknownParameterError)
+
+class Add(Command):
+    CommandIns = ParameterCollection([
+        CommandIn('x', int, '', Required=True),
+        CommandIn('y', int, '', Default=0)])
+    CommandOuts = ParameterCollection([
+        CommandOut('x', int, ''),
+        CommandOut('lines', str, '', Streaming=True)])
+
+    def run(self, **kwargs):
+        total = kwargs['x'] + kwargs['y']
+        return {'x': total, 'lines': iter([str(total)])}
+
+class Describe(Command):
+    CommandIns = ParameterCollection([
+        CommandIn('x', str, '', Required=True)])
+    CommandOuts = ParameterCollection([CommandOut('result', str, '')])
+
+    def run(self, **kwargs):
+        return {'result': 'x is %s' % kwargs['x']}
+
+class Count(Command):
+    CommandIns = ParameterCollection([
+        CommandIn('lines', Iterable, '', Required=True)])
+    CommandOuts = ParameterCollection([CommandOut('count', int, '')])
+
+    def run(self, **kwargs):
+        return {'count': len(list(kwargs['lines']))}
+
+class Wait(Command):
+    CommandIns = ParameterCollection([
+        CommandIn('event', None, '', Required=True)])
+    CommandOuts = ParameterCollection([CommandOut('x', int, '')])
+
+    def run(self, **kwargs):
+        return {'x': int(kwargs['event'].wait(5))}
+
+class Signal(Command):
+    CommandIns = ParameterCollection([
+        CommandIn('event', None, '', Required=True),
+        CommandIn('x', int, '', Required=True)])
+    CommandOuts = ParameterCollection([CommandOut('x', int, '')])
+
+    def run(self, **kwargs):
+        kwargs['event'].set()
+        return {'x': kwargs['x']}
+
+class TopLevelTests(TestCase):
+    def test_is_compatible_type(self):
+        self.assertTrue(is_compatible_type(int, int))
+        self.assertTrue(is_compatible_type(bool, int))
+        self.assertFalse(is_compatible_type(int, bool))
+        self.assertFalse(is_compatible_type(int, str))
+        self.assertTrue(is_compatible_type(None, str))
+        self.assertTrue(is_compatible_type('biom', 'biom'))
+        self.assertFalse(is_compatible_type('biom', str))
+
+        # streams are iterators, not values of their DataType
+        self.assertFalse(is_compatible_type(str, str, streaming=True))
+        self.assertFalse(is_compatible_type(str, list, streaming=True))
+        self.assertTrue(is_compatible_type(str, Iterable, streaming=True))
+        self.assertTrue(is_compatible_type(str, None, streaming=True))
+
+class PipelineTests(TestCase):
+    def setUp(self):
+        # a -> c <- b, a -> d
+        self.pipeline = Pipeline()
+        self.pipeline.add_step('a', Add(), inputs={'x':1, 'y':2})
+        self.pipeline.add_step('b', Add(), inputs={'x':10})
+        self.pipeline.add_step('c', Add(), links={'x':'a', 'y':('b', 'x')})
+        self.pipeline.add_step('d', Add(), inputs={'y':100}, links={'x':'a'})
+
+    def test_build(self):
+        self.assertEqual(self.pipeline.build(), [['a', 'b'], ['c', 'd']])
+
+    def test_run(self):
+        exp = {'a':3, 'b':10, 'c':13, 'd':103}
+
+        obs = self.pipeline.run()
+        self.assertEqual(dict([(k, v['x']) for k, v in obs.items()]), exp)
+
+        with ThreadPoolExecutor(2) as executor:
+            obs = self.pipeline.run(executor)
+        self.assertEqual(dict([(k, v['x']) for k, v in obs.items()]), exp)
+
+    def test_run_independent(self):
+        """A slow step doesn't hold up steps that don't depend on it"""
+        event = Event()
+        p = Pipeline()
+        p.add_step('slow', Wait(), inputs={'event':event})
+        p.add_step('a', Add(), inputs={'x':1})
+        p.add_step('b', Signal(), inputs={'event':event}, links={'x':'a'})
+        p.add_step('c', Add(), links={'x':'slow', 'y':('b', 'x')})
+
+        with ThreadPoolExecutor(2) as executor:
+            obs = p.run(executor)
+        self.assertEqual(obs['slow'], {'x':1})
+        self.assertEqual(obs['c']['x'], 2)
+
+    def test_invalid_links(self):
+        p = Pipeline()
+        p.add_step('a', Add(), inputs={'x':1})
+        self.assertRaises(IncompetentDeveloperError, p.add_step, 'a', Add())
+
+        p.add_step('b', Describe(), links={'x':'a'})
+        self.assertRaises(IncompetentDeveloperError, p.build)
+
+        p = Pipeline()
+        p.add_step('a', Add(), inputs={'x':1})
+        p.add_step('b', Add(), links={'x':('a', 'foo')})
+        self.assertRaises(UnknownParameterError, p.build)
+
+        p = Pipeline()
+        p.add_step('b', Add(), links={'x':'missing'})
+        self.assertRaises(IncompetentDeveloperError, p.build)
+
+        p = Pipeline()
+        p.add_step('a', Add())
+        self.assertRaises(MissingParameterError, p.build)
+
+        p = Pipeline()
+        p.add_step('a', Add(), inputs={'x':1, 'z':2})
+        self.assertRaises(UnknownParameterError, p.build)
+
+    def test_cycle(self):
+        p = Pipeline()
+        p.add_step('a', Add(), links={'x':'b'})
+        p.add_step('b', Add(), links={'x':'a'})
+        self.assertRaises(IncompetentDeveloperError, p.build)
+
+    def test_streams(self):
+        p = Pipeline()
+        p.add_step('a', Add(), inputs={'x':1})
+        p.add_step('b', Count(), links={'lines':('a', 'lines')})
+        p.build()
+        self.assertEqual(p.run()['b'], {'count':1})
+
+        # streams can't be sent between processes
+        with ProcessPoolExecutor(1) as executor:
+            self.assertRaises(IncompetentDeveloperError, p.run, executor)
+
+        # a stream can only be consumed once
+        p.add_step('c', Count(), links={'lines':('a', 'lines')})
+        self.assertRaises(IncompetentDeveloperError, p.build)
+
+        # a stream of str is not a str
+        p = Pipeline()
+        p.add_step('a', Add(), inputs={'x':1})
+        p.add_step('b', Describe(), links={'x':('a', 'lines')})
+        self.assertRaises(IncompetentDeveloperError, p.build)
+
+if __name__ == '__main__':
+    main()
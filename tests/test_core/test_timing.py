@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+#-----------------------------------------------------------------------------
+# Copyright (c) 2013, The BiPy Development Team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+from __future__ import division
+
+__credits__ = ["Greg Caporaso", "Daniel McDonald", "Doug Wendel",
+               "Jai Ram Rideout"]
+
+from unittest import TestCase, main
+from pyqi.core.timing import PhaseTimings, get_cpu_time, get_max_rss
+
+class TimingTests(TestCase):
+    def test_get_cpu_time(self):
+        start = get_cpu_time()
+        sum(xrange(100000))
+        self.assertTrue(get_cpu_time() >= start)
+
+    def test_get_max_rss(self):
+        max_rss = get_max_rss()
+        self.assertTrue(max_rss is None or max_rss > 0)
+
+class PhaseTimingsTests(TestCase):
+    def test_start_finish(self):
+        timings = PhaseTimings()
+        timings.start('outer')
+        timings.start('inner')
+        timings.finish('inner')
+        timings.finish('outer')
+
+        self.assertEqual([t.Phase for t in timings.Timings],
+                         ['inner', 'outer'])
+        for t in timings.Timings:
+            self.assertTrue(t.Wall >= 0)
+            self.assertTrue(t.CPU >= 0)
+        self.assertTrue(timings.Timings[1].Wall >= timings.Timings[0].Wall)
+
+        timings.clear()
+        self.assertEqual(timings.Timings, [])
+
+    def test_peak_rss_increase(self):
+        timings = PhaseTimings()
+        timings.start('allocate')
+        data = 'x' * (64 * 1024 * 1024)
+        timings.finish('allocate')
+        del data
+
+        # the memory freed by the first phase is reused by the second
+        timings.start('reuse')
+        data = 'x' * (32 * 1024 * 1024)
+        timings.finish('reuse')
+        del data
+
+        allocate, reuse = timings.Timings
+        if allocate.PeakRSSIncrease is None:
+            self.assertEqual(reuse.PeakRSSIncrease, None)
+        else:
+            self.assertTrue(allocate.PeakRSSIncrease >= 32 * 1024)
+            self.assertTrue(reuse.PeakRSSIncrease < 16 * 1024)
+
+    def test_format(self):
+        timings = PhaseTimings()
+        timings.start('command')
+        timings.finish('command')
+        lines = timings.format().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('Phase'))
+        self.assertTrue(lines[1].startswith('command '))
+
+if __name__ == '__main__':
+    main()